@@ -0,0 +1,353 @@
+"""
+The ``build`` module: Phase-by-phase benchmarks of full Sphinx builds
+===============================================================================
+
+Generates a synthetic project and times complete builds of it with each
+requested builder. Every build runs in a child process of its own, so
+that its peak memory use isn't mixed up with that of other builds.
+
+Each build is split into the following phases:
+
+- ``init``: setting up the Sphinx application and builder
+- ``read``: reading all documents, up to the ``env-updated`` event
+- ``resolve``: this extension's processing of resolved doctrees, as
+  measured by its instrumentation (see the ``profiling`` module)
+- ``write``: the rest of writing the output, excluding ``resolve``
+
+Separately, the time needed to load the extension's modules is measured
+in a fresh interpreter.
+
+Results can be saved as a baseline and later builds compared against it.
+Run ``python benchmarks/build.py --help`` for the command line options.
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from StringIO import StringIO
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__)))
+sys.path.insert(0, root_directory)
+
+from benchmarks.synthetic import ProjectParameters, generate_project
+
+
+# =============================================================================
+# Memory measurement
+
+def start_memory_tracking():
+    if tracemalloc:
+        tracemalloc.start()
+
+
+def get_peak_memory():
+    """Return the peak memory use in bytes and how it was measured.
+
+    Python's own allocations are traced with ``tracemalloc`` where it is
+    available. Otherwise the peak resident set size of the process is
+    used, which also includes memory allocated before the build.
+
+    """
+    if tracemalloc:
+        return tracemalloc.get_traced_memory()[1], "tracemalloc"
+    import resource
+    # On Linux ru_maxrss is given in kilobytes.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return peak, "maxrss"
+
+
+# =============================================================================
+# Import benchmark
+
+import_script = """
+import sys, time, json
+import sphinx.application
+start = time.time()
+import sphinxcontrib.traceables
+sphinxcontrib.traceables.import_submodules()
+seconds = time.time() - start
+modules = [name for name in %r if name in sys.modules]
+sys.stdout.write(json.dumps({"seconds": seconds, "modules": modules}))
+"""
+
+# Dependencies which should only be imported when they are used.
+deferred_modules = ["graphviz", "sphinx.ext.graphviz"]
+
+
+def measure_import_time(repeat=5):
+    """Return the time needed to load this extension's modules.
+
+    The modules are imported in a fresh interpreter, after Sphinx itself,
+    as happens when a project using the extension is built. The fastest
+    of *repeat* runs is reported, together with any of the
+    :data:`deferred_modules` which were imported anyway.
+
+    """
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [root_directory, environment.get("PYTHONPATH")]))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, "-c", import_script % (deferred_modules,)],
+            env=environment)
+        runs.append(json.loads(output))
+    return min(runs, key=lambda run: run["seconds"])
+
+
+# =============================================================================
+# Build benchmark
+
+class PhaseTimer(object):
+
+    def __init__(self):
+        self.marks = {}
+
+    def mark(self, name):
+        self.marks[name] = time.time()
+
+    def on_env_updated(self, app, env):
+        self.mark("read-finished")
+
+    def on_build_finished(self, app, exception):
+        self.mark("write-finished")
+
+
+def get_resolve_seconds(outdir):
+    from sphinxcontrib.traceables import profiling
+    report_path = os.path.join(outdir, profiling.report_filename)
+    with open(report_path) as report_file:
+        report = json.load(report_file)
+    return sum(timing["seconds"]
+               for (key, timing) in report["timings"].items()
+               if key.startswith("document:")), report
+
+
+def run_build(srcdir, builddir, buildername):
+    """Build the project in *srcdir* and return its phase timings."""
+    start_memory_tracking()
+    from sphinx.application import Sphinx
+
+    outdir = os.path.join(builddir, buildername)
+    doctreedir = os.path.join(builddir, "doctrees-" + buildername)
+    timer = PhaseTimer()
+    warnings = StringIO()
+
+    timer.mark("start")
+    app = Sphinx(srcdir, srcdir, outdir, doctreedir, buildername,
+                 confoverrides={"traceables_profile": True},
+                 status=None, warning=warnings, freshenv=True)
+    app.connect("env-updated", timer.on_env_updated)
+    app.connect("build-finished", timer.on_build_finished)
+    timer.mark("init-finished")
+    app.build()
+    peak_memory, memory_source = get_peak_memory()
+
+    marks = timer.marks
+    resolve, report = get_resolve_seconds(outdir)
+    phases = {
+        "init": marks["init-finished"] - marks["start"],
+        "read": marks["read-finished"] - marks["init-finished"],
+        "resolve": resolve,
+        "write": marks["write-finished"] - marks["read-finished"] - resolve,
+    }
+    phases["total"] = marks["write-finished"] - marks["start"]
+    return {
+        "phases": phases,
+        "peak_memory_bytes": peak_memory,
+        "memory_source": memory_source,
+        "warnings": len(warnings.getvalue().splitlines()),
+        "extension_timings": report["timings"],
+    }
+
+
+def run_build_in_process(srcdir, builddir, buildername):
+    def target(queue):
+        try:
+            queue.put(("result", run_build(srcdir, builddir, buildername)))
+        except Exception, error:
+            queue.put(("error", "{0}: {1}".format(error.__class__.__name__,
+                                                  error)))
+
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=(queue,))
+    process.start()
+    kind, value = queue.get()
+    process.join()
+    if kind == "error":
+        raise RuntimeError("Build with '{0}' failed: {1}"
+                           .format(buildername, value))
+    return value
+
+
+def run_benchmark(parameters, buildernames, repeat=1, workdir=None):
+    """Generate a project and benchmark builds of it.
+
+    Each build is repeated *repeat* times and the fastest run of each
+    builder is reported, being the one least disturbed by other activity
+    on the machine.
+
+    """
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="traceables-benchmark-")
+    try:
+        srcdir = os.path.join(workdir, "source")
+        generate_project(srcdir, **parameters.to_json())
+        builds = {}
+        for buildername in buildernames:
+            runs = []
+            for _ in range(repeat):
+                builddir = os.path.join(workdir, "build")
+                if os.path.exists(builddir):
+                    shutil.rmtree(builddir)
+                runs.append(run_build_in_process(srcdir, builddir,
+                                                 buildername))
+            builds[buildername] = min(
+                runs, key=lambda run: run["phases"]["total"])
+        return {
+            "parameters": parameters.to_json(),
+            "import": measure_import_time(),
+            "builds": builds,
+        }
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir)
+
+
+# =============================================================================
+# Baseline comparison
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return descriptions of all regressions relative to *baseline*.
+
+    A phase's time or a build's peak memory use regresses if it exceeds
+    the baseline's value by more than the fraction *tolerance*. Very
+    short phases are ignored, because their timings are mostly noise.
+
+    """
+    regressions = []
+    if results["parameters"] != baseline["parameters"]:
+        regressions.append("project parameters differ from the baseline's")
+        return regressions
+
+    if "import" in results and "import" in baseline:
+        seconds = results["import"]["seconds"]
+        baseline_seconds = baseline["import"]["seconds"]
+        if seconds > baseline_seconds * (1 + tolerance):
+            regressions.append(
+                "import: {0:.3f}s vs. baseline {1:.3f}s ({2:+.0%})"
+                .format(seconds, baseline_seconds,
+                        seconds / baseline_seconds - 1))
+
+    for (buildername, build) in sorted(results["builds"].items()):
+        baseline_build = baseline["builds"].get(buildername)
+        if baseline_build is None:
+            continue
+        values = [(phase, seconds, baseline_build["phases"].get(phase), "s")
+                  for (phase, seconds) in sorted(build["phases"].items())]
+        if build["memory_source"] == baseline_build["memory_source"]:
+            values.append(("peak memory", build["peak_memory_bytes"],
+                           baseline_build["peak_memory_bytes"], " bytes"))
+        for (name, value, baseline_value, unit) in values:
+            if baseline_value is None or baseline_value < minimum_seconds:
+                continue
+            if value > baseline_value * (1 + tolerance):
+                regressions.append(
+                    "{0} {1}: {2:.3f}{4} vs. baseline {3:.3f}{4} ({5:+.0%})"
+                    .format(buildername, name, value, baseline_value, unit,
+                            float(value) / baseline_value - 1))
+    return regressions
+
+
+minimum_seconds = 0.05
+
+
+# =============================================================================
+# Command line interface
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(
+        description="Benchmark builds of a synthetic traceables project.")
+    defaults = ProjectParameters.defaults
+    parser.add_argument("--traceables", type=int,
+                        default=defaults["traceables"])
+    parser.add_argument("--fanout", type=int, default=defaults["fanout"])
+    parser.add_argument("--documents", type=int,
+                        default=defaults["documents"])
+    parser.add_argument("--lists", type=float, default=defaults["lists"],
+                        help="list directives per document")
+    parser.add_argument("--matrices", type=float,
+                        default=defaults["matrices"],
+                        help="matrix directives per document")
+    parser.add_argument("--graphs", type=float, default=defaults["graphs"],
+                        help="graph directives per document")
+    parser.add_argument("--seed", type=int, default=defaults["seed"])
+    parser.add_argument("--builders", default="html,latex,xml",
+                        help="comma separated builder names")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="file to write results to")
+    parser.add_argument("--baseline", help="baseline file to compare with")
+    parser.add_argument("--save-baseline",
+                        help="file to save the results to as baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown (default 0.2)")
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    options = parse_arguments(arguments)
+    parameters = ProjectParameters(
+        traceables=options.traceables, fanout=options.fanout,
+        documents=options.documents, lists=options.lists,
+        matrices=options.matrices, graphs=options.graphs, seed=options.seed)
+    buildernames = [name.strip() for name in options.builders.split(",")]
+    results = run_benchmark(parameters, buildernames, options.repeat)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, "w") as output_file:
+            output_file.write(output)
+    sys.stdout.write("import   {0:7.3f}s\n".format(
+        results["import"]["seconds"]))
+    for module in results["import"]["modules"]:
+        sys.stdout.write("WARNING: {0} imported while loading the extension\n"
+                         .format(module))
+    for (buildername, build) in sorted(results["builds"].items()):
+        phases = build["phases"]
+        sys.stdout.write(
+            "{0:8} total {1:7.3f}s  init {2:6.3f}s  read {3:7.3f}s"
+            "  resolve {4:7.3f}s  write {5:7.3f}s  peak {6:.1f} MB\n"
+            .format(buildername, phases["total"], phases["init"],
+                    phases["read"], phases["resolve"], phases["write"],
+                    build["peak_memory_bytes"] / 1048576.0))
+    if options.save_baseline:
+        with open(options.save_baseline, "w") as baseline_file:
+            baseline_file.write(output)
+
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_with_baseline(results, baseline,
+                                            options.tolerance)
+        for regression in regressions:
+            sys.stdout.write("REGRESSION: {0}\n".format(regression))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
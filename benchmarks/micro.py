@@ -0,0 +1,275 @@
+"""
+The ``micro`` module: Microbenchmarks of the filter, matrix and graph engines
+===============================================================================
+
+Times individual operations on generated traceables without running
+Sphinx, using the in-memory :obj:`TraceablesEngine`.
+
+Each benchmark is run for several numbers of traceables *n*. Besides the
+operations per second at each size, the scaling exponent between
+consecutive sizes is reported: about 1 for operations which are linear in
+*n*, about 2 for quadratic ones. A rising exponent shows a complexity
+regression directly, independent of the speed of the machine.
+
+Run ``python benchmarks/micro.py --help`` for the command line options.
+
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from sphinxcontrib.traceables.engine import TraceablesEngine
+from sphinxcontrib.traceables.infrastructure import TraceablesFilter
+from sphinxcontrib.traceables.filter import ExpressionMatcher
+from sphinxcontrib.traceables.matrix import TraceableMatrix
+from sphinxcontrib.traceables.graph import GraphInput
+
+
+# =============================================================================
+# In-memory storage fixture
+
+statuses = ["draft", "review", "approved", "obsolete"]
+categories = ["safety", "security", "performance", "usability"]
+
+
+def create_engine(count, fanout=2, seed=0):
+    """Return an engine holding *count* generated traceables.
+
+    Each traceable has up to *fanout* parents among the traceables
+    before it, and ``status``, ``category`` and ``priority`` attributes.
+
+    """
+    rng = random.Random(seed)
+    engine = TraceablesEngine()
+    for index in range(count):
+        attributes = {
+            "status": rng.choice(statuses),
+            "category": rng.choice(categories),
+            "priority": str(rng.randint(1, 5)),
+        }
+        if index:
+            parents = set("REQ-{0}".format(rng.randrange(index) + 1)
+                          for _ in range(rng.randint(0, fanout)))
+            if parents:
+                attributes["parents"] = ", ".join(sorted(parents))
+        engine.add("REQ-{0}".format(index + 1), attributes,
+                   "doc-{0}".format(index // 100), 1)
+    engine.storage.update_relationships()
+    return engine
+
+
+# =============================================================================
+# Benchmarks
+#
+# Each benchmark takes an engine and returns the operation to time, so
+# that preparing its input isn't timed.
+
+benchmarks = []
+
+
+def benchmark(function):
+    benchmarks.append(function)
+    return function
+
+
+filter_expression = ("status == \"approved\" and"
+                     " category in [\"safety\", \"security\"]")
+
+
+@benchmark
+def filter_compile(engine):
+    return lambda: ExpressionMatcher(filter_expression)
+
+
+@benchmark
+def filter_evaluate(engine):
+    traceables = engine.traceables
+    return lambda: TraceablesFilter(traceables, engine.storage).filter(
+        filter_expression)
+
+
+@benchmark
+def filter_transitive(engine):
+    traceables = engine.traceables
+    expression = "\"REQ-1\" in all_parents"
+    return lambda: TraceablesFilter(traceables, engine.storage).filter(
+        expression)
+
+
+def build_matrix(engine):
+    storage = engine.storage
+    graph = storage.update_relationships()
+    matrix = TraceableMatrix("parents", "children", storage.get_sort_key())
+    for primary in storage.get_sorted_traceables():
+        matrix.add_primary(primary)
+        for secondary in graph.get_relatives(primary, "parents"):
+            matrix.add_traceable_pair(primary, secondary)
+    return matrix
+
+
+@benchmark
+def matrix_build(engine):
+    return lambda: build_matrix(engine)
+
+
+@benchmark
+def matrix_boolean_rows(engine):
+    # Rows of a fixed number of primaries, over all secondaries.
+    matrix = build_matrix(engine)
+    primaries = matrix.primaries[:100]
+    secondaries = matrix.secondaries
+
+    def operation():
+        for primary in primaries:
+            matrix.get_boolean_row(primary, secondaries)
+    return operation
+
+
+@benchmark
+def matrix_split(engine):
+    # Split into a 10 by 10 grid of submatrices.
+    matrix = build_matrix(engine)
+    primaries_size = int(math.ceil(len(matrix.primaries) / 10.0))
+    secondaries_size = int(math.ceil(len(matrix.secondaries) / 10.0))
+    return lambda: matrix.split(secondaries_size, primaries_size)
+
+
+def walk_graph(engine):
+    starts = engine.traceables[::100]
+    graph_input = GraphInput(engine.storage,
+                             [("parents", 2), ("children", 1)])
+    for traceable in starts:
+        graph_input.add_traceable_walk(traceable)
+    return graph_input
+
+
+@benchmark
+def graph_walk(engine):
+    # Walk from every 100th traceable, so that the graph grows with n.
+    return lambda: walk_graph(engine)
+
+
+@benchmark
+def graph_generate_dot(engine):
+    graph_input = walk_graph(engine)
+    return lambda: engine.generate_dot(graph_input)
+
+
+# =============================================================================
+# Timing
+
+def time_operation(operation, min_time, repeat):
+    """Return the best time in seconds of one call of *operation*.
+
+    *operation* is called in loops lasting at least *min_time* seconds,
+    and the fastest of *repeat* loops is used.
+
+    """
+    best = None
+    for _ in range(repeat):
+        calls = 0
+        start = time.time()
+        while True:
+            operation()
+            calls += 1
+            elapsed = time.time() - start
+            if elapsed >= min_time:
+                break
+        seconds = elapsed / calls
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def run_benchmarks(sizes, names=None, min_time=0.2, repeat=3):
+    """Run benchmarks for each size and return their results.
+
+    The result of each benchmark holds the seconds per operation and the
+    operations per second for each size, and the scaling exponents
+    between consecutive sizes.
+
+    """
+    selected = [function for function in benchmarks
+                if not names or function.__name__ in names]
+    results = dict((function.__name__, {"sizes": {}, "exponents": {}})
+                   for function in selected)
+    for size in sizes:
+        engine = create_engine(size)
+        for function in selected:
+            seconds = time_operation(function(engine), min_time, repeat)
+            results[function.__name__]["sizes"][size] = {
+                "seconds": seconds,
+                "ops_per_sec": 1.0 / seconds if seconds else None,
+            }
+
+    for result in results.values():
+        timings = result["sizes"]
+        for (size1, size2) in zip(sizes, sizes[1:]):
+            seconds1 = timings[size1]["seconds"]
+            seconds2 = timings[size2]["seconds"]
+            if seconds1 and seconds2:
+                exponent = (math.log(seconds2 / seconds1) /
+                            math.log(float(size2) / size1))
+                result["exponents"]["{0}-{1}".format(size1, size2)] = exponent
+    return results
+
+
+# =============================================================================
+# Command line interface
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(
+        description="Run microbenchmarks of the traceables engines.")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma separated numbers of traceables")
+    parser.add_argument("--benchmarks",
+                        help="comma separated benchmark names; available: "
+                             + ", ".join(function.__name__
+                                         for function in benchmarks))
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum seconds per timing loop")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="file to write results to")
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    options = parse_arguments(arguments)
+    sizes = sorted(int(size) for size in options.sizes.split(","))
+    names = None
+    if options.benchmarks:
+        names = set(name.strip() for name in options.benchmarks.split(","))
+    results = run_benchmarks(sizes, names, options.min_time, options.repeat)
+
+    for function in benchmarks:
+        result = results.get(function.__name__)
+        if result is None:
+            continue
+        parts = []
+        for size in sizes:
+            parts.append("n={0}: {1:.1f} ops/s".format(
+                size, result["sizes"][size]["ops_per_sec"]))
+        for (size1, size2) in zip(sizes, sizes[1:]):
+            exponent = result["exponents"].get("{0}-{1}".format(size1,
+                                                                size2))
+            if exponent is not None:
+                parts.append("n^{0:.2f}".format(exponent))
+        sys.stdout.write("{0:20} {1}\n".format(function.__name__,
+                                               "  ".join(parts)))
+
+    if options.output:
+        with open(options.output, "w") as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+The ``synthetic`` module: Generator for synthetic benchmark projects
+===============================================================================
+
+Generates self-contained Sphinx projects which use this extension, sized
+by the number of traceables, their relationship fan-out, the number of
+documents and the number of list, matrix and graph directives per
+document. Generation is deterministic for a given seed, so that builds
+of the same parameters can be compared with each other.
+
+"""
+
+import os
+import random
+import shutil
+
+
+# =============================================================================
+# Project parameters
+
+class ProjectParameters(object):
+    """Parameters describing the size and content of a synthetic project.
+
+    *traceables* are distributed evenly over *documents*. Each traceable
+    has up to *fanout* parents among the traceables defined before it, so
+    that the ``parents``/``children`` relationship is acyclic. *lists*,
+    *matrices* and *graphs* are the average number of directives of each
+    kind per document; fractional values place directives in only some
+    documents.
+
+    """
+
+    defaults = {
+        "traceables": 1000,
+        "fanout": 2,
+        "documents": 20,
+        "lists": 0.5,
+        "matrices": 0.25,
+        "graphs": 0.1,
+        "seed": 0,
+    }
+
+    def __init__(self, **kwargs):
+        for (name, default) in self.defaults.items():
+            setattr(self, name, kwargs.pop(name, default))
+        if kwargs:
+            raise TypeError("Unknown project parameters: {0}"
+                            .format(", ".join(sorted(kwargs))))
+
+    def to_json(self):
+        return dict((name, getattr(self, name)) for name in self.defaults)
+
+
+# =============================================================================
+# Project generation
+
+statuses = ["draft", "review", "approved", "obsolete"]
+categories = ["safety", "security", "performance", "usability"]
+
+conf_template = """\
+source_suffix = ".txt"
+master_doc = "index"
+
+extensions = ["sphinxcontrib.traceables", "sphinx.ext.graphviz"]
+"""
+
+
+class ProjectGenerator(object):
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.random = random.Random(parameters.seed)
+
+    def generate(self, directory):
+        """Write the project's source files to *directory*.
+
+        Any existing content of *directory* is removed first.
+
+        """
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+
+        documents = self.distribute_traceables()
+        docnames = ["doc-{0:04d}".format(index)
+                    for index in range(len(documents))]
+
+        self.write(directory, "conf.py", conf_template)
+        self.write(directory, "index.txt", self.generate_index(docnames))
+        for (docname, tags) in zip(docnames, documents):
+            self.write(directory, docname + ".txt",
+                       self.generate_document(docname, tags))
+
+    def distribute_traceables(self):
+        count = self.parameters.traceables
+        document_count = max(1, self.parameters.documents)
+        tags = [self.make_tag(index) for index in range(count)]
+        return [tags[index::document_count]
+                for index in range(document_count)]
+
+    def make_tag(self, index):
+        return "REQ-{0}".format(index + 1)
+
+    def generate_index(self, docnames):
+        lines = ["Synthetic traceables project",
+                 "=" * 78,
+                 "",
+                 ".. toctree::",
+                 ""]
+        lines.extend("   " + docname for docname in docnames)
+        lines.append("")
+        return "\n".join(lines)
+
+    def generate_document(self, docname, tags):
+        lines = [docname, "=" * 78, ""]
+        for tag in tags:
+            lines.extend(self.generate_traceable(tag))
+        lines.extend(self.generate_directives(tags))
+        return "\n".join(lines)
+
+    def generate_traceable(self, tag):
+        index = int(tag.split("-")[1]) - 1
+        lines = [".. traceable:: " + tag,
+                 "   :title: Requirement number {0}".format(index + 1),
+                 "   :status: " + self.random.choice(statuses),
+                 "   :category: " + self.random.choice(categories),
+                 "   :priority: {0}".format(self.random.randint(1, 5))]
+        if index:
+            fanout = self.random.randint(0, self.parameters.fanout)
+            parents = set(self.make_tag(self.random.randrange(index))
+                          for _ in range(fanout))
+            if parents:
+                lines.append("   :parents: " + ", ".join(sorted(parents)))
+        lines.extend(["", "   Content of requirement {0}.".format(index + 1),
+                      ""])
+        return lines
+
+    def generate_directives(self, tags):
+        lines = []
+        for _ in range(self.get_directive_count(self.parameters.lists)):
+            lines.extend(self.generate_list())
+        for _ in range(self.get_directive_count(self.parameters.matrices)):
+            lines.extend(self.generate_matrix())
+        for _ in range(self.get_directive_count(self.parameters.graphs)):
+            lines.extend(self.generate_graph(tags))
+        return lines
+
+    def get_directive_count(self, density):
+        # Use the integral part of the density and round the fractional
+        # part up or down at random, so that the average count matches.
+        count = int(density)
+        if self.random.random() < density - count:
+            count += 1
+        return count
+
+    def generate_list(self):
+        status = self.random.choice(statuses)
+        return [".. traceable-list::",
+                "   :filter: status == \"{0}\"".format(status),
+                "   :attributes: status, category, priority",
+                ""]
+
+    def generate_matrix(self):
+        category = self.random.choice(categories)
+        return [".. traceable-matrix::",
+                "   :relationship: parents",
+                "   :filter-primaries: category == \"{0}\"".format(category),
+                "   :format: " + self.random.choice(["table", "columns"]),
+                ""]
+
+    def generate_graph(self, tags):
+        if not tags:
+            return []
+        return [".. traceable-graph::",
+                "   :tags: " + self.random.choice(tags),
+                "   :relationships: parents:2, children:1",
+                ""]
+
+    def write(self, directory, filename, content):
+        with open(os.path.join(directory, filename), "w") as output_file:
+            output_file.write(content)
+
+
+def generate_project(directory, **kwargs):
+    """Generate a synthetic project in *directory*.
+
+    Keyword arguments are the :obj:`ProjectParameters`. Returns the
+    parameters used.
+
+    """
+    parameters = ProjectParameters(**kwargs)
+    ProjectGenerator(parameters).generate(directory)
+    return parameters
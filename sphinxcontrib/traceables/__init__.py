@@ -1,10 +1,27 @@
 
-import infrastructure
-import display
-import traceables
-import list
-import matrix
-import graph
+import importlib
+
+
+# Submodules are only imported when the extension is set up, so that
+# importing a single submodule, such as the engine, doesn't load them all.
+submodule_names = [
+    "infrastructure",
+    "profiling",
+    "display",
+    "domain",
+    "diagnostics",
+    "inventory",
+    "traceables",
+    "sources",
+    "list",
+    "matrix",
+    "graph",
+]
+
+
+def import_submodules():
+    for name in submodule_names:
+        importlib.import_module(__name__ + "." + name)
 
 
 # ==========================================================================
@@ -12,12 +29,18 @@ import graph
 
 def setup(app):
     # Perform import within this function to avoid an import circle.
+    import_submodules()
     from sphinxcontrib import traceables
 
     # Allow extension parts to set themselves up.
     traceables.infrastructure.setup(app)
+    traceables.profiling.setup(app)
     traceables.display.setup(app)
+    traceables.domain.setup(app)
+    traceables.diagnostics.setup(app)
+    traceables.inventory.setup(app)
     traceables.traceables.setup(app)
+    traceables.sources.setup(app)
     traceables.list.setup(app)
     traceables.matrix.setup(app)
     traceables.graph.setup(app)
@@ -27,7 +50,6 @@ def setup(app):
     traceables.infrastructure.ProcessorManager.register_processor_classes([
         traceables.traceables.RelationshipsProcessor,
         traceables.display.TraceableDisplayProcessor,
-        traceables.traceables.XrefProcessor,
         traceables.list.ListProcessor,
         traceables.matrix.MatrixProcessor,
         traceables.graph.GraphProcessor,
@@ -0,0 +1,183 @@
+"""
+The ``diagnostics`` module: Build-wide reporting of problems with tags
+===============================================================================
+
+Problems with traceable tags are collected for the whole build instead of
+being reported where they occur, so that a tag which is referenced many
+times produces a single diagnostic listing all its locations. At the end
+of reading, one warning is emitted for all unresolved references and one
+for all duplicate tags. At the end of the build all problems, including
+those found by the relationship analysis, are also written to the output
+directory as JSON.
+
+"""
+
+import os
+import json
+
+from .infrastructure import TraceablesStorage
+
+
+# =============================================================================
+# Diagnostics class
+
+class TagDiagnostics(object):
+    """Problems with tags, collected from a build environment."""
+
+    max_locations = 10
+
+    def __init__(self, env):
+        self.env = env
+        self.storage = TraceablesStorage(env)
+        self.domain_data = env.get_domain("traceables").data
+
+    def get_unresolved_references(self):
+        """Return a dict mapping each undefined tag referenced by a role or
+        graph directive to its sorted ``(docname, lineno, kind)``
+        locations.
+
+        Roles may also reference tags defined by other projects, graphs
+        must start at tags of this project.
+
+        """
+        tag_index = self.storage.traceables_set.tag_index
+        unresolved = {}
+        for (docname, references) in self.domain_data["references"].items():
+            for (tag, lineno, kind) in references:
+                if tag in tag_index:
+                    continue
+                if (kind == "reference" and
+                        self.storage.get_external_traceable(tag)):
+                    continue
+                unresolved.setdefault(tag, []).append((docname, lineno, kind))
+        for locations in unresolved.values():
+            locations.sort()
+        return unresolved
+
+    def get_duplicates(self):
+        """Return a dict mapping each tag defined more than once to the
+        ``(docname, lineno)`` locations of its definitions.
+
+        The first location is that of the definition which is used.
+
+        """
+        tag_index = self.storage.traceables_set.tag_index
+        duplicates = {}
+        for (docname, definitions) in self.domain_data["duplicates"].items():
+            for (tag, lineno) in definitions:
+                duplicates.setdefault(tag, []).append((docname, lineno))
+        for (tag, locations) in duplicates.items():
+            locations.sort()
+            traceable = tag_index.get(tag)
+            if traceable:
+                target_node = traceable.target_node
+                locations.insert(0, (target_node["docname"],
+                                     target_node["lineno"]))
+        return duplicates
+
+    def describe_locations(self, locations):
+        parts = ["{0}:{1}".format(self.env.doc2path(docname), lineno)
+                 for (docname, lineno) in locations[:self.max_locations]]
+        if len(locations) > self.max_locations:
+            parts.append("and {0} more"
+                         .format(len(locations) - self.max_locations))
+        return ", ".join(parts)
+
+    def get_warnings(self):
+        """Return a list of warning messages, one per kind of problem."""
+        warnings = []
+
+        unresolved = self.get_unresolved_references()
+        if unresolved:
+            lines = ["Traceables: unresolved references found:"]
+            for (tag, locations) in sorted(unresolved.items()):
+                lines.append(
+                    "  no traceable with tag '{0}' found, referenced at:"
+                    " {1}{2}"
+                    .format(tag, self.describe_locations(
+                        [(docname, lineno)
+                         for (docname, lineno, kind) in locations]),
+                        self.storage.describe_suggestions(tag)))
+            warnings.append("\n".join(lines))
+
+        duplicates = self.get_duplicates()
+        if duplicates:
+            lines = ["Traceables: duplicate tags found:"]
+            for (tag, locations) in sorted(duplicates.items()):
+                lines.append(
+                    "  more than one traceable with tag '{0}' found,"
+                    " defined at: {1}"
+                    .format(tag, self.describe_locations(locations)))
+            warnings.append("\n".join(lines))
+
+        return warnings
+
+    def to_json(self):
+        """Return all problems, including relationship cycles and tags
+        referenced by relationships, as a JSON serializable dict."""
+        def location(docname, lineno, **extra):
+            result = {"docname": docname, "lineno": lineno}
+            result.update(extra)
+            return result
+
+        unresolved = {}
+        for (tag, locations) in self.get_unresolved_references().items():
+            unresolved[tag] = [location(docname, lineno, kind=kind)
+                               for (docname, lineno, kind) in locations]
+        analysis = self.storage.relationship_analysis
+        for (placeholder, referrers) in analysis.unresolved:
+            unresolved.setdefault(placeholder.tag, []).extend(
+                location(referrer.target_node["docname"],
+                         referrer.target_node["lineno"],
+                         kind="relationship", traceable=referrer.tag)
+                for referrer in referrers)
+
+        duplicates = {}
+        for (tag, locations) in self.get_duplicates().items():
+            duplicates[tag] = [location(docname, lineno)
+                               for (docname, lineno) in locations]
+
+        cycles = [{"relationship": name,
+                   "tags": [traceable.tag for traceable in traceables]}
+                  for (name, traceables) in analysis.cycles]
+
+        suggestions = dict((tag, self.storage.get_tag_suggestions(tag))
+                           for tag in unresolved)
+
+        return {
+            "unresolved": unresolved,
+            "suggestions": suggestions,
+            "duplicates": duplicates,
+            "cycles": cycles,
+        }
+
+
+diagnostics_filename = "traceables-diagnostics.json"
+
+
+# =============================================================================
+# Signal handling functions
+
+def report_diagnostics(app, env):
+    for message in TagDiagnostics(env).get_warnings():
+        env.warn(None, message)
+
+
+def write_diagnostics(app, exception):
+    if exception:
+        return
+    diagnostics = TagDiagnostics(app.builder.env)
+    if not os.path.isdir(app.outdir):
+        os.makedirs(app.outdir)
+    path = os.path.join(app.outdir, diagnostics_filename)
+    with open(path, "w") as diagnostics_file:
+        json.dump(diagnostics.to_json(), diagnostics_file, indent=2,
+                  sort_keys=True)
+
+
+# =============================================================================
+# Setup this extension part
+
+def setup(app):
+    app.connect("env-updated", report_diagnostics)
+    app.connect("build-finished", write_diagnostics)
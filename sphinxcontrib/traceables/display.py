@@ -8,8 +8,10 @@ The ``display`` module: Formatting output of individual traceables
 from docutils import nodes
 from docutils.parsers.rst import Directive, directives
 
+from . import profiling
 from .infrastructure import FormatProcessorBase, Traceable, TraceablesStorage
-from .utils import passthrough, latex_escape
+from .templates import TemplateFormatterBase, create_link_context
+from .utils import passthrough
 
 
 # =============================================================================
@@ -32,14 +34,59 @@ class traceable_display_table(nodes.General, nodes.Element):
     """Placeholder node to be replaced by a builder-specific table display.
 
     Attributes:
-        traceables-traceable: Instance of :obj:`Traceable` to be presented
-            in the output.
+        traceables-display-model: Instance of :obj:`TraceableDisplayModel`
+            to be presented in the output.
 
     """
 
     pass
 
 
+# =============================================================================
+# Display model
+
+class TraceableDisplayModel(object):
+    """Presentation data of a single traceable, shared by all formatters.
+
+    The model holds the traceable's relationships as ``(name, relatives)``
+    rows and its remaining attributes as sorted ``(name, value)`` rows.
+    It is built once per traceable and kept in a cache of the
+    :obj:`TraceablesSet`, so that it is reused by every document and
+    builder until traceables are added or removed.
+
+    """
+
+    cache_name = "display-models"
+
+    def __init__(self, traceable):
+        self.traceable = traceable
+        self.tag = traceable.tag
+        self.title = traceable.title
+        self.has_title = traceable.has_title()
+
+        # These are provided sorted by the relationship graph.
+        relationships = traceable.relationships
+        self.relationship_rows = [(relationship_name, list(relatives))
+                                  for relationship_name, relatives
+                                  in relationships.items()]
+
+        attributes = traceable.attributes.copy()
+        for relationship_name in relationships.keys():
+            attributes.pop(relationship_name, None)
+        attributes.pop("title", None)
+        self.attribute_rows = sorted(attributes.items())
+
+    @classmethod
+    def get(cls, storage, traceable):
+        models = storage.traceables_set.get_cache(cls.cache_name)
+        model = models.get(traceable.tag)
+        profiling.count_cache(cls.cache_name, model is not None)
+        if model is None:
+            model = cls(traceable)
+            models[traceable.tag] = model
+        return model
+
+
 # =============================================================================
 # Processors
 
@@ -52,10 +99,11 @@ class TraceableDisplayProcessor(FormatProcessorBase):
                                     doctree, docname):
         tag = display_node["traceables-tag"]
         traceable = self.storage.get_traceable_by_tag(tag)
+        model = TraceableDisplayModel.get(self.storage, traceable)
 
         format_options = display_node.get("traceables-format-options")
-        new_nodes = formatter.format(self.app, docname, display_node,
-                                     traceable, format_options)
+        new_nodes = self.run_formatter(formatter, docname, display_node,
+                                       model, format_options)
         display_node.replace_self(new_nodes)
 
 
@@ -64,17 +112,17 @@ class TraceableDisplayProcessor(FormatProcessorBase):
 
 class TraceableDisplayFormatterBase(object):
 
-    def format(self, app, docname, node, traceable, options):
+    def format(self, app, docname, node, model, options):
         raise NotImplementedError()
 
-    def create_title_node(self, traceable):
-        if traceable.has_title():
+    def create_title_node(self, model):
+        if model.has_title:
             title_content = nodes.inline()
-            title_content += nodes.literal(text=traceable.tag)
+            title_content += nodes.literal(text=model.tag)
             title_content += nodes.inline(text=" -- ")
-            title_content += nodes.inline(text=traceable.title)
+            title_content += nodes.inline(text=model.title)
         else:
-            title_content = nodes.literal(text=traceable.tag)
+            title_content = nodes.literal(text=model.tag)
 
         title_node = nodes.inline()
         title_node += title_content
@@ -86,7 +134,7 @@ class TraceableDisplayFormatterBase(object):
 
 class TraceableDisplayAdmonitionFormatter(TraceableDisplayFormatterBase):
 
-    def format(self, app, docname, node, traceable, options):
+    def format(self, app, docname, node, model, options):
         env = app.builder.env
 
         admonition = nodes.admonition()
@@ -94,11 +142,11 @@ class TraceableDisplayAdmonitionFormatter(TraceableDisplayFormatterBase):
 
         # Assign the traceable's unique ID to the admonition node, so
         # that HTML bookmarks ("somewhere.html#bookmark") work.
-        admonition["ids"].append(traceable.target_node["refid"])
+        admonition["ids"].append(model.traceable.target_node["refid"])
 
         # Add title and attribute list.
-        admonition += self.create_title_node(traceable)
-        admonition += self.create_attribute_list_node(app, docname, traceable)
+        admonition += self.create_title_node(model)
+        admonition += self.create_attribute_list_node(app, docname, model)
 
         # Fill content of admonition node.
         while node.children:
@@ -106,24 +154,16 @@ class TraceableDisplayAdmonitionFormatter(TraceableDisplayFormatterBase):
 
         return [admonition]
 
-    def create_attribute_list_node(self, app, docname, traceable):
-        relationships = traceable.relationships
-
-        # Determine which attributes to list in which order.
-        attributes = traceable.attributes.copy()
-        for relationship_name in relationships.keys():
-            attributes.pop(relationship_name, None)
-        attributes.pop("title", None)
-
+    def create_attribute_list_node(self, app, docname, model):
         # Create node to contain list of attributes.
         field_list_node = nodes.field_list()
 
         # Add relationship attributes.
-        for relationship_name, relatives in sorted(relationships.items()):
+        for relationship_name, relatives in model.relationship_rows:
             field_node = nodes.field()
             field_node += nodes.field_name(text=relationship_name)
             content = nodes.inline()
-            for relative in sorted(relatives, key=lambda t: t.tag):
+            for relative in relatives:
                 if len(content):
                     content += nodes.inline(text=", ")
                 content += relative.make_reference_node(app.builder,
@@ -132,7 +172,7 @@ class TraceableDisplayAdmonitionFormatter(TraceableDisplayFormatterBase):
             field_list_node += field_node
 
         # Add non-relationship attributes.
-        for attribute_name, attribute_value in sorted(attributes.items()):
+        for attribute_name, attribute_value in model.attribute_rows:
             field_node = nodes.field()
             field_node += nodes.field_name(text=attribute_name)
 
@@ -150,7 +190,7 @@ class TraceableDisplayAdmonitionFormatter(TraceableDisplayFormatterBase):
 
 class TraceableDisplayTableFormatter(TraceableDisplayFormatterBase):
 
-    def format(self, app, docname, node, traceable, options):
+    def format(self, app, docname, node, model, options):
         env = app.builder.env
 
         table = nodes.table()
@@ -168,23 +208,16 @@ class TraceableDisplayTableFormatter(TraceableDisplayFormatterBase):
         thead += row
         entry = nodes.entry(morecols=1)
         row += entry
-        entry += self.create_title_node(traceable)
+        entry += self.create_title_node(model)
 
         # Add table body.
         tbody = nodes.tbody()
         tgroup += tbody
 
-        # Determine which attributes to list in which order.
-        relationships = traceable.relationships
-        attributes = traceable.attributes.copy()
-        for relationship_name in relationships.keys():
-            attributes.pop(relationship_name, None)
-        attributes.pop("title", None)
-
         # Add relationship attributes.
-        for relationship_name, relatives in sorted(relationships.items()):
+        for relationship_name, relatives in model.relationship_rows:
             first = True
-            for relative in sorted(relatives, key=lambda t: t.tag):
+            for relative in relatives:
                 row = nodes.row()
                 tbody += row
 
@@ -202,7 +235,7 @@ class TraceableDisplayTableFormatter(TraceableDisplayFormatterBase):
                                                        docname)
 
         # Add non-relationship attributes.
-        for attribute_name, attribute_value in sorted(attributes.items()):
+        for attribute_name, attribute_value in model.attribute_rows:
             row = nodes.row()
             tbody += row
 
@@ -218,99 +251,91 @@ class TraceableDisplayTableFormatter(TraceableDisplayFormatterBase):
             entry += content
 
         wrapper = traceable_display_table()
-        wrapper["traceables-traceable"] = traceable
+        wrapper["traceables-display-model"] = model
         wrapper += table
 
         return [wrapper] + node.children
 
     @staticmethod
     def visit_latex(translator, node):
-        traceable = node["traceables-traceable"]
-
-        lines = []
-#        lines.append(r"\setlength\LTleft{0pt}")
-#        lines.append(r"\setlength\LTright{0pt}")
-        lines.append(r"\begin{longtable}{ll}")
-        lines.append(r"\hline")
-        lines.append(r"\multicolumn{2}{l}{\textbf{\textsc{%s} -- %s}} \\"
-                     % (latex_escape(traceable.tag.lower()),
-                        latex_escape(traceable.title)))
-        lines.append(r"\hline")
-
-        # Determine which attributes to list in which order.
-        relationships = traceable.relationships
-        attributes = traceable.attributes.copy()
-        for relationship_name in relationships.keys():
-            attributes.pop(relationship_name, None)
-        attributes.pop("title", None)
+        model = node["traceables-display-model"]
+        storage = TraceablesStorage(translator.builder.env)
+        escape = storage.get_latex_escape_cache()
+
+        # Output is appended to the translator's body line by line.
+        write = translator.body.append
+#        write(r"\setlength\LTleft{0pt}" + "\n")
+#        write(r"\setlength\LTright{0pt}" + "\n")
+        write(r"\begin{longtable}{ll}" + "\n")
+        write(r"\hline" + "\n")
+        write(r"\multicolumn{2}{l}{\textbf{\textsc{%s} -- %s}} \\"
+              % (escape[model.tag.lower()], escape[model.title]) + "\n")
+        write(r"\hline" + "\n")
 
         # Add relationship attributes.
-        for relationship_name, relatives in sorted(relationships.items()):
+        separator = escape[" -- "]
+        for relationship_name, relatives in model.relationship_rows:
             first = True
-            for relative in sorted(relatives, key=lambda t: t.tag):
+            for relative in relatives:
                 if first:
-                    lines.append(r"{%s} & {\textsc{%s}%s} \\"
-                                 % (latex_escape(relationship_name),
-                                    latex_escape(relative.tag.lower()),
-                                    latex_escape(" -- " + relative.title)))
+                    write(r"{%s} & {\textsc{%s}%s} \\"
+                          % (escape[relationship_name],
+                             escape[relative.tag.lower()],
+                             separator + escape[relative.title]) + "\n")
                     first = False
                 else:
-                    lines.append(r" & {\textsc{%s}%s} \\"
-                                 % (latex_escape(relative.tag.lower()),
-                                    latex_escape(" -- " + relative.title)))
+                    write(r" & {\textsc{%s}%s} \\"
+                          % (escape[relative.tag.lower()],
+                             separator + escape[relative.title]) + "\n")
 
         # Add non-relationship attributes.
-        for attribute_name, attribute_value in sorted(attributes.items()):
-            lines.append(r"{%s} & {%s} \\"
-                         % (latex_escape(attribute_name),
-                            latex_escape(attribute_value)))
+        for attribute_name, attribute_value in model.attribute_rows:
+            write(r"{%s} & {%s} \\"
+                  % (escape[attribute_name], escape[attribute_value]) + "\n")
 
-        lines.append(r"\hline")
-        lines.append(r"\end{longtable}")
-
-        translator.body.append("\n".join(lines))
+        write(r"\hline" + "\n")
+        write(r"\end{longtable}")
         raise nodes.SkipNode
 
 
+# -----------------------------------------------------------------------------
+
+class TraceableDisplayTemplateFormatter(TemplateFormatterBase,
+                                        TraceableDisplayFormatterBase):
+    """Formatter rendering HTML traceable displays from a template.
 
-        matrix = node["traceables-matrix"]
-        num_columns = len(matrix.secondaries)
-        forward_relationship = matrix.forward_relationship.capitalize()
-        backward_relationship = matrix.backward_relationship.capitalize()
-
-        lines = []
-        lines.append(r"\begin{longtable}{@{} cl*{%d}c @{}}" % num_columns)
-        lines.append(r" & & \multicolumn{%d}{c}{%s} \\[2ex]"
-                     % (num_columns, latex_escape(forward_relationship)))
-        headers = [r"\rotatebox{90}{%s}"
-                   % latex_escape(head.tag) for head in matrix.secondaries]
-        lines.append(r" & & " + r" & ".join(headers) + r"\\")
-        lines.append(r"\cmidrule{2-%d}" % (num_columns + 2))
-        for index, primary in enumerate(matrix.primaries):
-            boolean_row = matrix.get_boolean_row(primary)
-            if index > 0:
-                # Add horizontal rule above all but the first row.
-                lines.append(r"\cmidrule[0.05pt]{2-%d}" % (num_columns + 2))
-            checkmarks = [r"\checkmark" if boolean else ""
-                          for boolean in boolean_row]
-            if index == 0:
-                # Add backward relationship name only once.
-                lines.append(r"\rotatebox{90}{\llap{%s}}"
-                             % latex_escape(backward_relationship))
-            lines.append(" & %s & " % latex_escape(primary.tag) +
-                         " & ".join(checkmarks) + r"\\")
-            lines.append(r"\cmidrule{2-%d}" % (num_columns + 2))
-        lines.append(r"\end{longtable}")
-
-        translator.body.append("\n".join(lines))
-        raise nodes.SkipNode
+    The template's context contains the traceable's ``id``, ``tag``,
+    ``title`` and ``has_title``, its ``relationship_rows`` with the
+    ``tag``, ``title`` and ``uri`` of each relative, and its
+    ``attribute_rows``. The traceable's content follows the rendered
+    template.
+
+    """
+
+    def get_context(self, app, docname, node, model, options):
+        relationship_rows = [
+            (relationship_name,
+             [create_link_context(relative, app.builder, docname)
+              for relative in relatives])
+            for relationship_name, relatives in model.relationship_rows]
+        return {
+            "id": model.traceable.target_node["refid"],
+            "tag": model.tag,
+            "title": model.title,
+            "has_title": model.has_title,
+            "relationship_rows": relationship_rows,
+            "attribute_rows": model.attribute_rows,
+        }
+
+    def create_nodes(self, node, html):
+        return ([nodes.raw("", html, format="html")] + node.children)
 
 
 # -----------------------------------------------------------------------------
 
 class TraceableDisplayHiddenFormatter(TraceableDisplayFormatterBase):
 
-    def format(self, app, docname, node, traceable, options):
+    def format(self, app, docname, node, model, options):
         return []
 
 
@@ -323,6 +348,9 @@ TraceableDisplayProcessor.register_formatter("table",
     TraceableDisplayTableFormatter())
 TraceableDisplayProcessor.register_formatter("hidden",
     TraceableDisplayHiddenFormatter())
+TraceableDisplayProcessor.register_formatter("template",
+    TraceableDisplayTemplateFormatter("traceables-display.html",
+                                      TraceableDisplayTableFormatter()))
 
 def setup(app):
 
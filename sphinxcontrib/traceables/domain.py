@@ -0,0 +1,175 @@
+"""
+The ``domain`` module: Sphinx domain for traceables
+===============================================================================
+
+"""
+
+from sphinx import addnodes
+from sphinx.domains import Domain, Index, ObjType
+from sphinx.locale import l_
+from sphinx.roles import XRefRole
+from sphinx.util.nodes import make_refnode
+from docutils import nodes
+
+from .graph import traceable_graph
+from .infrastructure import Traceable, TraceablesStorage
+
+
+# =============================================================================
+# Roles
+
+class TraceableXRefRole(XRefRole):
+    """Cross-reference role which resolves through the traceables domain.
+
+    The role is also registered without domain prefix, so that
+    ``:traceable:`` works in all documents regardless of the default
+    domain.
+
+    """
+
+    def __call__(self, typ, rawtext, text, lineno, inliner,
+                 options={}, content=[]):
+        if typ and ":" not in typ:
+            typ = TraceablesDomain.name + ":" + typ
+        return XRefRole.__call__(self, typ, rawtext, text, lineno, inliner,
+                                 options, content)
+
+
+# =============================================================================
+# Indices
+
+class TraceablesIndex(Index):
+
+    name = "index"
+    localname = l_("Traceables Index")
+    shortname = l_("traceables")
+
+    def generate(self, docnames=None):
+        content = {}
+        objects = self.domain.data["objects"]
+        for tag in sorted(objects.keys(), key=lambda tag: tag.lower()):
+            docname, target_id, title = objects[tag]
+            if docnames and docname not in docnames:
+                continue
+            entries = content.setdefault(tag[0].upper(), [])
+            description = title if title != tag else ""
+            entries.append([tag, 0, docname, target_id, "", "", description])
+        return sorted(content.items()), False
+
+
+# =============================================================================
+# Domain
+
+class TraceablesDomain(Domain):
+    """Sphinx domain holding the inventory of traceables.
+
+    The inventory maps each traceable's tag to a ``(docname, target_id,
+    title)`` tuple. It is maintained by the traceable directive and is
+    used to resolve ``:traceable:`` cross references and to generate the
+    traceables index.
+
+    The domain also records, per document, the tags referenced by
+    ``:traceable:`` roles and graph directives and the tags which were
+    defined more than once. Problems with these are reported once per
+    build by the ``diagnostics`` module, instead of once per occurrence.
+
+    """
+
+    name = "traceables"
+    label = "Traceables"
+    object_types = {
+        "traceable": ObjType(l_("traceable"), "traceable"),
+    }
+    roles = {
+        "traceable": TraceableXRefRole(innernodeclass=nodes.literal),
+    }
+    indices = [
+        TraceablesIndex,
+    ]
+    initial_data = {
+        "objects": {},     # tag -> (docname, target_id, title)
+        "references": {},  # docname -> [(tag, lineno, kind)]
+        "duplicates": {},  # docname -> [(tag, lineno)]
+    }
+    data_version = 1
+
+    def add_traceable(self, traceable):
+        target_node = traceable.target_node
+        self.data["objects"][traceable.tag] = (target_node["docname"],
+                                               target_node["refid"],
+                                               traceable.title)
+
+    def note_duplicate(self, tag, docname, lineno):
+        self.data["duplicates"].setdefault(docname, []).append((tag, lineno))
+
+    def process_doc(self, env, docname, document):
+        references = []
+        for node in document.traverse(addnodes.pending_xref):
+            if node.get("refdomain") == self.name:
+                references.append((node["reftarget"], node.line,
+                                   "reference"))
+        for node in document.traverse(traceable_graph):
+            for tag in Traceable.split_tags_string(node["traceables-tags"]):
+                references.append((tag, node["line"], "graph"))
+        if references:
+            self.data["references"][docname] = references
+
+    def clear_doc(self, docname):
+        objects = self.data["objects"]
+        for tag, (object_docname, _, _) in objects.items():
+            if object_docname == docname:
+                del objects[tag]
+        self.data["references"].pop(docname, None)
+        self.data["duplicates"].pop(docname, None)
+
+    def merge_domaindata(self, docnames, otherdata):
+        objects = self.data["objects"]
+        for tag, data in otherdata["objects"].items():
+            if data[0] in docnames:
+                objects[tag] = data
+        for name in ("references", "duplicates"):
+            for docname, entries in otherdata[name].items():
+                if docname in docnames:
+                    self.data[name][docname] = entries
+
+    def resolve_xref(self, env, fromdocname, builder, typ, target, node,
+                     contnode):
+        data = self.data["objects"].get(target)
+        if data is None:
+            return self.resolve_external_xref(env, fromdocname, builder,
+                                              target, contnode)
+        docname, target_id, title = data
+        return make_refnode(builder, fromdocname, docname, target_id,
+                            contnode, title)
+
+    def resolve_external_xref(self, env, fromdocname, builder, target,
+                              contnode):
+        traceable = TraceablesStorage(env).get_external_traceable(target)
+        if traceable is None:
+            return None
+        reference = nodes.reference("", "", internal=False,
+                                    refuri=traceable.get_reference_uri(
+                                        builder, fromdocname),
+                                    reftitle=traceable.title)
+        reference += contnode
+        return reference
+
+    def resolve_any_xref(self, env, fromdocname, builder, target, node,
+                         contnode):
+        reference = self.resolve_xref(env, fromdocname, builder, "traceable",
+                                      target, node, contnode)
+        if reference is None:
+            return []
+        return [("traceables:traceable", reference)]
+
+    def get_objects(self):
+        for tag, (docname, target_id, title) in self.data["objects"].items():
+            yield (tag, title, "traceable", docname, target_id, 1)
+
+
+# =============================================================================
+# Setup this extension part
+
+def setup(app):
+    app.add_domain(TraceablesDomain)
+    app.add_role("traceable", TraceableXRefRole(innernodeclass=nodes.literal))
@@ -0,0 +1,182 @@
+"""
+The ``engine`` module: Traceables processing without a Sphinx application
+===============================================================================
+
+The storage, relationship, filter, matrix and graph logic of this
+extension only needs a few parts of Sphinx's build environment: its
+configuration and a place to keep the traceables. :obj:`TraceablesEngine`
+provides these in memory, so that traceables can be defined, analyzed,
+filtered and turned into matrices and graphs by plain Python code, for
+example in tests and continuous integration checks::
+
+    engine = TraceablesEngine()
+    engine.add("REQ-1", {"title": "Requirement", "status": "approved"})
+    engine.add("TEST-1", {"parents": "REQ-1"})
+    matrix = engine.build_matrix("parents")
+
+The Sphinx directives and processors are a thin adapter around the same
+functions.
+
+"""
+
+from .infrastructure import TraceablesFilter, TraceablesStorage, Traceable
+from .traceables import create_target_node, default_relationships
+from .sources import read_traceable_records
+from .matrix import build_traceable_matrix
+from .graph import (DotGenerator, construct_graph_input, default_graph_styles,
+                    parse_relationships)
+
+
+# =============================================================================
+# Stand-ins for Sphinx's configuration and environment
+
+class EngineConfig(object):
+    """Configuration values of this extension, with their defaults."""
+
+    def __init__(self, relationships=None, sort="tag", graph_styles=None):
+        self.traceables_relationships = relationships or default_relationships
+        self.traceables_sort = sort
+        self.traceables_graph_styles = graph_styles or default_graph_styles
+
+
+class EngineEnvironment(object):
+    """In-memory stand-in for the parts of Sphinx's build environment used
+    by :obj:`TraceablesStorage`.
+
+    Warnings are collected in :attr:`warnings` instead of being reported.
+
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.warnings = []
+
+    def warn(self, docname, message, lineno=None):
+        self.warnings.append(message)
+
+    def doc2path(self, docname, base=True, suffix=None):
+        return docname
+
+
+# =============================================================================
+# Engine
+
+class TraceablesEngine(object):
+    """In-memory model of traceables and their relationships.
+
+    *relationships*, *sort* and *graph_styles* correspond to the
+    ``traceables_relationships``, ``traceables_sort`` and
+    ``traceables_graph_styles`` configuration values.
+
+    """
+
+    def __init__(self, relationships=None, sort="tag", graph_styles=None):
+        self.config = EngineConfig(relationships, sort, graph_styles)
+        self.env = EngineEnvironment(self.config)
+        self.storage = TraceablesStorage(self.env)
+        self.serial = 0
+
+    # -------------------------------------------------------------------------
+    # Defining traceables
+
+    def add(self, tag, attributes=None, docname="", lineno=0):
+        """Define a traceable and return it.
+
+        *attributes* are the traceable's options as given to the
+        ``traceable`` directive, including its relationships, for example
+        ``{"title": "Some title", "parents": "REQ-1, REQ-2"}``. Raises
+        :exc:`ValueError` if a traceable with *tag* already exists.
+
+        """
+        self.serial += 1
+        target_id = "traceables-{0:d}".format(self.serial)
+        target_node = create_target_node(tag, dict(attributes or {}),
+                                         docname, target_id, lineno)
+        traceable = Traceable(target_node)
+        self.storage.add_traceable(traceable)
+        return traceable
+
+    def load(self, path, data_format=None, encoding="utf-8",
+             tag_field="tag", content_field="content"):
+        """Define the traceables in the data file *path* and return them.
+
+        The file is read as by the ``traceable-import`` directive.
+        Records without tag or with invalid attribute names are reported
+        in :attr:`EngineEnvironment.warnings`; records with a tag which
+        is already defined raise :exc:`ValueError`.
+
+        """
+        traceables = []
+        for record in read_traceable_records(path, data_format, encoding,
+                                             tag_field, content_field):
+            self.env.warnings.extend(record.get_problems(path))
+            if record.tag:
+                traceables.append(self.add(record.tag, record.attributes,
+                                           path, record.number))
+        return traceables
+
+    def remove(self, tag):
+        """Remove the traceable with *tag*."""
+        self.storage.traceables_set.remove(self.get(tag))
+
+    def get(self, tag):
+        """Return the traceable with *tag*; raises :exc:`KeyError` if it
+        isn't defined."""
+        return self.storage.get_traceable_by_tag(tag)
+
+    @property
+    def traceables(self):
+        """All defined traceables, in sort order."""
+        return self.storage.get_sorted_traceables()
+
+    # -------------------------------------------------------------------------
+    # Analysis
+
+    def get_relatives(self, tag, relationship, transitive=False):
+        """Return the traceables related to *tag* through *relationship*,
+        in sort order."""
+        traceable = self.get(tag)
+        if transitive:
+            index = self.storage.get_reachability_index(relationship)
+            return index.get_reachable(traceable)
+        graph = self.storage.update_relationships()
+        return graph.get_relatives(traceable, relationship)
+
+    def check_relationships(self):
+        """Return a list of warnings about relationship cycles and
+        unresolved tags; the list is empty if there are none."""
+        del self.env.warnings[:]
+        self.storage.check_relationships()
+        return list(self.env.warnings)
+
+    def filter(self, expression):
+        """Return the traceables matching the filter *expression*."""
+        traceables_filter = TraceablesFilter(self.traceables, self.storage)
+        return traceables_filter.filter(expression)
+
+    def build_matrix(self, relationship, filter_primaries=None,
+                     filter_secondaries=None, transitive=False):
+        """Return the :obj:`TraceableMatrix` of *relationship*."""
+        return build_traceable_matrix(self.storage, relationship,
+                                      filter_primaries, filter_secondaries,
+                                      transitive)
+
+    def walk_graph(self, tags, relationships=None, transitive=False):
+        """Return the :obj:`GraphInput` of a graph starting at *tags*.
+
+        *relationships* has the syntax of the ``traceable-graph``
+        directive's ``:relationships:`` option, for example
+        ``"parents:2, children"``.
+
+        """
+        traceables = [self.get(tag) for tag in tags]
+        relationship_length_pairs = parse_relationships(self.storage,
+                                                        relationships)
+        return construct_graph_input(self.storage, traceables,
+                                     relationship_length_pairs, transitive)
+
+    def generate_dot(self, graph_input):
+        """Return the Graphviz dot source of a graph."""
+        generator = DotGenerator(self.storage,
+                                 self.config.traceables_graph_styles)
+        return generator.generate(graph_input)
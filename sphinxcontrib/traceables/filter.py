@@ -38,6 +38,12 @@ class ExpressionMatcher(object):
         except SyntaxError, error:
             raise FilterError(None, "Invalid filter syntax")
 
+    @property
+    def identifiers(self):
+        """The set of identifiers used in the filter expression."""
+        return set(node.id for node in ast.walk(self.expression_tree)
+                   if isinstance(node, ast.Name))
+
     def matches(self, identifier_values):
         # Verify that the supplied identifiers have a valid syntax.
         for identifier in identifier_values.keys():
@@ -7,9 +7,8 @@ The ``graph`` module: Visualization of traceables
 import textwrap
 from docutils import nodes
 from docutils.parsers.rst import Directive, directives
-from sphinx.ext import graphviz
-from graphviz import Digraph
 
+from . import profiling
 from .infrastructure import ProcessorBase, Traceable
 
 
@@ -32,10 +31,12 @@ class TraceableGraphDirective(Directive):
         "tags": directives.unchanged_required,
         "relationships": directives.unchanged_required,
         "caption": directives.unchanged,
+        "transitive": directives.flag,
     }
     has_content = True
 
     def run(self):
+        from sphinx.ext import graphviz
         env = self.state.document.settings.env
         node = traceable_graph()
         node["source"] = env.docname
@@ -44,6 +45,7 @@ class TraceableGraphDirective(Directive):
         node["traceables-relationships"] = self.options.get("relationships")
         caption = self.options.get("caption") or "Traceable graph"
         node["traceables-caption"] = caption
+        node["traceables-transitive"] = "transitive" in self.options
         figure_node = graphviz.figure_wrapper(self, node, caption)
         return [figure_node]
 
@@ -60,83 +62,152 @@ class GraphProcessor(ProcessorBase):
 
     def process_doctree(self, doctree, docname):
         for graph_node in doctree.traverse(traceable_graph):
-            # Determine graph's starting traceables.
-            start_tags = graph_node["traceables-tags"]
-            start_traceables = self.get_start_traceables(start_tags,
-                                                         graph_node)
-            if not start_traceables:
-                message = ("Traceables: no valid tags for graph,"
-                           " so skipping graph")
-                self.env.warn_node(message, graph_node)
-                msg = nodes.system_message(message=message,
-                                           level=2, type="ERROR",
-                                           source=graph_node["source"],
-                                           line=graph_node["line"])
-                graph_node.replace_self(msg)
-                continue
-
-            # Determine relationships to include in graph.
-            input = graph_node.get("traceables-relationships")
-            relationship_length_pairs = self.parse_relationships(input)
-
-            # Construct input for graph.
-            graph_input = self.construct_graph_input(start_traceables,
-                                                     relationship_length_pairs)
-
-            # Generate diagram input and create output node.
-            graphviz_node = graphviz.graphviz()
+            directive = profiling.describe_directive(graph_node, docname)
+            with profiling.measure("directive", graph_node.tagname,
+                                   directive=directive):
+                self.process_graph_node(graph_node)
+
+    def process_graph_node(self, graph_node):
+        from sphinx.ext import graphviz
+        # Determine graph's starting traceables.
+        start_tags = graph_node["traceables-tags"]
+        start_traceables = self.get_start_traceables(start_tags,
+                                                     graph_node)
+        if not start_traceables:
+            message = ("Traceables: no valid tags for graph,"
+                       " so skipping graph")
+            self.env.warn_node(message, graph_node)
+            msg = nodes.system_message(message=message,
+                                       level=2, type="ERROR",
+                                       source=graph_node["source"],
+                                       line=graph_node["line"])
+            graph_node.replace_self(msg)
+            return
+
+        # Determine relationships to include in graph.
+        input = graph_node.get("traceables-relationships")
+        relationship_length_pairs = self.parse_relationships(input)
+
+        # Construct input for graph.
+        transitive = graph_node.get("traceables-transitive")
+        with profiling.measure("graph", "construct-input"):
+            graph_input = self.construct_graph_input(
+                start_traceables, relationship_length_pairs, transitive)
+
+        # Generate diagram input and create output node.
+        graphviz_node = graphviz.graphviz()
+        with profiling.measure("graph", "generate-dot"):
             graphviz_node["code"] = self.generate_dot(graph_input)
-            graphviz_node["options"] = {}
-            caption = graph_node.get("traceables-caption", "Traceables graph")
-            graphviz_node["alt"] = caption
-            graph_node.replace_self(graphviz_node)
+        graphviz_node["options"] = {}
+        caption = graph_node.get("traceables-caption", "Traceables graph")
+        graphviz_node["alt"] = caption
+        graph_node.replace_self(graphviz_node)
 
     def get_start_traceables(self, tags_string, node):
+        # Unknown tags are reported by the diagnostics module, so they're
+        # skipped silently here.
         tags = Traceable.split_tags_string(tags_string)
-        traceables = []
-        for tag in tags:
-            try:
-                traceable = self.storage.get_traceable_by_tag(tag)
-                traceables.append(traceable)
-            except KeyError:
-                self.env.warn_node("Traceables: no traceable with tag '{0}'"
-                                   " found!".format(tag), node)
-        return traceables
+        tag_index = self.storage.traceables_set.tag_index
+        return [tag_index[tag] for tag in tags if tag in tag_index]
 
     def parse_relationships(self, input):
-        relationships = []
-        if input:
-            for part in input.split(","):
-                pair = part.split(":", 1)
-                if len(pair) == 2:
-                    relationship = pair[0].strip()
-                    try:
-                        max_length = int(pair[1].strip())
-                    except:
-                        raise ValueError("Invalid maximum length: '{0}'"
-                                         .format(part))
-                else:
-                    relationship = part.strip()
-                    max_length = None
-                if not self.storage.is_valid_relationship(relationship):
-                    raise self.Error("Invalid relationship: {0}"
-                                     .format(relationship))
-                dir = self.storage.get_relationship_direction(relationship)
-                relationships.append((relationship, dir, max_length))
+        try:
+            return parse_relationships(self.storage, input)
+        except ValueError, error:
+            raise self.Error(str(error))
+
+    def construct_graph_input(self, traceables, relationship_length_pairs,
+                              transitive=False):
+        try:
+            return construct_graph_input(self.storage, traceables,
+                                         relationship_length_pairs,
+                                         transitive)
+        except ValueError, error:
+            raise self.Error(str(error))
+
+    def generate_dot(self, graph_input):
+        generator = DotGenerator(self.storage, self.graph_styles)
+        return generator.generate(graph_input)
+
+
+# =============================================================================
+# Graph construction
+
+def parse_relationships(storage, input):
+    """Parse a ``:relationships:`` option into relationship names and
+    maximum path lengths.
+
+    *input* is a comma separated list of relationship names, each
+    optionally followed by a colon and the maximum length of paths
+    through that relationship. If *input* is empty, all relationships
+    are used without maximum length.
+
+    """
+    relationships = []
+    if input:
+        for part in input.split(","):
+            pair = part.split(":", 1)
+            if len(pair) == 2:
+                relationship = pair[0].strip()
+                try:
+                    max_length = int(pair[1].strip())
+                except:
+                    raise ValueError("Invalid maximum length: '{0}'"
+                                     .format(part))
+            else:
+                relationship = part.strip()
+                max_length = None
+            if not storage.is_valid_relationship(relationship):
+                raise ValueError("Invalid relationship: {0}"
+                                 .format(relationship))
+            relationships.append((relationship, max_length))
+    else:
+        for relationship in storage.relationship_directions.keys():
+            relationships.append((relationship, None))
+    return relationships
+
+
+def construct_graph_input(storage, traceables, relationship_length_pairs,
+                          transitive=False):
+    """Return the :obj:`GraphInput` of a graph starting at *traceables*.
+
+    Raises :exc:`ValueError` if *transitive* is combined with maximum
+    path lengths, because transitive relationships span paths of any
+    length.
+
+    """
+    if transitive:
+        limited = [relationship for (relationship, max_length)
+                   in relationship_length_pairs if max_length]
+        if limited:
+            raise ValueError("Maximum lengths can't be combined with"
+                             " transitive relationships: {0}"
+                             .format(", ".join(limited)))
+    graph_input = GraphInput(storage, relationship_length_pairs)
+    for traceable in traceables:
+        if transitive:
+            graph_input.add_transitive_relationships(traceable)
         else:
-            all_relationship_dirs = self.storage.relationship_directions
-            for (relationship, dir) in all_relationship_dirs.items():
-                relationships.append((relationship, dir, None))
-        return [(relationship, max_length)
-                for (relationship, dir, max_length) in relationships]
-
-    def construct_graph_input(self, traceables, relationship_length_pairs):
-        graph_input = GraphInput(self.storage, relationship_length_pairs)
-        for traceable in traceables:
             graph_input.add_traceable_walk(traceable)
-        return graph_input
+    return graph_input
+
+
+class DotGenerator(object):
+    """Generator of Graphviz dot source for :obj:`GraphInput` objects.
+
+    *graph_styles* maps traceable categories to dot node attributes, as
+    configured by ``traceables_graph_styles``.
+
+    """
+
+    def __init__(self, storage, graph_styles):
+        self.storage = storage
+        self.graph_styles = graph_styles
+
+    def generate(self, graph_input):
+        # The graphviz package is only needed once a graph is generated.
+        from graphviz import Digraph
 
-    def generate_dot(self, graph_input):
         dot = Digraph("Traceable relationships",
                       comment="Traceable relationships")
         dot.body.append("rankdir=LR")
@@ -202,13 +273,30 @@ class GraphInput(object):
 
     def __init__(self, storage, relationship_length_pairs):
         self.storage = storage
+        self.relationship_graph = storage.update_relationships()
         self.relationship_length_pairs = relationship_length_pairs
         self._traceables = set()
         self._relationships = set()
 
     def add_traceable_walk(self, traceable):
         self._walk_traceable(traceable, 0)
+        self._make_relationships_forward()
 
+    def add_transitive_relationships(self, traceable):
+        """Add relationships to all transitively related traceables."""
+        self._traceables.add(traceable)
+        for relationship, max_length in self.relationship_length_pairs:
+            index = self.storage.get_reachability_index(relationship)
+            direction = self.storage.get_relationship_direction(relationship)
+            for relative in index.get_reachable(traceable):
+                if relative is traceable:
+                    continue
+                self._traceables.add(relative)
+                self._relationships.add((traceable, relative, relationship,
+                                         direction))
+        self._make_relationships_forward()
+
+    def _make_relationships_forward(self):
         # Make all relationships forward in direction.
         for relationship_info in self._relationships.copy():
             traceable1, traceable2, relationship, direction = relationship_info
@@ -224,7 +312,8 @@ class GraphInput(object):
             if max_length and length >= max_length:
                 continue
             direction = self.storage.get_relationship_direction(relationship)
-            relatives = traceable.relationships.get(relationship, ())
+            relatives = self.relationship_graph.get_relatives(traceable,
+                                                              relationship)
             for relative in relatives:
                 relationship_info = (traceable, relative, relationship,
                                      direction)
@@ -234,11 +323,17 @@ class GraphInput(object):
 
     @property
     def traceables(self):
-        return sorted(self._traceables)
+        return sorted(self._traceables,
+                      key=self.relationship_graph.get_traceable_id)
 
     @property
     def relationships(self):
-        return sorted(self._relationships)
+        get_id = self.relationship_graph.get_traceable_id
+        return sorted(self._relationships,
+                      key=lambda (traceable1, traceable2, relationship,
+                                  direction): (get_id(traceable1),
+                                               get_id(traceable2),
+                                               relationship))
 
 
 # =============================================================================
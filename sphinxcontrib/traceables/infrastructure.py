@@ -5,7 +5,7 @@ The ``infrastructure`` module: Infrastructure for processing traceables
 """
 
 import os
-import glob
+import hashlib
 import collections
 from docutils import nodes
 from docutils.parsers.rst import Directive, directives
@@ -16,9 +16,12 @@ from sphinx.environment import NoUri
 from sphinx.errors import ExtensionError
 from sphinx.util.compat import make_admonition
 from sphinx.util.nodes import make_refnode
-from sphinx.util.osutil import copyfile
+from sphinx.util.osutil import copyfile, ensuredir, relative_uri
 
+from . import profiling
 from .filter import ExpressionMatcher, FilterError, FilterFail
+from .relationships import RelationshipGraph
+from .utils import BKTree, LatexEscapeCache, natural_sort_key
 
 
 # =============================================================================
@@ -35,11 +38,13 @@ class TraceablesStorage(object):
         self.relationship_types = self.config.traceables_relationships
         self.relationship_opposites = {}
         self.relationship_directions = {}
+        self.directional_relationships = []
         for relationship_type in self.relationship_types:
             primary, secondary, directional = relationship_type
             self.relationship_opposites[primary] = secondary
             self.relationship_opposites[secondary] = primary
             if directional:
+                self.directional_relationships.append(primary)
                 self.relationship_directions[primary] = 1
                 self.relationship_directions[secondary] = -1
             else:
@@ -53,35 +58,252 @@ class TraceablesStorage(object):
                 self.traceables_set.remove(traceable)
 
     def add_traceable(self, node):
-        known_tags = [t.tag for t in self.traceables_set]
-        if node.tag in known_tags:
+        if node.tag in self.traceables_set.tag_index:
             raise ValueError("More than one traceable with tag '{0}' "
                              "found!".format(node.tag))
         self.traceables_set.add(node)
 
     @property
     def traceables_set(self):
-        if not hasattr(self.env, "traceables_traceables_set"):
-            self.env.traceables_traceables_set = set()
-        return self.env.traceables_traceables_set
+        traceables_set = getattr(self.env, "traceables_traceables_set", None)
+        if not isinstance(traceables_set, TraceablesSet):
+            traceables_set = TraceablesSet(traceables_set or ())
+            self.env.traceables_traceables_set = traceables_set
+        traceables_set.resolve_relationships(self.get_external_traceable)
+        return traceables_set
+
+    @property
+    def inventories(self):
+        """The inventories of other projects, or ``None`` if there are
+        none; see the ``inventory`` module."""
+        return getattr(self.env, "traceables_inventories", None)
+
+    def get_external_traceable(self, tag):
+        """Return the traceable with *tag* from another project's
+        inventory, or ``None`` if there is none."""
+        inventories = self.inventories
+        if not inventories:
+            return None
+        return inventories.get_traceable(tag)
 
     @property
     def traceables_dict(self):
-        traceables_dict = {}
-        for traceable in self.traceables_set:
-            traceables_dict[traceable.tag] = traceable
-        return traceables_dict
+        return dict(self.traceables_set.tag_index)
 
     def get_traceable_by_tag(self, tag):
-        return self.traceables_dict[tag]
+        return self.traceables_set.tag_index[tag]
 
     def get_or_create_traceable_by_tag(self, tag):
-        traceable = self.traceables_dict.get(tag)
+        """Return the traceable with the given tag.
+
+        If no such traceable has been defined, a placeholder is returned
+        instead. Placeholders are kept in a per-build overlay and are
+        never stored in the environment.
+
+        """
+        traceable = self.traceables_set.tag_index.get(tag)
         if not traceable:
-            traceable = Traceable(None, tag)
-            self.add_traceable(traceable)
+            traceable = self.traceables_set.get_placeholder(
+                tag, self.get_external_traceable)
         return traceable
 
+    @property
+    def relationship_graph(self):
+        return self.traceables_set.relationship_graph
+
+    def get_sorted_traceables(self):
+        """Return all defined traceables in sort order.
+
+        The list is a snapshot which is shared until traceables are
+        added or removed, so it must not be modified. Subsets selected
+        from it, for example by :obj:`TraceablesFilter`, are sorted too.
+
+        """
+        snapshot = self.traceables_set.get_cache("sorted-traceables")
+        traceables = snapshot.get("traceables")
+        if traceables is None:
+            graph = self.update_relationships()
+            traceables = [traceable for traceable in graph.traceables
+                          if not (traceable.is_unresolved or
+                                  traceable.is_external)]
+            snapshot["traceables"] = traceables
+        return traceables
+
+    def get_sort_key(self):
+        """Return a key function for sorting traceables in sort order.
+
+        The key of a traceable is its precomputed position in the
+        relationship graph, which orders all traceables, including
+        placeholders, using :meth:`compute_sort_key`.
+
+        """
+        return self.update_relationships().get_traceable_id
+
+    def compute_sort_key(self, traceable):
+        """Return the key determining the sort order of *traceable*.
+
+        The order is configured by ``traceables_sort``: ``"tag"`` sorts
+        by tag, ``"natural"`` sorts by tag with numbers compared
+        numerically, and any other value is the name of an attribute by
+        which to sort, in natural order and followed by traceables
+        without that attribute. Keys are computed once per traceable and
+        cached until traceables are added or removed.
+
+        """
+        keys = self.traceables_set.get_cache("sort-keys")
+        key = keys.get(traceable)
+        if key is None:
+            key = keys[traceable] = self.parse_sort_key(traceable)
+        return key
+
+    def parse_sort_key(self, traceable):
+        sort_mode = self.config.traceables_sort
+        if sort_mode == "tag":
+            return traceable.tag
+        tag_key = natural_sort_key(traceable.tag)
+        if sort_mode == "natural":
+            return (tag_key, traceable.tag)
+        value = traceable.attributes.get(sort_mode)
+        if value is None:
+            return (True, (), tag_key, traceable.tag)
+        return (False, natural_sort_key(value), tag_key, traceable.tag)
+
+    def update_relationships(self):
+        """Rebuild the relationship graph if traceables have changed.
+
+        Placeholder traceables are created for tags which are referenced
+        by relationships but which haven't been defined. Tags defined by
+        other projects are represented by their external traceables
+        instead.
+
+        """
+        traceables_set = self.traceables_set
+        graph = traceables_set.relationship_graph
+        if graph and graph.generation == traceables_set.generation:
+            profiling.count_cache("relationship-graph", True)
+            return graph
+        profiling.count_cache("relationship-graph", False)
+
+        with profiling.measure("relationships", "build"):
+            graph = self.build_relationship_graph()
+        graph.generation = traceables_set.generation
+        traceables_set.relationship_graph = graph
+        return graph
+
+    def build_relationship_graph(self):
+        traceables_set = self.traceables_set
+        graph = RelationshipGraph(self.relationship_types)
+        edges = graph.collect_edges(traceables_set)
+        self.add_external_edges(graph, edges)
+
+        # Rebuild the placeholders for unresolved tags from scratch, so
+        # that stale placeholders don't accumulate.
+        traceables_set.placeholders = {}
+        tag_index = traceables_set.tag_index
+        for relationship_edges in edges:
+            for (tag1, tag2) in relationship_edges:
+                if tag2 not in tag_index:
+                    traceables_set.get_placeholder(
+                        tag2, self.get_external_traceable)
+
+        graph.build(list(traceables_set) +
+                    traceables_set.placeholders.values(), edges,
+                    self.compute_sort_key)
+        return graph
+
+    def add_external_edges(self, graph, edges):
+        """Add the relationships which traceables of other projects have
+        with this project's traceables to *edges*.
+
+        Relationships between traceables of other projects are left out,
+        so that the graph only extends one step beyond this project.
+
+        """
+        inventories = self.inventories
+        if not inventories:
+            return
+        tag_index = self.traceables_set.tag_index
+        externals = [traceable for traceable in inventories.get_traceables()
+                     if traceable.tag not in tag_index]
+        external_edges = graph.collect_edges(externals)
+        for (relationship_edges, pairs) in zip(edges, external_edges):
+            relationship_edges.extend(
+                (tag1, tag2) for (tag1, tag2) in pairs
+                if tag1 in tag_index or tag2 in tag_index)
+
+    @property
+    def relationship_analysis(self):
+        graph = self.update_relationships()
+        return graph.get_analysis(self.directional_relationships)
+
+    def check_relationships(self):
+        """Warn about relationship cycles and unresolved tags.
+
+        All problems are reported together in a single warning.
+
+        """
+        analysis = self.relationship_analysis
+        if analysis.is_consistent:
+            return
+
+        lines = ["Traceables: inconsistent relationships found:"]
+        for (name, traceables) in analysis.cycles:
+            lines.append("  cycle in relationship '{0}' between: {1}"
+                         .format(name, ", ".join(
+                             self.describe_location(traceable)
+                             for traceable in traceables)))
+        for (placeholder, referrers) in analysis.unresolved:
+            lines.append("  no traceable with tag '{0}' found, referenced"
+                         " by: {1}{2}"
+                         .format(placeholder.tag, ", ".join(
+                             self.describe_location(referrer)
+                             for referrer in referrers),
+                             self.describe_suggestions(placeholder.tag)))
+        self.env.warn(None, "\n".join(lines))
+
+    def get_tag_suggestions(self, tag, limit=3):
+        """Return up to *limit* defined tags similar to *tag*, closest
+        first.
+
+        Tags are looked up in a :obj:`BKTree` over all defined tags,
+        which is built once and kept until traceables change. The
+        allowed edit distance grows with the length of *tag*.
+
+        """
+        cache = self.traceables_set.get_cache("tag-suggestions")
+        tree = cache.get("tree")
+        if tree is None:
+            tree = cache["tree"] = BKTree(
+                sorted(self.traceables_set.tag_index))
+        max_distance = max(1, min(3, len(tag) // 3))
+        return [similar_tag for (distance, similar_tag)
+                in tree.search(tag, max_distance)[:limit]]
+
+    def describe_suggestions(self, tag):
+        suggestions = self.get_tag_suggestions(tag)
+        if not suggestions:
+            return ""
+        return "; did you mean {0}?".format(" or ".join(
+            "'{0}'".format(suggestion) for suggestion in suggestions))
+
+    def describe_location(self, traceable):
+        if traceable.is_unresolved:
+            return traceable.tag
+        if traceable.is_external:
+            return "{0} ({1})".format(traceable.tag, traceable.project)
+        target_node = traceable.target_node
+        path = self.env.doc2path(target_node["docname"])
+        return "{0} ({1}:{2})".format(traceable.tag, path,
+                                      target_node["lineno"])
+
+    def get_reachability_index(self, name):
+        graph = self.update_relationships()
+        return graph.get_reachability_index(name)
+
+    def get_latex_escape_cache(self):
+        return self.traceables_set.get_cache("latex-escape",
+                                             LatexEscapeCache)
+
     def is_valid_relationship(self, name):
         return name in self.relationship_opposites
 
@@ -98,6 +320,117 @@ class TraceablesStorage(object):
             raise ValueError("Unknown relationship name: '{0}'".format(name))
 
 
+class TraceablesSet(set):
+    """Set of traceables which is stored in the build environment.
+
+    Relationships between traceables are kept in a
+    :obj:`RelationshipGraph`, which pickles them as flat integer arrays
+    instead of as references between :obj:`Traceable` instances. This
+    keeps pickling of the environment flat, instead of recursing through
+    the linked graph of traceables. After unpickling the references are
+    rebuilt lazily by :meth:`resolve_relationships`.
+
+    Only defined traceables are members of the set. Placeholders for
+    unresolved tags are kept in the ``placeholders`` overlay, which is
+    rebuilt during each build and is not pickled.
+
+    The ``generation`` counter is incremented whenever traceables are
+    added or removed, so that derived data can detect when it is stale.
+    Such derived data can be kept in the caches returned by
+    :meth:`get_cache`, which are not pickled either.
+
+    """
+
+    def __init__(self, traceables=()):
+        set.__init__(self)
+        self.generation = 0
+        self.relationship_graph = None
+        self.placeholders = {}
+        self.tag_index = {}
+        self.caches = {}
+        self.caches_generation = None
+        for traceable in traceables:
+            self.add(traceable)
+
+    def __reduce__(self):
+        return (self.__class__, (), self.__getstate__())
+
+    def __getstate__(self):
+        return {"traceables": list(self),
+                "generation": self.generation,
+                "relationship_graph": self.relationship_graph}
+
+    def __setstate__(self, state):
+        for traceable in state["traceables"]:
+            self.add(traceable)
+        self.generation = state["generation"]
+        self.relationship_graph = state["relationship_graph"]
+
+    def add(self, traceable):
+        set.add(self, traceable)
+        self.tag_index[traceable.tag] = traceable
+        self.generation += 1
+
+    def remove(self, traceable):
+        set.remove(self, traceable)
+        self._remove_from_tag_index(traceable)
+        self.generation += 1
+
+    def discard(self, traceable):
+        set.discard(self, traceable)
+        self._remove_from_tag_index(traceable)
+        self.generation += 1
+
+    def _remove_from_tag_index(self, traceable):
+        if self.tag_index.get(traceable.tag) is traceable:
+            del self.tag_index[traceable.tag]
+
+    def get_placeholder(self, tag, get_external=None):
+        """Return the placeholder for the undefined *tag*.
+
+        If *get_external* is given, it is called to look up the tag in
+        other projects, and the external traceable it returns is used
+        instead of a placeholder.
+
+        """
+        placeholder = self.placeholders.get(tag)
+        if not placeholder:
+            if get_external:
+                placeholder = get_external(tag)
+            if not placeholder:
+                placeholder = Traceable(None, tag)
+            self.placeholders[tag] = placeholder
+        return placeholder
+
+    def get_cache(self, name, factory=dict):
+        """Return the cache called *name*.
+
+        The cache is created by calling *factory* if it doesn't exist yet.
+        All caches are cleared whenever the generation changes.
+
+        """
+        if self.caches_generation != self.generation:
+            self.caches = {}
+            self.caches_generation = self.generation
+        cache = self.caches.get(name)
+        if cache is None:
+            cache = self.caches[name] = factory()
+        return cache
+
+    def resolve_relationships(self, get_external=None):
+        graph = self.relationship_graph
+        if graph is None or graph.is_bound:
+            return
+        if not graph.bind(self.tag_index,
+                          lambda tag: self.get_placeholder(tag, get_external)):
+            self.relationship_graph = None
+
+    def invalidate(self):
+        """Mark all data derived from this set as stale, for example
+        because the inventories of other projects have changed."""
+        self.generation += 1
+
+
 # =============================================================================
 # Processor
 
@@ -118,6 +451,22 @@ class Traceable(object):
 
         self.relationships = {}
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        # Relationships are pickled by the relationship graph.
+        state["relationships"] = {}
+
+        # Pickle a detached copy of the target node, so that its parent
+        # doctree isn't dragged along.
+        if self.target_node is not None:
+            target_node = self.target_node.copy()
+            target_node.source = self.target_node.source
+            target_node.line = self.target_node.line
+            state["target_node"] = target_node
+
+        return state
+
     def __str__(self):
         arguments = [self.tag]
         if self.is_unresolved:
@@ -144,6 +493,40 @@ class Traceable(object):
     def is_unresolved(self):
         return self.target_node is None
 
+    @property
+    def is_external(self):
+        return False
+
+    def get_reference_uri(self, builder, docname):
+        """Return the URI of this traceable relative to *docname*.
+
+        Returns ``None`` if this traceable is unresolved or if the
+        builder can't provide a URI for it.
+
+        """
+        if not self.target_node:
+            return None
+        target_docname = self.target_node["docname"]
+        target_id = self.target_node["refid"]
+        if target_docname == docname:
+            return "#" + target_id
+        try:
+            return (builder.get_relative_uri(docname, target_docname) +
+                    "#" + target_id)
+        except NoUri:
+            return None
+
+    def relocate_reference_node(self, reference_node, builder, docname):
+        """Update a node created by :meth:`make_reference_node` so that
+        it can be used in *docname*."""
+        reference_node.attributes.pop("refid", None)
+        reference_node.attributes.pop("refuri", None)
+        uri = self.get_reference_uri(builder, docname)
+        if uri and uri.startswith("#"):
+            reference_node["refid"] = uri[1:]
+        elif uri:
+            reference_node["refuri"] = uri
+
     def make_reference_node(self, builder, docname):
         text_node = nodes.literal(text=self.tag)
         if self.target_node:
@@ -168,6 +551,52 @@ class Traceable(object):
         return filter(None, (tag.strip() for tag in tags_string.split(",")))
 
 
+class ExternalTraceable(Traceable):
+    """Traceable defined by another project and loaded from its inventory.
+
+    External traceables take the place of placeholders for tags which
+    aren't defined in this project. They have attributes and relationships
+    with this project's traceables, and references to them link to *uri*
+    in the other project's documentation, but they aren't listed, filtered
+    or displayed by this project.
+
+    """
+
+    def __init__(self, tag, attributes, project, uri):
+        Traceable.__init__(self, None, tag)
+        self.attributes = attributes
+        self.project = project
+        self.uri = uri
+
+    def __str__(self):
+        return "<{0}({1}, {2})>".format(self.__class__.__name__, self.tag,
+                                        self.project)
+
+    @property
+    def is_unresolved(self):
+        return False
+
+    @property
+    def is_external(self):
+        return True
+
+    def get_reference_uri(self, builder, docname):
+        # Relative URIs are relative to the root of this project's output.
+        if ("://" in self.uri or self.uri.startswith("/") or
+                builder.format != "html"):
+            return self.uri
+        return relative_uri(builder.get_target_uri(docname), self.uri)
+
+    def make_reference_node(self, builder, docname):
+        text_node = nodes.literal(text=self.tag)
+        reference_node = nodes.reference("", "", internal=False,
+                                         refuri=self.get_reference_uri(
+                                             builder, docname),
+                                         reftitle=self.tag)
+        reference_node += text_node
+        return reference_node
+
+
 class ProcessorManager(object):
 
     processor_classes = []
@@ -184,8 +613,11 @@ class ProcessorManager(object):
             self.processors.append(processor_class(app))
 
     def process_doctree(self, doctree, docname):
-        for processor in self.processors:
-            processor.process_doctree(doctree, docname)
+        with profiling.measure("document", docname, docname=docname):
+            for processor in self.processors:
+                with profiling.measure("processor",
+                                       processor.__class__.__name__):
+                    processor.process_doctree(doctree, docname)
 
 
 class ProcessorBase(object):
@@ -201,8 +633,11 @@ class ProcessorBase(object):
 
     def process_doctree(self, doctree, docname):
         for node in doctree.traverse(self.process_node_type):
+            directive = profiling.describe_directive(node, docname)
             try:
-                self.process_node(node, doctree, docname)
+                with profiling.measure("directive", node.tagname,
+                                       directive=directive):
+                    self.process_node(node, doctree, docname)
             except self.Error, error:
                 message = str(error)
                 self.env.warn_node(message, node)
@@ -269,59 +704,188 @@ class FormatProcessorBase(ProcessorBase):
     def process_node_with_formatter(self, node, formatter, doctree, docname):
         raise NotImplementedError()
 
+    def run_formatter(self, formatter, docname, node, data, options):
+        with profiling.measure("formatter", formatter.__class__.__name__):
+            return formatter.format(self.app, docname, node, data, options)
+
+    # -------------------------------------------------------------------------
+    # Caching of formatter output
+
+    result_cache_name = "directive-results"
+
+    def get_result_cache_key(self, formatter, options):
+        normalized_options = []
+        for name, value in sorted(options.items()):
+            if isinstance(value, basestring):
+                value = value.strip()
+            elif isinstance(value, list):
+                value = tuple(value)
+            normalized_options.append((name, value))
+        return (self.__class__.__name__, id(formatter),
+                self.app.builder.name, tuple(normalized_options))
+
+    def get_cached_nodes(self, formatter, options, docname):
+        """Return output cached for an identical directive, or ``None``.
+
+        Directives are identical if they are processed by the same
+        formatter with the same options. The cached output is copied and
+        its references to traceables are updated for *docname*.
+
+        """
+        cache = self.storage.traceables_set.get_cache(self.result_cache_name)
+        cached_nodes = cache.get(self.get_result_cache_key(formatter,
+                                                           options))
+        profiling.count_cache(self.result_cache_name,
+                              cached_nodes is not None)
+        if cached_nodes is None:
+            return None
+        new_nodes = [node.deepcopy() for node in cached_nodes]
+        for node in new_nodes:
+            self.relocate_nodes(node, docname)
+        return new_nodes
+
+    def cache_nodes(self, formatter, options, new_nodes):
+        """Cache the output of a directive for reuse by identical ones.
+
+        Output containing raw nodes isn't cached, because the references
+        within them can't be updated for other documents.
+
+        """
+        if not isinstance(new_nodes, list):
+            new_nodes = [new_nodes]
+        for node in new_nodes:
+            if isinstance(node, nodes.raw) or node.traverse(nodes.raw):
+                return
+        cache = self.storage.traceables_set.get_cache(self.result_cache_name)
+        cache[self.get_result_cache_key(formatter, options)] = [
+            node.deepcopy() for node in new_nodes]
+
+    def relocate_nodes(self, node, docname):
+        # References to traceables of other projects are relocated too,
+        # because their URIs can be relative to this project's root.
+        tag_index = self.storage.traceables_set.tag_index
+        for reference in node.traverse(nodes.reference):
+            tag = reference.get("reftitle")
+            traceable = (tag_index.get(tag) or
+                         self.storage.get_external_traceable(tag))
+            if traceable:
+                traceable.relocate_reference_node(reference,
+                                                  self.app.builder, docname)
+        for child in node.traverse(nodes.Element):
+            if "traceables-docname" in child.attributes:
+                child["traceables-docname"] = docname
+
 
 # =============================================================================
 # Filtering class
 
 class TraceablesFilter(object):
+    """Filter for selecting traceables using a filter expression.
+
+    If a storage is given, filter expressions can also use identifiers
+    for transitive relationships. These are named after a relationship
+    prefixed with ``all_`` and with dashes replaced by underscores, for
+    example ``all_parents`` or ``all_created_in``. Their value is the set
+    of tags of all traceables reachable through that relationship.
+
+    """
 
-    def __init__(self, traceables):
+    transitive_prefix = "all_"
+
+    def __init__(self, traceables, storage=None):
         self.traceables = traceables
+        self.storage = storage
+        self.transitive_identifiers = {}
 
     def filter(self, expression_string):
-        matcher = ExpressionMatcher(expression_string)
-
-        matching_traceables = []
-        for traceable in self.traceables:
-            try:
-                if self.traceable_matches(matcher, traceable):
-                    matching_traceables.append(traceable)
-            except FilterFail, error:
-                continue
+        with profiling.measure("filter", "compile"):
+            matcher = ExpressionMatcher(expression_string)
+            self.transitive_identifiers = self.get_transitive_identifiers(
+                matcher.identifiers)
+
+        with profiling.measure("filter", "evaluate"):
+            matching_traceables = []
+            for traceable in self.traceables:
+                try:
+                    if self.traceable_matches(matcher, traceable):
+                        matching_traceables.append(traceable)
+                except FilterFail, error:
+                    continue
 
         return matching_traceables
 
+    def get_transitive_identifiers(self, identifiers):
+        if not self.storage:
+            return {}
+        transitive_identifiers = {}
+        for name in self.storage.relationship_opposites.keys():
+            identifier = self.transitive_prefix + name.replace("-", "_")
+            if identifier in identifiers:
+                index = self.storage.get_reachability_index(name)
+                transitive_identifiers[identifier] = index
+        return transitive_identifiers
+
     def traceable_matches(self, matcher, traceable):
         identifier_values = {}
         identifier_values.update(traceable.attributes)
         identifier_values["tag"] = traceable.tag
+        for identifier, index in self.transitive_identifiers.items():
+            identifier_values[identifier] = index.get_reachable_tags(
+                traceable)
         return matcher.matches(identifier_values)
 
 
 # =============================================================================
 # Signal handling functions
 
-def add_static_files(app):
-    base_directory = os.path.dirname(__file__)
-    static_directory = os.path.join(base_directory, "static")
+static_directory = os.path.join(os.path.dirname(__file__), "static")
+static_filenames = None
+
+
+def get_static_filenames():
+    """Return the names of the files in this extension's static directory.
+
+    The directory is only listed once per process.
 
-    stylesheet_glob = os.path.join(static_directory, "*.css")
-    for stylesheet_path in glob.glob(stylesheet_glob):
-        basename = os.path.basename(stylesheet_path)
-        app.add_stylesheet(basename)
+    """
+    global static_filenames
+    if static_filenames is None:
+        static_filenames = sorted(os.listdir(static_directory))
+    return static_filenames
+
+
+def get_file_digest(path):
+    with open(path, "rb") as input_file:
+        return hashlib.sha1(input_file.read()).hexdigest()
+
+
+def add_static_files(app):
+    # Scripts aren't added to every page; the nodes needing them link to
+    # them instead.
+    for filename in get_static_filenames():
+        if filename.endswith(".css"):
+            app.add_stylesheet(filename)
 
 
 def copy_static_files(app, exception):
+    """Copy static files to the output's ``_static`` directory.
+
+    Files whose content is already present in the output are left
+    untouched, so that incremental builds don't rewrite them.
+
+    """
     if app.builder.name != "html" or exception:
         return
 
-    base_directory = os.path.dirname(__file__)
-    static_directory = os.path.join(base_directory, "static")
-
-    for filename in os.listdir(static_directory):
+    destination_directory = os.path.join(app.builder.outdir, "_static")
+    ensuredir(destination_directory)
+    for filename in get_static_filenames():
         source_path = os.path.join(static_directory, filename)
-        destination_path = os.path.join(app.builder.outdir, "_static",
-                                        filename)
+        destination_path = os.path.join(destination_directory, filename)
+        if (os.path.exists(destination_path) and
+                get_file_digest(source_path) ==
+                get_file_digest(destination_path)):
+            continue
         copyfile(source_path, destination_path)
 
 
@@ -330,6 +894,11 @@ def process_doctree(app, doctree, docname):
     processor_manager.process_doctree(doctree, docname)
 
 
+def check_relationships(app, env):
+    storage = TraceablesStorage(env)
+    storage.check_relationships()
+
+
 def purge_docname(app, env, docname):
     storage = TraceablesStorage(env)
     storage.purge(docname)
@@ -339,7 +908,9 @@ def purge_docname(app, env, docname):
 # Setup extension
 
 def setup(app):
+    app.add_config_value("traceables_sort", "tag", "env")
     app.connect("builder-inited", add_static_files)
     app.connect("build-finished", copy_static_files)
     app.connect("doctree-resolved", process_doctree)
     app.connect("env-purge-doc", purge_docname)
+    app.connect("env-updated", check_relationships)
@@ -0,0 +1,325 @@
+"""
+The ``inventory`` module: Traceables shared between separate projects
+===============================================================================
+
+Each HTML build writes a ``traceables.inv`` file to its output directory.
+It holds the tag, URI, attributes and relationships of every traceable in
+the project, as zlib-compressed JSON after a short plain text header.
+
+Other projects refer to these traceables by listing such inventories in
+their ``traceables_inventories`` configuration value, similar to
+intersphinx::
+
+    traceables_inventories = {
+        "system": ("https://example.com/system/",
+                   "../system/_build/html/traceables.inv"),
+    }
+
+Each entry maps a project name to the base URI of its documentation and
+the local path of its inventory, relative to the configuration directory.
+If the path is ``None``, the base URI must be a local directory holding
+the inventory. Tags which aren't defined in the current project are then
+looked up in these inventories, so that references and relationships to
+traceables of other projects resolve to :obj:`ExternalTraceable`
+instances linking to the other project's documentation. Relationships
+which the other projects' traceables have with this project's traceables
+are included as well.
+
+Inventories are read lazily, when the relationships are first needed,
+and are kept in the build environment together with the modification
+times of their files. They are only read again when their files change,
+in which case the documents involving traceables of other projects are
+read again too.
+
+"""
+
+import os
+import json
+import zlib
+
+from .infrastructure import ExternalTraceable, TraceablesStorage
+
+
+# =============================================================================
+# Inventory file format
+
+inventory_filename = "traceables.inv"
+
+inventory_header = "# Sphinx traceables inventory version 1"
+
+
+class InventoryError(Exception):
+    pass
+
+
+class Inventory(object):
+    """The traceables of a single project.
+
+    *entries* maps each tag to a ``(uri, attributes, relationships)``
+    tuple: the URI of the traceable relative to the root of the project's
+    documentation, its attributes other than relationships, and a dict
+    mapping each relationship name to a list of tags.
+
+    """
+
+    def __init__(self, project="", version="", entries=None):
+        self.project = project
+        self.version = version
+        self.entries = entries or {}
+
+    def add(self, tag, uri, attributes, relationships):
+        self.entries[tag] = (uri, attributes, relationships)
+
+    def get_attributes(self, tag):
+        """Return the attributes of *tag* including its relationships, as
+        they were given in the traceable's definition."""
+        uri, attributes, relationships = self.entries[tag]
+        attributes = dict(attributes)
+        for (name, tags) in relationships.items():
+            attributes[name] = ", ".join(tags)
+        return attributes
+
+    def dumps(self):
+        """Return the content of an inventory file."""
+        data = [[tag, uri, attributes, relationships]
+                for (tag, (uri, attributes, relationships))
+                in sorted(self.entries.items())]
+        body = json.dumps(data, separators=(",", ":"), sort_keys=True)
+        header = "\n".join([
+            inventory_header,
+            "# Project: {0}".format(self.project),
+            "# Version: {0}".format(self.version),
+            "# The remainder of this file is compressed using zlib.",
+            ""])
+        return header.encode("utf-8") + zlib.compress(body.encode("utf-8"),
+                                                      9)
+
+    @classmethod
+    def loads(cls, content):
+        """Return the inventory in *content*, which was returned by
+        :meth:`dumps`; raises :exc:`InventoryError` if it is invalid."""
+        lines = content.split("\n", 4)
+        if len(lines) < 5 or lines[0] != inventory_header:
+            raise InventoryError("not a traceables inventory")
+        project = lines[1].decode("utf-8").partition(": ")[2]
+        version = lines[2].decode("utf-8").partition(": ")[2]
+        try:
+            data = json.loads(zlib.decompress(lines[4]).decode("utf-8"))
+        except (zlib.error, ValueError), error:
+            raise InventoryError("invalid content: {0}".format(error))
+        entries = dict((tag, (uri, attributes, relationships))
+                       for (tag, uri, attributes, relationships) in data)
+        return cls(project, version, entries)
+
+
+def create_inventory(app):
+    """Return the inventory of the project built by *app*."""
+    builder = app.builder
+    storage = TraceablesStorage(builder.env)
+    inventory = Inventory(app.config.project, app.config.version)
+    for traceable in storage.get_sorted_traceables():
+        target_node = traceable.target_node
+        uri = "{0}#{1}".format(builder.get_target_uri(target_node["docname"]),
+                               target_node["refid"])
+        attributes = {}
+        relationships = {}
+        for (name, value) in traceable.attributes.items():
+            if storage.is_valid_relationship(name):
+                relationships[name] = traceable.split_tags_string(value)
+            else:
+                attributes[name] = value
+        inventory.add(traceable.tag, uri, attributes, relationships)
+    return inventory
+
+
+# =============================================================================
+# Inventories of other projects
+
+class InventorySet(object):
+    """The inventories of other projects used by this project.
+
+    The set is stored in the build environment, so that inventories read
+    during one build are reused by the next one if their files haven't
+    changed. The external traceables created from them aren't stored.
+
+    """
+
+    def __init__(self):
+        self.sources = []   # [(project, base_uri, path)]
+        self.cache = {}     # path -> (mtime, inventory)
+        self.traceables = None
+        self.warn = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["traceables"] = None
+        state["warn"] = None
+        return state
+
+    def __nonzero__(self):
+        return bool(self.sources)
+
+    def configure(self, sources, warn):
+        """Use the inventories in *sources* and return whether they have
+        changed since they were last read."""
+        changed = sources != self.sources
+        self.sources = sources
+        self.warn = warn
+        for (project, base_uri, path) in sources:
+            cached = self.cache.get(path)
+            if cached is None or cached[0] != self.get_mtime(path):
+                changed = True
+        for path in set(self.cache) - set(path for (_, _, path) in sources):
+            del self.cache[path]
+        if changed:
+            self.traceables = None
+        return changed
+
+    @staticmethod
+    def get_mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def get_inventory(self, path):
+        mtime = self.get_mtime(path)
+        cached = self.cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, "rb") as inventory_file:
+                inventory = Inventory.loads(inventory_file.read())
+        except (IOError, InventoryError), error:
+            if self.warn:
+                self.warn(None, "Traceables: inventory {0} could not be"
+                                " read: {1}".format(path, error))
+            inventory = Inventory()
+        self.cache[path] = (mtime, inventory)
+        return inventory
+
+    def load(self):
+        # Tags of projects listed earlier take precedence.
+        traceables = {}
+        for (project, base_uri, path) in self.sources:
+            inventory = self.get_inventory(path)
+            for (tag, (uri, _, _)) in inventory.entries.items():
+                if tag not in traceables:
+                    traceables[tag] = ExternalTraceable(
+                        tag, inventory.get_attributes(tag), project,
+                        self.join_uri(base_uri, uri))
+        return traceables
+
+    @staticmethod
+    def join_uri(base_uri, uri):
+        if not base_uri:
+            return uri
+        return base_uri.rstrip("/") + "/" + uri
+
+    def get_traceables(self):
+        """Return all traceables of other projects."""
+        if self.traceables is None:
+            self.traceables = self.load()
+        return self.traceables.values()
+
+    def get_traceable(self, tag):
+        """Return the traceable of another project with *tag*, or
+        ``None``."""
+        if self.traceables is None:
+            self.traceables = self.load()
+        return self.traceables.get(tag)
+
+
+def get_inventory_sources(app):
+    sources = []
+    for (project, value) in sorted(app.config.traceables_inventories.items()):
+        base_uri, path = value
+        if path is None:
+            path = os.path.join(base_uri, inventory_filename)
+        path = os.path.normpath(os.path.join(app.confdir, path))
+        sources.append((project, base_uri, path))
+    return sources
+
+
+def get_external_docnames(env):
+    """Return the documents involving traceables of other projects.
+
+    These are documents with references to tags not defined in this
+    project, documents defining traceables with relationships to such
+    tags, and documents defining traceables which traceables of other
+    projects have relationships with.
+
+    """
+    storage = TraceablesStorage(env)
+    tag_index = storage.traceables_set.tag_index
+    docnames = set()
+    references = env.get_domain("traceables").data["references"]
+    for (docname, entries) in references.items():
+        if any(tag not in tag_index for (tag, _, _) in entries):
+            docnames.add(docname)
+
+    referenced_tags = set()
+    for traceable in storage.inventories.get_traceables():
+        for (name, value) in traceable.attributes.items():
+            if storage.is_valid_relationship(name):
+                referenced_tags.update(traceable.split_tags_string(value))
+    for traceable in storage.traceables_set:
+        if traceable.tag in referenced_tags:
+            docnames.add(traceable.target_node["docname"])
+            continue
+        for (name, value) in traceable.attributes.items():
+            if (storage.is_valid_relationship(name) and
+                    any(tag not in tag_index
+                        for tag in traceable.split_tags_string(value))):
+                docnames.add(traceable.target_node["docname"])
+                break
+    return docnames
+
+
+# =============================================================================
+# Signal handling functions
+
+def configure_inventories(app):
+    env = app.builder.env
+    inventories = getattr(env, "traceables_inventories", None)
+    if not isinstance(inventories, InventorySet):
+        inventories = env.traceables_inventories = InventorySet()
+    changed = inventories.configure(get_inventory_sources(app), env.warn)
+    env.traceables_inventories_changed = changed and bool(inventories)
+    if changed:
+        traceables_set = getattr(env, "traceables_traceables_set", None)
+        if traceables_set is not None:
+            traceables_set.invalidate()
+
+
+def get_outdated_docnames(app, env, added, changed, removed):
+    if not getattr(env, "traceables_inventories_changed", False):
+        return []
+    env.traceables_inventories_changed = False
+    return sorted(get_external_docnames(env) & set(env.found_docs))
+
+
+def write_inventory(app, exception):
+    if exception or app.builder.format != "html":
+        return
+    content = create_inventory(app).dumps()
+    path = os.path.join(app.outdir, inventory_filename)
+
+    # Leave an unchanged inventory untouched, so that projects using it
+    # don't read it again.
+    if os.path.exists(path):
+        with open(path, "rb") as inventory_file:
+            if inventory_file.read() == content:
+                return
+    with open(path, "wb") as inventory_file:
+        inventory_file.write(content)
+
+
+# =============================================================================
+# Setup this extension part
+
+def setup(app):
+    app.add_config_value("traceables_inventories", {}, "env")
+    app.connect("builder-inited", configure_inventories)
+    app.connect("env-get-outdated", get_outdated_docnames)
+    app.connect("build-finished", write_inventory)
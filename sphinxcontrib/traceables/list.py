@@ -6,8 +6,12 @@ The ``list`` module: Lists of traceables
 
 from docutils import nodes
 from docutils.parsers.rst import Directive, directives
+from docutils.utils import new_document
 
-from .infrastructure import FormatProcessorBase, TraceablesFilter
+from .infrastructure import (FormatProcessorBase, TraceablesFilter,
+                             TraceablesStorage)
+from .templates import (TemplateFormatterBase, create_link_context,
+                        get_template)
 
 
 # =============================================================================
@@ -19,6 +23,8 @@ class traceable_list(nodes.General, nodes.Element):
     Attributes:
         traceable-filter: The filter expression to determine which
             traceables to include in the output.
+        traceables-page-size: If set, causes HTML output to be split
+            over generated pages with this many traceables each.
 
     """
 
@@ -35,26 +41,101 @@ class ListProcessor(FormatProcessorBase):
 
     def process_node_with_formatter(self, list_node, formatter,
                                     doctree, docname):
-        traceables = sorted(self.storage.traceables_set,
-                            key=lambda t: t.tag)
+        options = {
+            "format": list_node.get("traceables-format"),
+            "filter": list_node.get("traceables-filter"),
+            "attributes": list_node.get("traceables-attributes"),
+            "page-size": list_node.get("traceables-page-size"),
+        }
+        new_nodes = self.get_cached_nodes(formatter, options, docname)
+        if new_nodes is not None:
+            list_node.replace_self(new_nodes)
+            return
+
+        traceables = self.storage.get_sorted_traceables()
 
-        filter = TraceablesFilter(traceables)
+        filter = TraceablesFilter(traceables, self.storage)
         filter_expression = list_node["traceables-filter"]
         if filter_expression:
             filtered_traceables = filter.filter(filter_expression)
         else:
             filtered_traceables = traceables
 
-        options = {
-            "format": list_node.get("traceables-format"),
-            "filter": list_node.get("traceables-filter"),
-            "attributes": list_node.get("traceables-attributes"),
-        }
-
-        new_nodes = formatter.format(self.app, docname, list_node,
-                                     filtered_traceables, options)
+        page_size = options["page-size"]
+        if (page_size and self.app.builder.format == "html" and
+                len(filtered_traceables) > page_size):
+            new_nodes = self.paginate(list_node, formatter, docname,
+                                      filtered_traceables, options)
+        else:
+            new_nodes = self.run_formatter(formatter, docname, list_node,
+                                           filtered_traceables, options)
+        self.cache_nodes(formatter, options, new_nodes)
         list_node.replace_self(new_nodes)
 
+    def paginate(self, list_node, formatter, docname, traceables, options):
+        """Split the list over the current and generated pages.
+
+        Every page is output using *formatter*: the first page in place,
+        the other pages as HTML written as additional pages by
+        :func:`collect_list_pages`. All pages show navigation links to
+        each other.
+
+        """
+        page_size = options["page-size"]
+        slices = [traceables[start:start + page_size]
+                  for start in range(0, len(traceables), page_size)]
+        pagenames = [docname] + [
+            "{0}-traceables-{1}-{2}".format(docname, list_node["line"],
+                                            number)
+            for number in range(2, len(slices) + 1)]
+
+        title = self.env.titles[docname].astext()
+        pages = self.storage.traceables_set.get_cache(list_pages_cache_name)
+        for (index, pagename) in enumerate(pagenames[1:], 1):
+            body = self.render_page(formatter, pagename, list_node,
+                                    slices[index], options)
+            body += self.render_navigation(pagenames, index, pagename)
+            page_title = u"{0} ({1:d}/{2:d})".format(title, index + 1,
+                                                     len(pagenames))
+            pages[pagename] = (page_title, body)
+
+        new_nodes = self.run_formatter(formatter, docname, list_node,
+                                       slices[0], options)
+        if not isinstance(new_nodes, list):
+            new_nodes = [new_nodes]
+        navigation = self.render_navigation(pagenames, 0, docname)
+        return new_nodes + [nodes.raw("", navigation, format="html")]
+
+    def render_page(self, formatter, pagename, list_node, traceables,
+                    options):
+        # Other pages need an HTML string. Template formatters render
+        # one directly; the nodes of other formatters are translated by
+        # the builder's HTML translator.
+        if isinstance(formatter, TemplateFormatterBase):
+            return formatter.render(self.app, pagename, list_node,
+                                    traceables, options)
+        new_nodes = self.run_formatter(formatter, pagename, list_node,
+                                       traceables, options)
+        builder = self.app.builder
+        document = new_document(pagename, builder.docsettings)
+        document.extend(new_nodes if isinstance(new_nodes, list)
+                        else [new_nodes])
+        translator = builder.translator_class(builder, document)
+        document.walkabout(translator)
+        return u"".join(translator.body)
+
+    def render_navigation(self, pagenames, current_index, docname):
+        builder = self.app.builder
+        pages = []
+        for (index, pagename) in enumerate(pagenames):
+            pages.append({
+                "number": index + 1,
+                "uri": builder.get_relative_uri(docname, pagename),
+                "current": index == current_index,
+            })
+        template = get_template(self.app, "traceables-pagination.html")
+        return template.render({"pages": pages})
+
 
 # =============================================================================
 # Built-in formatters
@@ -146,6 +227,35 @@ class BulletListFormatter(ListFormatterBase):
         return new_node
 
 
+# -----------------------------------------------------------------------------
+
+class TemplateListFormatter(TemplateFormatterBase, ListFormatterBase):
+    """Formatter rendering HTML lists from a template.
+
+    The template's context contains ``columns``, the names of the listed
+    attributes, and ``rows``, one per traceable with its ``tag``,
+    ``title``, ``uri`` and the ``attribute_values`` of the additional
+    attributes.
+
+    """
+
+    def get_context(self, app, docname, node, traceables, options):
+        additional_attributes = options.get("attributes") or []
+        rows = []
+        for traceable in traceables:
+            row = create_link_context(traceable, app.builder, docname)
+            if not traceable.has_title():
+                row["title"] = ""
+            row["attribute_values"] = [
+                traceable.attributes.get(attribute_name, "")
+                for attribute_name in additional_attributes]
+            rows.append(row)
+        return {
+            "columns": ["tag", "title"] + additional_attributes,
+            "rows": rows,
+        }
+
+
 # =============================================================================
 # Directives
 
@@ -164,6 +274,7 @@ class TraceableListDirective(Directive):
         "format": ListProcessor.directive_format_choice,
         "filter": directives.unchanged,
         "attributes": list_of_attributes,
+        "page-size": directives.positive_int,
     }
 
     def run(self):
@@ -178,12 +289,29 @@ class TraceableListDirective(Directive):
         return [node]
 
 
+# =============================================================================
+# Signal handling functions
+
+list_pages_cache_name = "list-pages"
+
+
+def collect_list_pages(app):
+    storage = TraceablesStorage(app.builder.env)
+    pages = storage.traceables_set.get_cache(list_pages_cache_name)
+    for pagename, (title, body) in sorted(pages.items()):
+        context = {"title": title, "body": body}
+        yield (pagename, context, "page.html")
+
+
 # =============================================================================
 # Setup this extension part
 
 ListProcessor.register_formatter("table", TableListFormatter(), default=True)
 ListProcessor.register_formatter("bullets", BulletListFormatter())
+ListProcessor.register_formatter("template", TemplateListFormatter(
+    "traceables-list.html", TableListFormatter()))
 
 def setup(app):
     app.add_node(traceable_list)
     app.add_directive("traceable-list", TraceableListDirective)
+    app.connect("html-collect-pages", collect_list_pages)
@@ -4,14 +4,22 @@ The ``matrix`` module: Matrices of traceables
 
 """
 
+import os
+import re
 import types
+import operator
+import cgi
+import json
+import hashlib
 import six
 from docutils import nodes
 from docutils.parsers.rst import Directive, directives
+from sphinx.util.osutil import ensuredir, relative_uri
 from sphinx.util.texescape import tex_escape_map
 
-from .infrastructure import FormatProcessorBase, TraceablesFilter
-from .utils import passthrough, latex_escape
+from .infrastructure import (FormatProcessorBase, TraceablesFilter,
+                             TraceablesStorage)
+from .utils import passthrough
 
 
 # =============================================================================
@@ -33,6 +41,8 @@ class traceable_matrix(nodes.General, nodes.Element):
             split after the specified number of primary traceables.
         traceables-split-secondaries: If set, causes the output to be
             split after the specified number of secondary traceables.
+        traceables-transitive: If true, the matrix shows transitive
+            relationships instead of only direct relationships.
 
     """
 
@@ -42,9 +52,32 @@ class traceable_matrix(nodes.General, nodes.Element):
 class traceable_matrix_crosstable(nodes.General, nodes.Element):
     """Placeholder node to be replaced by a builder-specific matrix.
 
+    For HTML builders this node has no children; the matrix is written
+    directly as HTML markup by its visitor. For other builders it
+    contains a generic docutils table.
+
     Attributes:
         traceables-matrix: Instance of :obj:`TraceableMatrix` storing
             data to be presented in the output.
+        traceables-docname: The name of the document containing the
+            matrix.
+
+    """
+
+    pass
+
+
+class traceable_matrix_virtual(nodes.General, nodes.Element):
+    """Placeholder node to be replaced by a client-side rendered matrix.
+
+    Only used by HTML builders. The matrix is written to a sidecar script
+    and rendered by the bundled ``traceables-matrix.js`` script.
+
+    Attributes:
+        traceables-matrix: Instance of :obj:`TraceableMatrix` storing
+            data to be presented in the output.
+        traceables-docname: The name of the document containing the
+            matrix.
 
     """
 
@@ -77,9 +110,10 @@ class MatrixProcessor(FormatProcessorBase):
                              .format(relationship))
         filter1 = matrix_node.get("traceables-filter-primaries")
         filter2 = matrix_node.get("traceables-filter-secondaries")
-        matrix = self.build_traceable_matrix(relationship, filter1, filter2)
+        transitive = matrix_node.get("traceables-transitive")
 
         options = {
+            "relationship": relationship,
             "format": matrix_node.get("traceables-format"),
             "filter-primaries":
                 matrix_node.get("traceables-filter-primaries"),
@@ -89,45 +123,21 @@ class MatrixProcessor(FormatProcessorBase):
                 matrix_node.get("traceables-split-primaries"),
             "split-secondaries":
                 matrix_node.get("traceables-split-secondaries"),
+            "transitive": transitive,
         }
-        new_nodes = formatter.format(self.app, docname, matrix_node,
-                                     matrix, options)
+        new_nodes = self.get_cached_nodes(formatter, options, docname)
+        if new_nodes is None:
+            matrix = self.build_traceable_matrix(relationship, filter1,
+                                                 filter2, transitive)
+            new_nodes = self.run_formatter(formatter, docname, matrix_node,
+                                           matrix, options)
+            self.cache_nodes(formatter, options, new_nodes)
         matrix_node.replace_self(new_nodes)
 
-    def build_traceable_matrix(self, forward, filter1, filter2):
-        # Create empty relationship matrix.
-        backward = self.storage.get_relationship_opposite(forward)
-        matrix = TraceableMatrix(forward, backward)
-
-        # Prepare for filtering.
-        traceables = sorted(self.storage.traceables_set,
-                            key=lambda t: t.tag)
-        filter = TraceablesFilter(traceables)
-
-        # Apply filter to determine which traceables are valid primaries.
-        if filter1:
-            valid_primaries = filter.filter(filter1)
-            for primary in valid_primaries:
-                matrix.add_primary(primary)
-        else:
-            valid_primaries = traceables
-
-        # Apply filter to determine which traceables are valid secondaries.
-        if filter2:
-            valid_secondaries = filter.filter(filter2)
-            for secondary in valid_secondaries:
-                matrix.add_secondary(secondary)
-        else:
-            valid_secondaries = traceables
-
-        # Add related pairs to the matrix.
-        for primary in valid_primaries:
-            secondaries = primary.relationships.get(forward) or ()
-            for secondary in secondaries:
-                if secondary in valid_secondaries:
-                    matrix.add_traceable_pair(primary, secondary)
-
-        return matrix
+    def build_traceable_matrix(self, forward, filter1, filter2,
+                               transitive=False):
+        return build_traceable_matrix(self.storage, forward, filter1,
+                                      filter2, transitive)
 
 
 # =============================================================================
@@ -222,6 +232,17 @@ class TableMatrixFormatter(MatrixFormatterBase):
         return container
 
     def create_cross_table(self, app, docname, node, matrix, options):
+        container = traceable_matrix_crosstable()
+        container["traceables-matrix"] = matrix
+        container["traceables-docname"] = docname
+
+        # The HTML visitor writes the matrix directly, so building the
+        # docutils table is only necessary for other builders.
+        if app.builder.format != "html":
+            container += self.create_docutils_table(app, docname, matrix)
+        return container
+
+    def create_docutils_table(self, app, docname, matrix):
         table = nodes.table()
         table["classes"].append("traceables-crosstable")
         tgroup = nodes.tgroup(cols=len(matrix.secondaries), colwidths="auto")
@@ -272,15 +293,28 @@ class TableMatrixFormatter(MatrixFormatterBase):
                 else:
                     continue
 
-        container = traceable_matrix_crosstable()
-        container += table
-        container["traceables-matrix"] = matrix
-#        backward = matrix.backward_relationship.capitalize()
-#        forward = matrix.forward_relationship.capitalize()
-#        container["relationships"] = (forward, backward)
-#        container["boolean_matrix"] = 0#boolean_matrix
-#        container["secondaries"] = matrix.secondaries
-        return container
+        return table
+
+
+# -----------------------------------------------------------------------------
+
+class VirtualMatrixFormatter(TableMatrixFormatter):
+    """Formatter for matrices rendered on the client side.
+
+    HTML builders write the matrix as a sparse sidecar script, which
+    is rendered by a script showing only the visible part of the matrix.
+    Other builders fall back to the table format.
+
+    """
+
+    def format(self, app, docname, node, matrix, options):
+        if app.builder.format != "html":
+            return TableMatrixFormatter.format(self, app, docname, node,
+                                               matrix, options)
+        new_node = traceable_matrix_virtual()
+        new_node["traceables-matrix"] = matrix
+        new_node["traceables-docname"] = docname
+        return new_node
 
 
 # -----------------------------------------------------------------------------
@@ -326,6 +360,7 @@ class TraceableMatrixDirective(Directive):
         "filter-secondaries": directives.unchanged,
         "split-primaries": directives.nonnegative_int,
         "split-secondaries": directives.nonnegative_int,
+        "transitive": directives.flag,
     }
 
     def run(self):
@@ -336,43 +371,157 @@ class TraceableMatrixDirective(Directive):
         node["line"] = self.lineno
         for option in self.option_spec.keys():
             node["traceables-" + option] = self.options.get(option)
+        # Flag options have no value, so store whether they're present.
+        node["traceables-transitive"] = "transitive" in self.options
         return [node]
 
 
 # =============================================================================
 # Node visitor functions
 
+def visit_traceable_matrix_crosstable_html(self, node):
+    matrix = node["traceables-matrix"]
+    docname = node["traceables-docname"]
+    storage = TraceablesStorage(self.builder.env)
+    links = storage.traceables_set.get_cache("html-links")
+    secondaries = matrix.secondaries
+
+    def link(traceable):
+        key = (self.builder.name, docname, traceable.tag)
+        markup = links.get(key)
+        if markup is None:
+            code = (u'<code class="docutils literal">{0}</code>'
+                    .format(cgi.escape(traceable.tag)))
+            uri = traceable.get_reference_uri(self.builder, docname)
+            if uri is None:
+                markup = code
+            else:
+                markup = (u'<a class="reference internal" href="{0}"'
+                          u' title="{1}">{2}</a>'
+                          .format(cgi.escape(uri, True),
+                                  cgi.escape(traceable.tag, True), code))
+            links[key] = markup
+        return markup
+
+    # Output is appended to the translator's body row by row. Related
+    # cells are marked with a CSS class, which adds the checkmark.
+    write = self.body.append
+    write(u'<table border="1" class="traceables-crosstable docutils">\n')
+    write(u'<thead valign="bottom">\n<tr><th class="head">&nbsp;</th>')
+    for secondary in secondaries:
+        write(u'<th class="head">{0}</th>'.format(link(secondary)))
+    write(u'</tr>\n</thead>\n<tbody valign="top">\n')
+    related_cell = u'<td class="traceables-checkmark"></td>'
+    unrelated_cell = u'<td></td>'
+    for index, primary in enumerate(matrix.primaries):
+        boolean_row = matrix.get_boolean_row(primary, secondaries)
+        write(u'<tr class="row-{0}"><td>{1}</td>'
+              .format("odd" if index % 2 else "even", link(primary)) +
+              u"".join(related_cell if boolean else unrelated_cell
+                       for boolean in boolean_row) +
+              u'</tr>\n')
+    write(u'</tbody>\n</table>\n')
+    raise nodes.SkipNode
+
+
+def visit_traceable_matrix_virtual_html(self, node):
+    matrix = node["traceables-matrix"]
+    docname = node["traceables-docname"]
+    builder = self.builder
+
+    # Store the matrix sparsely: for each primary only the indices of
+    # its related secondaries are listed.
+    primaries = matrix.primaries
+    secondaries = matrix.secondaries
+    secondary_indices = dict((secondary, index) for (index, secondary)
+                             in enumerate(secondaries))
+    data = {
+        "forward": matrix.forward_relationship,
+        "backward": matrix.backward_relationship,
+        "primaries": [[traceable.tag,
+                       traceable.get_reference_uri(builder, docname)]
+                      for traceable in primaries],
+        "secondaries": [[traceable.tag,
+                         traceable.get_reference_uri(builder, docname)]
+                        for traceable in secondaries],
+        "rows": [sorted(secondary_indices[secondary] for secondary
+                        in matrix.get_relatives(primary))
+                 for primary in primaries],
+    }
+    content = json.dumps(data, separators=(",", ":"), sort_keys=True)
+
+    # The sidecar file is named after its content, so that identical
+    # matrices share a file. It is a script assigning the data to a
+    # global instead of a JSON file, because browsers don't allow pages
+    # opened from the local file system to request JSON files.
+    key = hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+    filename = "matrix-{0}.js".format(key)
+    directory = os.path.join(builder.outdir, sidecar_directory)
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        ensuredir(directory)
+        with open(path, "wb") as sidecar_file:
+            sidecar_file.write(sidecar_template.format(
+                key=key, content=content).encode("utf-8"))
+
+    # The rendering script is only loaded by pages containing virtual
+    # matrices, once per page.
+    if not getattr(self, "traceables_matrix_script", False):
+        self.traceables_matrix_script = True
+        script_uri = relative_uri(builder.get_target_uri(docname),
+                                  "_static/traceables-matrix.js")
+        self.body.append(u'<script type="text/javascript" src="{0}">'
+                         u'</script>\n'.format(cgi.escape(script_uri, True)))
+
+    uri = relative_uri(builder.get_target_uri(docname),
+                       sidecar_directory + "/" + filename)
+    self.body.append(u'<div class="traceables-virtual-matrix"'
+                     u' data-src="{0}" data-key="{1}">'
+                     u'<noscript>This traceables matrix requires'
+                     u' JavaScript.</noscript></div>\n'
+                     .format(cgi.escape(uri, True), key))
+    raise nodes.SkipNode
+
+
+sidecar_template = (u"window.traceablesMatrices ="
+                    u" window.traceablesMatrices || {{}};\n"
+                    u"window.traceablesMatrices[\"{key}\"] = {content};\n")
+
+
 def visit_traceable_matrix_crosstable_latex(self, node):
     matrix = node["traceables-matrix"]
-    num_columns = len(matrix.secondaries)
+    storage = TraceablesStorage(self.builder.env)
+    escape = storage.get_latex_escape_cache()
+    secondaries = matrix.secondaries
+    num_columns = len(secondaries)
     forward_relationship = matrix.forward_relationship.capitalize()
     backward_relationship = matrix.backward_relationship.capitalize()
-
-    lines = []
-    lines.append(r"\begin{longtable}{@{} cl*{%d}c @{}}" % num_columns)
-    lines.append(r" & & \multicolumn{%d}{c}{%s} \\[2ex]"
-                 % (num_columns, latex_escape(forward_relationship)))
-    headers = [r"\rotatebox{90}{%s}"
-               % latex_escape(head.tag) for head in matrix.secondaries]
-    lines.append(r" & & " + r" & ".join(headers) + r"\\")
-    lines.append(r"\cmidrule{2-%d}" % (num_columns + 2))
+    row_rule = r"\cmidrule{2-%d}" % (num_columns + 2) + "\n"
+    row_separator_rule = r"\cmidrule[0.05pt]{2-%d}" % (num_columns + 2) + "\n"
+
+    # Output is appended to the translator's body row by row, instead of
+    # first collecting the whole table.
+    write = self.body.append
+    write(r"\begin{longtable}{@{} cl*{%d}c @{}}" % num_columns + "\n")
+    write(r" & & \multicolumn{%d}{c}{%s} \\[2ex]"
+          % (num_columns, escape[forward_relationship]) + "\n")
+    write(r" & & " + r" & ".join(r"\rotatebox{90}{%s}" % escape[head.tag]
+                                 for head in secondaries) + r"\\" + "\n")
+    write(row_rule)
     for index, primary in enumerate(matrix.primaries):
-        boolean_row = matrix.get_boolean_row(primary)
+        boolean_row = matrix.get_boolean_row(primary, secondaries)
         if index > 0:
             # Add horizontal rule above all but the first row.
-            lines.append(r"\cmidrule[0.05pt]{2-%d}" % (num_columns + 2))
-        checkmarks = [r"\checkmark" if boolean else ""
-                      for boolean in boolean_row]
+            write(row_separator_rule)
         if index == 0:
             # Add backward relationship name only once.
-            lines.append(r"\rotatebox{90}{\llap{%s}}"
-                         % latex_escape(backward_relationship))
-        lines.append(" & %s & " % latex_escape(primary.tag) +
-                     " & ".join(checkmarks) + r"\\")
-        lines.append(r"\cmidrule{2-%d}" % (num_columns + 2))
-    lines.append(r"\end{longtable}")
-
-    self.body.append("\n".join(lines))
+            write(r"\rotatebox{90}{\llap{%s}}"
+                  % escape[backward_relationship] + "\n")
+        write(" & %s & " % escape[primary.tag] +
+              " & ".join(r"\checkmark" if boolean else ""
+                         for boolean in boolean_row) + r"\\" + "\n")
+        write(row_rule)
+    write(r"\end{longtable}")
     raise nodes.SkipNode
 
 
@@ -381,17 +530,88 @@ def visit_traceable_checkmark_latex(self, node):
     raise nodes.SkipNode
 
 
+# =============================================================================
+# Matrix construction
+
+def build_traceable_matrix(storage, forward, filter1=None, filter2=None,
+                           transitive=False):
+    """Return the :obj:`TraceableMatrix` of relationship *forward*.
+
+    Primaries and secondaries are restricted to the traceables matching
+    the filter expressions *filter1* and *filter2*, if given. Without
+    *filter2*, secondaries include related traceables of other projects.
+    If *transitive* is true, all transitively related secondaries of each
+    primary are included.
+
+    """
+    # Create empty relationship matrix.
+    backward = storage.get_relationship_opposite(forward)
+    matrix = TraceableMatrix(forward, backward, storage.get_sort_key())
+
+    # Prepare for filtering.
+    traceables = storage.get_sorted_traceables()
+    filter = TraceablesFilter(traceables, storage)
+
+    # Apply filter to determine which traceables are valid primaries.
+    if filter1:
+        valid_primaries = filter.filter(filter1)
+        for primary in valid_primaries:
+            matrix.add_primary(primary)
+    else:
+        valid_primaries = traceables
+
+    # Apply filter to determine which traceables are valid secondaries.
+    if filter2:
+        valid_secondaries = set(filter.filter(filter2))
+        for secondary in valid_secondaries:
+            matrix.add_secondary(secondary)
+        is_valid_secondary = valid_secondaries.__contains__
+    else:
+        # Filters only apply to this project's traceables, but relatives
+        # from other projects are valid secondaries too. Unresolved tags
+        # aren't.
+        is_valid_secondary = lambda secondary: not secondary.is_unresolved
+
+    # Determine how to look up relatives of each primary.
+    if transitive:
+        index = storage.get_reachability_index(forward)
+        get_relatives = index.get_reachable
+    else:
+        graph = storage.update_relationships()
+        get_relatives = lambda primary: graph.get_relatives(primary, forward)
+
+    # Add related pairs to the matrix.
+    for primary in valid_primaries:
+        for secondary in get_relatives(primary):
+            if is_valid_secondary(secondary):
+                matrix.add_traceable_pair(primary, secondary)
+
+    return matrix
+
+
 # =============================================================================
 # Helper class for traceable relationship matrices
 
 class TraceableMatrix(object):
+    """Matrix of related primary and secondary traceables.
 
-    def __init__(self, forward_relationship, backward_relationship):
+    Primaries, secondaries and relatives are sorted using *sort_key*,
+    which defaults to sorting by tag. The sorted lists of primaries and
+    secondaries are shared until traceables are added, so they must not
+    be modified.
+
+    """
+
+    def __init__(self, forward_relationship, backward_relationship,
+                 sort_key=None):
         self._forward_relationship = forward_relationship
         self._backward_relationship = backward_relationship
+        self._sort_key = sort_key or operator.attrgetter("tag")
         self._primaries = set()
         self._secondaries = set()
         self._relationships = {}
+        self._sorted_primaries = None
+        self._sorted_secondaries = None
 
     def ascii_table(self):
         column_widths = [max(len(t.tag) for t in self.primaries)]
@@ -410,13 +630,15 @@ class TraceableMatrix(object):
 
     def add_primary(self, primary):
         self._primaries.add(primary)
+        self._sorted_primaries = None
 
     def add_secondary(self, secondary):
         self._secondaries.add(secondary)
+        self._sorted_secondaries = None
 
     def add_traceable_pair(self, primary, secondary):
-        self._primaries.add(primary)
-        self._secondaries.add(secondary)
+        self.add_primary(primary)
+        self.add_secondary(secondary)
         self._relationships.setdefault(primary, set()).add(secondary)
 
     @property
@@ -429,21 +651,27 @@ class TraceableMatrix(object):
 
     @property
     def primaries(self):
-        return sorted(self._primaries)
+        if self._sorted_primaries is None:
+            self._sorted_primaries = sorted(self._primaries,
+                                            key=self._sort_key)
+        return self._sorted_primaries
 
     @property
     def secondaries(self):
-        return sorted(self._secondaries)
+        if self._sorted_secondaries is None:
+            self._sorted_secondaries = sorted(self._secondaries,
+                                              key=self._sort_key)
+        return self._sorted_secondaries
 
     def get_relatives(self, primary):
-        return sorted(self._relationships.get(primary, ()))
+        return sorted(self._relationships.get(primary, ()),
+                      key=self._sort_key)
 
-    def get_boolean_row(self, primary):
-        boolean_row = []
-        relatives = self.get_relatives(primary)
-        for secondary in self.secondaries:
-            boolean_row.append(secondary in relatives)
-        return boolean_row
+    def get_boolean_row(self, primary, secondaries=None):
+        if secondaries is None:
+            secondaries = self.secondaries
+        relatives = self._relationships.get(primary, ())
+        return [secondary in relatives for secondary in secondaries]
 
     def split(self, max_secondaries, max_primaries=None):
         secondary_ranges = self.calculate_ranges(len(self._secondaries),
@@ -456,15 +684,17 @@ class TraceableMatrix(object):
             for (secondary_start, secondary_end) in secondary_ranges:
                 range_secondaries = self.secondaries[secondary_start:
                                                      secondary_end]
+                range_secondaries_set = set(range_secondaries)
                 submatrix = TraceableMatrix(self.forward_relationship,
-                                            self.backward_relationship)
+                                            self.backward_relationship,
+                                            self._sort_key)
                 for primary in range_primaries:
                     submatrix.add_primary(primary)
                 for secondary in range_secondaries:
                     submatrix.add_secondary(secondary)
                 for primary in range_primaries:
                     for secondary in self.get_relatives(primary):
-                        if secondary in range_secondaries:
+                        if secondary in range_secondaries_set:
                             submatrix.add_traceable_pair(primary, secondary)
                 matrices.append(submatrix)
         return matrices
@@ -484,6 +714,79 @@ class TraceableMatrix(object):
         return ranges
 
 
+# =============================================================================
+# Sidecar files of virtual matrices
+#
+# Sidecar files are named after their content, so files of matrices which
+# changed or were removed are left behind. The sidecar files referenced
+# by each document are recorded in a manifest in the sidecar directory,
+# and files which no document references anymore are removed at the end
+# of each build. Only the output of documents written during the build,
+# or missing from the manifest, is searched for references.
+
+sidecar_directory = "_traceables"
+
+sidecar_manifest = "sidecars.json"
+
+sidecar_reference_pattern = re.compile(
+    re.escape(sidecar_directory) + r"/(matrix-[0-9a-f]+\.js)\b")
+
+
+def note_written_document(app, doctree, docname):
+    written_docnames = getattr(app.builder, "traceables_written_docnames",
+                               None)
+    if written_docnames is None:
+        written_docnames = app.builder.traceables_written_docnames = set()
+    written_docnames.add(docname)
+
+
+def read_sidecar_references(path):
+    """Return the names of the sidecar files referenced by the output
+    file *path*, or an empty list if it doesn't exist."""
+    try:
+        with open(path, "rb") as output_file:
+            content = output_file.read().decode("utf-8")
+    except IOError:
+        return []
+    return sorted(set(sidecar_reference_pattern.findall(content)))
+
+
+def prune_sidecar_files(app, exception):
+    builder = app.builder
+    if builder.name != "html" or exception:
+        return
+    directory = os.path.join(builder.outdir, sidecar_directory)
+    if not os.path.isdir(directory):
+        return
+
+    manifest_path = os.path.join(directory, sidecar_manifest)
+    try:
+        with open(manifest_path, "rb") as manifest_file:
+            manifest = json.loads(manifest_file.read().decode("utf-8"))
+    except (IOError, ValueError):
+        manifest = {}
+
+    written_docnames = getattr(builder, "traceables_written_docnames", ())
+    references = {}
+    for docname in builder.env.found_docs:
+        if docname in written_docnames or docname not in manifest:
+            references[docname] = read_sidecar_references(
+                builder.get_outfilename(docname))
+        else:
+            references[docname] = manifest[docname]
+
+    referenced = set()
+    for filenames in references.values():
+        referenced.update(filenames)
+    for filename in os.listdir(directory):
+        if filename.startswith("matrix-") and filename not in referenced:
+            os.remove(os.path.join(directory, filename))
+
+    content = json.dumps(references, indent=0, sort_keys=True)
+    with open(manifest_path, "wb") as manifest_file:
+        manifest_file.write(content.encode("utf-8"))
+
+
 # =============================================================================
 # Setup this extension part
 
@@ -493,15 +796,21 @@ MatrixProcessor.register_formatter(
     "columns", TwoColumnMatrixFormatter())
 MatrixProcessor.register_formatter(
     "list", BulletMatrixFormatter())
+MatrixProcessor.register_formatter(
+    "virtual", VirtualMatrixFormatter())
 
 def setup(app):
     app.add_node(traceable_matrix)
     app.add_node(traceable_matrix_crosstable,
-                 html=passthrough,
+                 html=(visit_traceable_matrix_crosstable_html, None),
                  latex=(visit_traceable_matrix_crosstable_latex, None))
+    app.add_node(traceable_matrix_virtual,
+                 html=(visit_traceable_matrix_virtual_html, None))
     app.add_node(traceable_checkmark,
                  html=passthrough,
                  latex=(visit_traceable_checkmark_latex, None))
     app.add_directive("traceable-matrix", TraceableMatrixDirective)
+    app.connect("doctree-resolved", note_written_document)
+    app.connect("build-finished", prune_sidecar_files)
     app.add_latex_package("amssymb")  # Needed for "\checkmark" symbol.
     app.add_latex_package("booktabs")  # Needed for "\cmidrule" command.
@@ -0,0 +1,235 @@
+"""
+The ``profiling`` module: Opt-in instrumentation of traceables processing
+===============================================================================
+
+Instrumentation is enabled by setting ``traceables_profile = True`` in a
+project's ``conf.py``. While enabled, the processing steps of this
+extension are timed and counted, and cache lookups are tallied. At the
+end of the build the results are written to the output directory as a
+JSON report and as a trace in the Chrome trace-event format.
+
+Instrumented code uses :func:`measure` and :func:`count_cache`, which do
+nothing while instrumentation is disabled.
+
+"""
+
+import os
+import json
+import time
+
+
+# =============================================================================
+# Profiler classes
+
+class Timing(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+
+    def to_json(self):
+        return {"calls": self.calls, "seconds": self.seconds}
+
+
+class Span(object):
+    """Context manager measuring one processing step of a :obj:`Profiler`.
+
+    The document and directive being processed are inherited from the
+    enclosing span, unless they are given explicitly.
+
+    """
+
+    def __init__(self, profiler, category, name, docname, directive):
+        self.profiler = profiler
+        self.category = category
+        self.name = name
+        self.docname = docname
+        self.directive = directive
+        self.start = None
+
+    def __enter__(self):
+        stack = self.profiler.stack
+        if stack:
+            self.docname = self.docname or stack[-1].docname
+            self.directive = self.directive or stack[-1].directive
+        stack.append(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.time()
+        self.profiler.stack.pop()
+        self.profiler.record(self, end)
+        return False
+
+
+class NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+null_span = NullSpan()
+
+
+class Profiler(object):
+    """Collector of timings, call counts and cache statistics."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.stack = []
+        self.timings = {}    # "category:name" -> Timing
+        self.documents = {}  # docname -> {"category:name" -> Timing}
+        self.directives = {}  # "docname:line" -> {"category:name" -> Timing}
+        self.caches = {}     # name -> [hits, misses]
+        self.events = []
+
+    def measure(self, category, name, docname=None, directive=None):
+        return Span(self, category, name, docname, directive)
+
+    def count_cache(self, name, hit):
+        counts = self.caches.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+    def record(self, span, end):
+        seconds = end - span.start
+        key = "{0}:{1}".format(span.category, span.name)
+        self.timings.setdefault(key, Timing()).add(seconds)
+        if span.docname:
+            timings = self.documents.setdefault(span.docname, {})
+            timings.setdefault(key, Timing()).add(seconds)
+        if span.directive:
+            timings = self.directives.setdefault(span.directive, {})
+            timings.setdefault(key, Timing()).add(seconds)
+
+        arguments = {}
+        if span.docname:
+            arguments["docname"] = span.docname
+        if span.directive:
+            arguments["directive"] = span.directive
+        self.events.append({
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": int((span.start - self.start) * 1e6),
+            "dur": int(seconds * 1e6),
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": arguments,
+        })
+
+    def get_report(self):
+        """Return the collected results as a JSON serializable dict."""
+        def timings_to_json(timings):
+            return dict((key, timing.to_json())
+                        for (key, timing) in timings.items())
+
+        caches = {}
+        for (name, (hits, misses)) in self.caches.items():
+            lookups = hits + misses
+            caches[name] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": float(hits) / lookups if lookups else None,
+            }
+        return {
+            "seconds": time.time() - self.start,
+            "timings": timings_to_json(self.timings),
+            "documents": dict((docname, timings_to_json(timings))
+                              for (docname, timings)
+                              in self.documents.items()),
+            "directives": dict((directive, timings_to_json(timings))
+                               for (directive, timings)
+                               in self.directives.items()),
+            "caches": caches,
+        }
+
+    def get_trace(self):
+        """Return the collected spans in the Chrome trace-event format."""
+        return {
+            "traceEvents": sorted(self.events,
+                                  key=lambda event: event["ts"]),
+            "displayTimeUnit": "ms",
+        }
+
+    def write(self, directory):
+        report_path = os.path.join(directory, report_filename)
+        with open(report_path, "w") as report_file:
+            json.dump(self.get_report(), report_file, indent=2,
+                      sort_keys=True)
+        trace_path = os.path.join(directory, trace_filename)
+        with open(trace_path, "w") as trace_file:
+            json.dump(self.get_trace(), trace_file)
+
+
+report_filename = "traceables-profile.json"
+trace_filename = "traceables-trace.json"
+
+
+# =============================================================================
+# Instrumentation functions
+
+active_profiler = None
+
+
+def measure(category, name, docname=None, directive=None):
+    """Return a context manager measuring a processing step.
+
+    The step is recorded as *name* within *category*, for example
+    ``measure("formatter", "ListFormatter")``.
+
+    """
+    if active_profiler is None:
+        return null_span
+    return active_profiler.measure(category, name, docname, directive)
+
+
+def count_cache(name, hit):
+    """Record a lookup of the cache *name*, which hit if *hit* is true."""
+    if active_profiler is not None:
+        active_profiler.count_cache(name, hit)
+
+
+def describe_directive(node, docname):
+    """Return a ``docname:line`` description of a directive's node."""
+    line = node.get("line") or node.line
+    return "{0}:{1}".format(docname, line)
+
+
+# =============================================================================
+# Signal handling functions
+
+def start_profiling(app):
+    global active_profiler
+    if app.config.traceables_profile:
+        active_profiler = Profiler()
+    else:
+        active_profiler = None
+
+
+def finish_profiling(app, exception):
+    global active_profiler
+    profiler, active_profiler = active_profiler, None
+    if profiler is None or exception:
+        return
+    if not os.path.isdir(app.outdir):
+        os.makedirs(app.outdir)
+    profiler.write(app.outdir)
+    app.info("Traceables: profile written to {0} and {1}"
+             .format(report_filename, trace_filename))
+
+
+# =============================================================================
+# Setup this extension part
+
+def setup(app):
+    app.add_config_value("traceables_profile", False, "")
+    app.connect("builder-inited", start_profiling)
+    app.connect("build-finished", finish_profiling)
@@ -0,0 +1,510 @@
+"""
+The ``relationships`` module: Storage of relationships between traceables
+===============================================================================
+
+"""
+
+import collections
+from array import array
+
+from . import profiling
+
+
+# =============================================================================
+# Relationship graph class
+
+class RelationshipGraph(object):
+    """Relationships between traceables in compressed sparse row form.
+
+    Every traceable is assigned a dense integer ID, in sort order, and
+    every relationship name is assigned an integer index. For each
+    relationship name the relatives of all traceables are stored in two
+    flat integer arrays: the relatives of the traceable with ID ``i`` are
+    ``targets[offsets[i]:offsets[i + 1]]``.
+
+    Only the relationships given in the traceables' attributes need to be
+    supplied; the opposite direction of each relationship is derived
+    automatically.
+
+    """
+
+    def __init__(self, relationship_types):
+        self.relationship_names = []
+        self.relationship_ids = {}
+        self.opposite_ids = {}
+        for primary, secondary, directional in relationship_types:
+            primary_id = self._add_relationship_name(primary)
+            secondary_id = self._add_relationship_name(secondary)
+            self.opposite_ids[primary_id] = secondary_id
+            self.opposite_ids[secondary_id] = primary_id
+
+        self.generation = None
+        self.tags = []
+        self.tag_ids = {}
+        self.traceables = []
+        self._unresolved = array("b")
+        self.is_bound = False
+        self._offsets = []
+        self._targets = []
+        self._reachability_indexes = {}
+        self._analysis = None
+
+    def _add_relationship_name(self, name):
+        if name not in self.relationship_ids:
+            self.relationship_ids[name] = len(self.relationship_names)
+            self.relationship_names.append(name)
+        return self.relationship_ids[name]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["traceables"] = []
+        state["is_bound"] = False
+        state["_reachability_indexes"] = {}
+        state["_analysis"] = None
+        return state
+
+    # -------------------------------------------------------------------------
+    # Construction
+
+    def collect_edges(self, traceables):
+        """Collect the relationships defined in the traceables' attributes.
+
+        Returns a list, indexed by relationship ID, of lists containing
+        ``(source_tag, target_tag)`` pairs.
+
+        """
+        edges = [[] for name in self.relationship_names]
+        for traceable in traceables:
+            for name, tags_string in traceable.attributes.items():
+                relationship_id = self.relationship_ids.get(name)
+                if relationship_id is None:
+                    continue
+                opposite_id = self.opposite_ids[relationship_id]
+                for tag in traceable.split_tags_string(tags_string):
+                    edges[relationship_id].append((traceable.tag, tag))
+                    edges[opposite_id].append((tag, traceable.tag))
+        return edges
+
+    def build(self, traceables, edges, sort_key=None):
+        """Build the relationship arrays.
+
+        Args:
+            traceables: All traceables, including placeholders for
+                unresolved tags which are referenced by *edges*.
+            edges: Relationships as returned by :meth:`collect_edges`.
+            sort_key: Key function determining the order of traceables
+                and therefore of their IDs; sorts by tag if not given.
+
+        """
+        self.traceables = sorted(traceables,
+                                 key=sort_key or (lambda t: t.tag))
+        self.tags = [traceable.tag for traceable in self.traceables]
+        self._unresolved = array("b", (traceable.is_unresolved
+                                       for traceable in self.traceables))
+        self.tag_ids = dict((tag, index)
+                            for (index, tag) in enumerate(self.tags))
+
+        self._offsets = []
+        self._targets = []
+        self._reachability_indexes = {}
+        self._analysis = None
+        for relationship_edges in edges:
+            pairs = sorted(set((self.tag_ids[tag1], self.tag_ids[tag2])
+                               for (tag1, tag2) in relationship_edges))
+            offsets = array("i", [0]) * (len(self.tags) + 1)
+            for (source_id, target_id) in pairs:
+                offsets[source_id + 1] += 1
+            for index in range(len(self.tags)):
+                offsets[index + 1] += offsets[index]
+            targets = array("i", (target_id for (source_id, target_id)
+                                  in pairs))
+            self._offsets.append(offsets)
+            self._targets.append(targets)
+
+        self.is_bound = True
+        for (index, traceable) in enumerate(self.traceables):
+            traceable.relationships = RelationshipsView(self, index)
+
+    def bind(self, traceables_dict, get_placeholder):
+        """Reconnect an unpickled graph to its traceables.
+
+        Placeholders for tags which aren't in *traceables_dict* are
+        retrieved by calling *get_placeholder*. Returns ``False`` if the
+        graph refers to tags which were unresolved when it was built but
+        which now belong to defined traceables, in which case the graph
+        must be rebuilt.
+
+        """
+        traceables = []
+        for (tag, was_unresolved) in zip(self.tags, self._unresolved):
+            traceable = traceables_dict.get(tag)
+            if traceable is None:
+                traceable = get_placeholder(tag)
+            elif was_unresolved:
+                return False
+            traceables.append(traceable)
+        self.traceables = traceables
+        self.is_bound = True
+        for (index, traceable) in enumerate(self.traceables):
+            traceable.relationships = RelationshipsView(self, index)
+        return True
+
+    # -------------------------------------------------------------------------
+    # Queries
+
+    @property
+    def edge_count(self):
+        return sum(len(targets) for targets in self._targets)
+
+    def get_traceable_id(self, traceable):
+        return self.tag_ids[traceable.tag]
+
+    def get_neighbor_ids(self, traceable_id, relationship_id):
+        offsets = self._offsets[relationship_id]
+        start, end = offsets[traceable_id], offsets[traceable_id + 1]
+        return self._targets[relationship_id][start:end]
+
+    def get_relatives(self, traceable, name):
+        """Return the relatives of a traceable, in sort order."""
+        traceable_id = self.tag_ids.get(traceable.tag)
+        if traceable_id is None:
+            return ()
+        return self.get_relatives_by_id(traceable_id, name)
+
+    def get_relatives_by_id(self, traceable_id, name):
+        relationship_id = self.relationship_ids.get(name)
+        if relationship_id is None:
+            return ()
+        return tuple(self.traceables[relative_id] for relative_id
+                     in self.get_neighbor_ids(traceable_id, relationship_id))
+
+    def get_relationship_names(self, traceable):
+        """Return the names of a traceable's relationships, sorted."""
+        traceable_id = self.tag_ids.get(traceable.tag)
+        if traceable_id is None:
+            return []
+        names = []
+        for (relationship_id, offsets) in enumerate(self._offsets):
+            if offsets[traceable_id] != offsets[traceable_id + 1]:
+                names.append(self.relationship_names[relationship_id])
+        return sorted(names)
+
+    def get_reachability_index(self, name):
+        """Return the :obj:`ReachabilityIndex` of a relationship.
+
+        The index is built on first use and then cached until the graph
+        is rebuilt.
+
+        """
+        relationship_id = self.relationship_ids.get(name)
+        if relationship_id is None:
+            raise ValueError("Unknown relationship name: '{0}'".format(name))
+        index = self._reachability_indexes.get(relationship_id)
+        profiling.count_cache("reachability-index", index is not None)
+        if index is None:
+            with profiling.measure("relationships", "reachability-index"):
+                index = ReachabilityIndex(self, relationship_id)
+            self._reachability_indexes[relationship_id] = index
+        return index
+
+    def get_analysis(self, relationship_names):
+        """Return the :obj:`RelationshipAnalysis` of this graph.
+
+        The analysis is performed on first use and then cached until the
+        graph is rebuilt.
+
+        """
+        if self._analysis is None:
+            self._analysis = RelationshipAnalysis(self, relationship_names)
+        return self._analysis
+
+    # -------------------------------------------------------------------------
+    # Analysis
+
+    def strongly_connected_components(self, relationship_id):
+        """Find strongly connected components using Tarjan's algorithm.
+
+        The algorithm is implemented iteratively, so that long chains of
+        relationships don't exceed Python's recursion limit. It runs in
+        O(V + E) time.
+
+        Returns a list of components, each being a list of traceable IDs.
+        The components are in reverse topological order: every component
+        comes after all components reachable from it.
+
+        """
+        offsets = self._offsets[relationship_id]
+        targets = self._targets[relationship_id]
+        count = len(self.tags)
+        indexes = [-1] * count
+        lowlinks = [0] * count
+        on_stack = [False] * count
+        stack = []
+        components = []
+        counter = 0
+
+        for root in range(count):
+            if indexes[root] != -1:
+                continue
+            indexes[root] = lowlinks[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [(root, offsets[root])]
+            while work:
+                node, position = work[-1]
+                if position < offsets[node + 1]:
+                    work[-1] = (node, position + 1)
+                    child = targets[position]
+                    if indexes[child] == -1:
+                        indexes[child] = lowlinks[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack[child] = True
+                        work.append((child, offsets[child]))
+                    elif on_stack[child]:
+                        lowlinks[node] = min(lowlinks[node], indexes[child])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlinks[parent] = min(lowlinks[parent], lowlinks[node])
+                if lowlinks[node] == indexes[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+        return components
+
+
+# =============================================================================
+# Consistency analysis
+
+class RelationshipAnalysis(object):
+    """Consistency analysis of a relationship graph.
+
+    The analysis finds cycles, including self-references, in the given
+    relationships and tags which are referenced by relationships but
+    which don't belong to a defined traceable. It runs in O(V + E) time.
+
+    Attributes:
+        cycles: List of ``(relationship_name, traceables)`` pairs, one
+            for each cycle. The traceables in a cycle are in sort order.
+        unresolved: List of ``(placeholder, referrers)`` pairs, one for
+            each unresolved tag. The referrers are the traceables which
+            reference the tag, in sort order.
+
+    """
+
+    def __init__(self, graph, relationship_names):
+        self.graph = graph
+        self.relationship_names = relationship_names
+        self.cycles = []
+        self.unresolved = []
+
+        for name in relationship_names:
+            relationship_id = graph.relationship_ids[name]
+            for component in graph.strongly_connected_components(
+                    relationship_id):
+                if len(component) == 1:
+                    member = component[0]
+                    neighbor_ids = graph.get_neighbor_ids(member,
+                                                          relationship_id)
+                    if member not in neighbor_ids:
+                        continue
+                traceables = [graph.traceables[member]
+                              for member in sorted(component)]
+                self.cycles.append((name, traceables))
+
+        for (traceable_id, traceable) in enumerate(graph.traceables):
+            if not traceable.is_unresolved:
+                continue
+            referrer_ids = set()
+            for relationship_id in range(len(graph.relationship_names)):
+                referrer_ids.update(graph.get_neighbor_ids(traceable_id,
+                                                           relationship_id))
+            if not referrer_ids:
+                continue
+            referrers = [graph.traceables[referrer_id]
+                         for referrer_id in sorted(referrer_ids)]
+            self.unresolved.append((traceable, referrers))
+
+    @property
+    def is_consistent(self):
+        return not self.cycles and not self.unresolved
+
+    def has_cycles(self, name):
+        return any(cycle_name == name for (cycle_name, traceables)
+                   in self.cycles)
+
+
+# =============================================================================
+# Reachability index
+
+class ReachabilityIndex(object):
+    """Transitive closure of a single relationship.
+
+    The relationship graph is condensed into its strongly connected
+    components, which form a directed acyclic graph. For every component
+    the set of reachable traceables is stored as a bitset, computed in
+    reverse topological order so that each component reuses the bitsets
+    of its successors. Queries then take a single bit test.
+
+    """
+
+    def __init__(self, graph, relationship_id):
+        self.graph = graph
+        self.relationship_id = relationship_id
+        self.relationship_name = graph.relationship_names[relationship_id]
+
+        components = graph.strongly_connected_components(relationship_id)
+        self._component_ids = [0] * len(graph.tags)
+        for (component_id, component) in enumerate(components):
+            for member in component:
+                self._component_ids[member] = component_id
+
+        self._reachable = []
+        for (component_id, component) in enumerate(components):
+            reachable = 0
+            is_cyclic = len(component) > 1
+            for member in component:
+                for target in graph.get_neighbor_ids(member,
+                                                     relationship_id):
+                    target_component_id = self._component_ids[target]
+                    if target_component_id == component_id:
+                        is_cyclic = True
+                    else:
+                        reachable |= 1 << target
+                        reachable |= self._reachable[target_component_id]
+            if is_cyclic:
+                for member in component:
+                    reachable |= 1 << member
+            self._reachable.append(reachable)
+
+    def is_reachable(self, source, target):
+        """Return whether *target* is transitively related to *source*."""
+        source_id = self.graph.tag_ids.get(source.tag)
+        target_id = self.graph.tag_ids.get(target.tag)
+        if source_id is None or target_id is None:
+            return False
+        reachable = self._reachable[self._component_ids[source_id]]
+        return bool((reachable >> target_id) & 1)
+
+    def get_reachable_bits(self, traceable_id):
+        return self._reachable[self._component_ids[traceable_id]]
+
+    def get_reachable_ids(self, traceable_id):
+        return iterate_bits(self.get_reachable_bits(traceable_id))
+
+    def get_reachable(self, traceable):
+        """Return transitively related traceables, in sort order."""
+        traceable_id = self.graph.tag_ids.get(traceable.tag)
+        if traceable_id is None:
+            return ()
+        return tuple(self.graph.traceables[reachable_id] for reachable_id
+                     in self.get_reachable_ids(traceable_id))
+
+    def get_reachable_tags(self, traceable):
+        """Return the tags of transitively related traceables as a
+        :obj:`ReachableTags` set, whose membership tests take a single
+        bit test."""
+        traceable_id = self.graph.tag_ids.get(traceable.tag)
+        if traceable_id is None:
+            return ReachableTags(self.graph, 0)
+        return ReachableTags(self.graph,
+                             self.get_reachable_bits(traceable_id))
+
+
+def iterate_bits(bits):
+    """Return the positions of the set bits of *bits*, in ascending
+    order."""
+    positions = []
+    while bits:
+        lowest = bits & -bits
+        positions.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return positions
+
+
+class ReachableTags(collections.Set):
+    """Read-only set of the tags of a reachability bitset.
+
+    Membership of a tag is tested directly on the bitset, so that filter
+    expressions such as ``"REQ-1" in all_parents`` don't need the set of
+    all reachable tags to be built.
+
+    """
+
+    def __init__(self, graph, bits):
+        self.graph = graph
+        self.bits = bits
+
+    def __contains__(self, tag):
+        try:
+            tag_id = self.graph.tag_ids.get(tag)
+        except TypeError:
+            return False
+        if tag_id is None:
+            return False
+        return bool((self.bits >> tag_id) & 1)
+
+    def __iter__(self):
+        tags = self.graph.tags
+        return (tags[tag_id] for tag_id in iterate_bits(self.bits))
+
+    def __len__(self):
+        return bin(self.bits).count("1")
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, sorted(self))
+
+
+# =============================================================================
+# Per-traceable view
+
+class RelationshipsView(object):
+    """Read-only mapping of relationship names to relatives of a traceable.
+
+    The relatives are returned as tuples of :obj:`Traceable` instances
+    in sort order. Only relationships with at least one relative are
+    present in the mapping.
+
+    """
+
+    def __init__(self, graph, traceable_id):
+        self._graph = graph
+        self._traceable_id = traceable_id
+
+    def _get_relatives(self, name):
+        return self._graph.get_relatives_by_id(self._traceable_id, name)
+
+    def __getitem__(self, name):
+        relatives = self._get_relatives(name)
+        if not relatives:
+            raise KeyError(name)
+        return relatives
+
+    def get(self, name, default=None):
+        return self._get_relatives(name) or default
+
+    def keys(self):
+        traceable = self._graph.traceables[self._traceable_id]
+        return self._graph.get_relationship_names(traceable)
+
+    def items(self):
+        return [(name, self._get_relatives(name)) for name in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, name):
+        return bool(self._get_relatives(name))
+
+    def __len__(self):
+        return len(self.keys())
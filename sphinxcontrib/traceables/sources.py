@@ -0,0 +1,291 @@
+"""
+The ``sources`` module: Traceables imported from structured data files
+===============================================================================
+
+The ``traceable-import`` directive defines traceables from the records of
+a CSV, JSON, JSON Lines or YAML file, for example exported by another
+requirements management tool::
+
+    .. traceable-import:: requirements.csv
+       :format: table
+
+Each record defines one traceable. Its ``tag`` field is the traceable's
+tag, its optional ``content`` field becomes the traceable's displayed
+content as plain text, and all other fields are its attributes,
+including its relationships. Records are read one at a time and turned
+into target and display nodes directly, so that the reStructuredText
+parser isn't run for them. The data file is registered as a dependency
+of the document containing the directive, so that the document is read
+again whenever the file changes.
+
+"""
+
+import os
+import csv
+import json
+
+from docutils import nodes
+from docutils.parsers.rst import Directive, directives
+
+from . import profiling
+from .infrastructure import TraceablesStorage, Traceable
+from .display import traceable_display
+from .traceables import create_target_node
+from .utils import is_valid_traceable_attribute_name
+
+
+# =============================================================================
+# Data file readers
+#
+# Each reader takes an open file and its encoding, and yields the file's
+# records as dicts.
+
+def read_csv_records(source_file, encoding):
+    # The first row holds the field names. Files exported by spreadsheet
+    # applications often start with a byte order mark, which would
+    # otherwise become part of the first field name.
+    names = None
+    for row in csv.reader(source_file):
+        row = [value.decode(encoding) for value in row]
+        if names is None:
+            names = row
+            if names and names[0].startswith(u"\ufeff"):
+                names[0] = names[0][1:]
+        elif any(value.strip() for value in row):
+            yield dict(zip(names, row))
+
+
+def read_json_records(source_file, encoding):
+    return iterate_records(json.load(source_file, encoding=encoding))
+
+
+def read_json_lines_records(source_file, encoding):
+    # One record per line, so that large files are never loaded at once.
+    for line in source_file:
+        line = line.decode(encoding).strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_yaml_records(source_file, encoding):
+    # PyYAML is an optional dependency, only needed for YAML files.
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError("Reading YAML files requires PyYAML")
+    return iterate_records(yaml.safe_load(source_file) or [])
+
+
+def iterate_records(data):
+    # Data is either a list of records or an object mapping tags to
+    # records.
+    if isinstance(data, dict):
+        for (tag, record) in sorted(data.items()):
+            record = dict(record or {})
+            record.setdefault("tag", tag)
+            yield record
+    elif isinstance(data, list):
+        for record in data:
+            yield record
+    else:
+        raise ValueError("Expected a list of records or an object mapping"
+                         " tags to records")
+
+
+data_readers = {
+    "csv": read_csv_records,
+    "json": read_json_records,
+    "jsonl": read_json_lines_records,
+    "yaml": read_yaml_records,
+}
+
+data_format_extensions = {
+    ".csv": "csv",
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+}
+
+
+def get_data_format(path, data_format=None):
+    """Return the format of the data file *path*.
+
+    The format is *data_format* if given, and otherwise derived from the
+    file's extension. Raises :exc:`ValueError` for unknown formats.
+
+    """
+    if not data_format:
+        extension = os.path.splitext(path)[1].lower()
+        data_format = data_format_extensions.get(extension)
+        if data_format is None:
+            raise ValueError("Unknown data file extension: '{0}'"
+                             .format(extension))
+    elif data_format not in data_readers:
+        raise ValueError("Unknown data format: '{0}'".format(data_format))
+    return data_format
+
+
+# =============================================================================
+# Traceable records
+
+class TraceableRecord(object):
+    """A traceable defined by a record of a data file.
+
+    *number* is the 1-based position of the record in its file. Field
+    names are lowercased, as are the option names of the ``traceable``
+    directive. Empty fields are left out, and lists are joined with
+    commas, so that they can hold the tags of relationships.
+
+    """
+
+    def __init__(self, number, record, tag_field="tag",
+                 content_field="content"):
+        self.number = number
+        self.tag = None
+        self.content = None
+        self.attributes = {}
+        self.invalid_names = []
+        if not isinstance(record, dict):
+            return
+        for (name, value) in record.items():
+            name = unicode(name).strip().lower()
+            value = self.convert_value(value)
+            if not value:
+                continue
+            if name == tag_field:
+                self.tag = value
+            elif name == content_field:
+                self.content = value
+            elif is_valid_traceable_attribute_name(name):
+                self.attributes[name] = value
+            else:
+                self.invalid_names.append(name)
+        self.invalid_names.sort()
+
+    @staticmethod
+    def convert_value(value):
+        if value is None:
+            return u""
+        if isinstance(value, (list, tuple)):
+            return u", ".join(unicode(item) for item in value)
+        if isinstance(value, bool):
+            return u"yes" if value else u"no"
+        return unicode(value).strip()
+
+    def get_problems(self, path):
+        """Return messages describing problems with this record."""
+        problems = []
+        location = "record {0} of {1}".format(self.number, path)
+        if not self.tag:
+            problems.append("Traceable {0} has no tag".format(location))
+        for name in self.invalid_names:
+            problems.append("Traceable attribute has invalid syntax: {0!r}"
+                            " in {1}".format(name, location))
+        return problems
+
+
+def read_traceable_records(path, data_format=None, encoding="utf-8",
+                           tag_field="tag", content_field="content"):
+    """Yield a :obj:`TraceableRecord` for each record of the data file
+    *path*.
+
+    Raises :exc:`ValueError` if the file's format is unknown or its
+    content can't be parsed, and :exc:`IOError` if it can't be read.
+
+    """
+    reader = data_readers[get_data_format(path, data_format)]
+    with open(path, "rb") as source_file:
+        for (index, record) in enumerate(reader(source_file, encoding)):
+            yield TraceableRecord(index + 1, record, tag_field,
+                                  content_field)
+
+
+# =============================================================================
+# Directives
+
+class TraceableImportDirective(Directive):
+
+    required_arguments = 1
+    optional_arguments = 0
+    final_argument_whitespace = True
+    option_spec = {
+        "data-format": directives.unchanged_required,
+        "encoding": directives.encoding,
+        "tag-field": directives.unchanged_required,
+        "content-field": directives.unchanged_required,
+        "format": directives.unchanged_required,
+    }
+    has_content = False
+
+    def run(self):
+        env = self.state.document.settings.env
+        rel_filename, filename = env.relfn2path(self.arguments[0])
+        env.note_dependency(rel_filename)
+
+        records = read_traceable_records(
+            filename, self.options.get("data-format"),
+            self.options.get("encoding", "utf-8"),
+            self.options.get("tag-field", "tag").lower(),
+            self.options.get("content-field", "content").lower())
+        result = []
+        directive = "{0}:{1}".format(env.docname, self.lineno)
+        with profiling.measure("import", "records", env.docname, directive):
+            try:
+                for record in records:
+                    result.extend(self.import_record(env, record,
+                                                     rel_filename))
+            except (IOError, ValueError), error:
+                result.append(self.create_error(
+                    env, "Traceables could not be imported from {0}: {1}"
+                    .format(rel_filename, error)))
+        return result
+
+    def import_record(self, env, record, path):
+        messages = [self.create_error(env, problem)
+                    for problem in record.get_problems(path)]
+        if not record.tag:
+            return messages
+
+        attributes = dict(record.attributes)
+        format = attributes.pop("format",
+                                self.options.get("format", "admonition"))
+
+        serial = env.new_serialno("traceables")
+        target_id = "traceables-{0:d}".format(serial)
+        target_node = create_target_node(record.tag, attributes, env.docname,
+                                         target_id, self.lineno)
+
+        traceable = Traceable(target_node)
+        try:
+            TraceablesStorage(env).add_traceable(traceable)
+        except ValueError:
+            env.get_domain("traceables").note_duplicate(record.tag,
+                                                        env.docname,
+                                                        self.lineno)
+        else:
+            env.get_domain("traceables").add_traceable(traceable)
+
+        display_node = traceable_display()
+        display_node["source"] = env.docname
+        display_node["line"] = self.lineno
+        display_node["traceables-tag"] = record.tag
+        display_node["traceables-format"] = format
+        display_node["traceables-options"] = {}
+        if record.content:
+            for paragraph in record.content.split("\n\n"):
+                display_node += nodes.paragraph(text=paragraph.strip())
+
+        return [target_node, display_node] + messages
+
+    def create_error(self, env, message):
+        env.warn(env.docname, message, self.lineno)
+        return nodes.system_message(message=message, level=2, type="ERROR",
+                                    source=env.docname, line=self.lineno)
+
+
+# =============================================================================
+# Setup this extension part
+
+def setup(app):
+    app.add_directive("traceable-import", TraceableImportDirective)
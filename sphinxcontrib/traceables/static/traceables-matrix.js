@@ -0,0 +1,194 @@
+/*
+ * Client-side rendering of virtual traceables matrices.
+ *
+ * Each matrix is stored in a sidecar script, which assigns the primary
+ * and secondary traceables and, for each primary, the indices of its
+ * related secondaries to window.traceablesMatrices under the matrix's
+ * key. Scripts are used instead of JSON files because browsers don't
+ * allow pages opened from the local file system to request files. Only the part of the matrix which is visible in its
+ * scrolling viewport is rendered, together with the row and column
+ * headers for that part.
+ */
+
+(function () {
+    "use strict";
+
+    var ROW_HEIGHT = 24;
+    var COLUMN_WIDTH = 24;
+    var HEADER_HEIGHT = 160;
+    var LABEL_WIDTH = 180;
+    var OVERSCAN = 4;
+
+    function escapeHtml(text) {
+        return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;")
+            .replace(/>/g, "&gt;").replace(/"/g, "&quot;");
+    }
+
+    function makeLink(traceable) {
+        var code = '<code class="docutils literal">' +
+            escapeHtml(traceable[0]) + "</code>";
+        if (!traceable[1]) {
+            return code;
+        }
+        return '<a class="reference internal" href="' +
+            escapeHtml(traceable[1]) + '" title="' +
+            escapeHtml(traceable[0]) + '">' + code + "</a>";
+    }
+
+    // Return the index of the first value in the sorted array which is
+    // not less than the given value.
+    function lowerBound(values, value) {
+        var low = 0;
+        var high = values.length;
+        while (low < high) {
+            var middle = (low + high) >>> 1;
+            if (values[middle] < value) {
+                low = middle + 1;
+            } else {
+                high = middle;
+            }
+        }
+        return low;
+    }
+
+    function VirtualMatrix(element, data) {
+        this.data = data;
+        this.primaryLinks = data.primaries.map(makeLink);
+        this.secondaryLinks = data.secondaries.map(makeLink);
+
+        element.innerHTML = "";
+        this.viewport = document.createElement("div");
+        this.viewport.className = "traceables-virtual-viewport";
+        element.appendChild(this.viewport);
+
+        this.canvas = document.createElement("div");
+        this.canvas.className = "traceables-virtual-canvas";
+        this.canvas.style.width =
+            (LABEL_WIDTH + data.secondaries.length * COLUMN_WIDTH) + "px";
+        this.canvas.style.height =
+            (HEADER_HEIGHT + data.primaries.length * ROW_HEIGHT) + "px";
+        this.viewport.appendChild(this.canvas);
+
+        this.cells = this.createLayer("traceables-virtual-cells");
+        this.rowHeaders = this.createLayer("traceables-virtual-rows");
+        this.columnHeaders = this.createLayer("traceables-virtual-columns");
+        this.corner = this.createLayer("traceables-virtual-corner");
+        this.corner.style.width = LABEL_WIDTH + "px";
+        this.corner.style.height = HEADER_HEIGHT + "px";
+        this.corner.innerHTML =
+            '<span class="traceables-virtual-forward">' +
+            escapeHtml(data.forward) + "</span>" +
+            '<span class="traceables-virtual-backward">' +
+            escapeHtml(data.backward) + "</span>";
+
+        var self = this;
+        var pending = false;
+        function update() {
+            pending = false;
+            self.render();
+        }
+        function schedule() {
+            if (!pending) {
+                pending = true;
+                (window.requestAnimationFrame || setTimeout)(update);
+            }
+        }
+        this.viewport.addEventListener("scroll", schedule);
+        window.addEventListener("resize", schedule);
+        this.render();
+    }
+
+    VirtualMatrix.prototype.createLayer = function (className) {
+        var layer = document.createElement("div");
+        layer.className = className;
+        this.canvas.appendChild(layer);
+        return layer;
+    };
+
+    VirtualMatrix.prototype.render = function () {
+        var data = this.data;
+        var viewport = this.viewport;
+        var top = viewport.scrollTop;
+        var left = viewport.scrollLeft;
+
+        // Determine the range of visible rows and columns.
+        var firstRow = Math.max(0, Math.floor(top / ROW_HEIGHT) - OVERSCAN);
+        var lastRow = Math.min(data.primaries.length,
+            Math.ceil((top + viewport.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+        var firstColumn = Math.max(0,
+            Math.floor(left / COLUMN_WIDTH) - OVERSCAN);
+        var lastColumn = Math.min(data.secondaries.length,
+            Math.ceil((left + viewport.clientWidth) / COLUMN_WIDTH) +
+            OVERSCAN);
+
+        // Headers stick to the top and left edges of the viewport.
+        this.rowHeaders.style.left = left + "px";
+        this.columnHeaders.style.top = top + "px";
+        this.corner.style.left = left + "px";
+        this.corner.style.top = top + "px";
+
+        var rowParts = [];
+        var cellParts = [];
+        var row, column, index, columns;
+        for (row = firstRow; row < lastRow; row++) {
+            var y = HEADER_HEIGHT + row * ROW_HEIGHT;
+            rowParts.push('<div class="traceables-virtual-row" style="top:' +
+                y + 'px">' + this.primaryLinks[row] + "</div>");
+            columns = data.rows[row];
+            for (index = lowerBound(columns, firstColumn);
+                 index < columns.length && columns[index] < lastColumn;
+                 index++) {
+                cellParts.push(
+                    '<div class="traceables-checkmark" style="top:' + y +
+                    "px;left:" +
+                    (LABEL_WIDTH + columns[index] * COLUMN_WIDTH) +
+                    'px"></div>');
+            }
+        }
+
+        var columnParts = [];
+        for (column = firstColumn; column < lastColumn; column++) {
+            columnParts.push(
+                '<div class="traceables-virtual-column" style="left:' +
+                (LABEL_WIDTH + column * COLUMN_WIDTH) + 'px">' +
+                this.secondaryLinks[column] + "</div>");
+        }
+
+        this.rowHeaders.innerHTML = rowParts.join("");
+        this.cells.innerHTML = cellParts.join("");
+        this.columnHeaders.innerHTML = columnParts.join("");
+    };
+
+    function load(element) {
+        var key = element.getAttribute("data-key");
+        function fail() {
+            element.textContent = "Failed to load traceables matrix.";
+        }
+        var script = document.createElement("script");
+        script.src = element.getAttribute("data-src");
+        script.onload = function () {
+            var matrices = window.traceablesMatrices || {};
+            if (matrices.hasOwnProperty(key)) {
+                new VirtualMatrix(element, matrices[key]);
+            } else {
+                fail();
+            }
+        };
+        script.onerror = fail;
+        document.getElementsByTagName("head")[0].appendChild(script);
+    }
+
+    function init() {
+        var elements = document.querySelectorAll(
+            "div.traceables-virtual-matrix[data-src][data-key]");
+        for (var index = 0; index < elements.length; index++) {
+            load(elements[index]);
+        }
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", init);
+    } else {
+        init();
+    }
+}());
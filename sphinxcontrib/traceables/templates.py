@@ -0,0 +1,94 @@
+"""
+The ``templates`` module: Template-driven formatters
+===============================================================================
+
+"""
+
+import os
+from docutils import nodes
+
+from .infrastructure import TraceablesStorage
+
+
+# =============================================================================
+# Template loading
+
+builtin_templates_directory = os.path.join(os.path.dirname(__file__),
+                                           "templates")
+
+
+class TemplateCache(dict):
+    """Mapping from template name to compiled Jinja2 template.
+
+    Templates are searched for in the project's ``templates_path`` first,
+    so that projects can override the built-in templates, and then in
+    this extension's ``templates`` directory. Each template is compiled
+    only once, when it is first looked up.
+
+    """
+
+    def __init__(self, app):
+        from jinja2 import Environment, FileSystemLoader
+
+        dict.__init__(self)
+        search_path = [os.path.join(app.confdir, path)
+                       for path in app.config.templates_path]
+        search_path.append(builtin_templates_directory)
+        self.environment = Environment(loader=FileSystemLoader(search_path),
+                                       autoescape=True)
+
+    def __missing__(self, name):
+        template = self[name] = self.environment.get_template(name)
+        return template
+
+
+def get_template(app, name):
+    storage = TraceablesStorage(app.builder.env)
+    templates = storage.traceables_set.get_cache(
+        "templates", lambda: TemplateCache(app))
+    return templates[name]
+
+
+def create_link_context(traceable, builder, docname):
+    return {
+        "tag": traceable.tag,
+        "title": traceable.title,
+        "uri": traceable.get_reference_uri(builder, docname),
+    }
+
+
+# =============================================================================
+# Formatter base class
+
+class TemplateFormatterBase(object):
+    """Base class for formatters which render HTML from a template.
+
+    The whole output is rendered by a single template into one raw HTML
+    node, instead of being built up node by node. Builders for other
+    formats use the *fallback* formatter instead.
+
+    Subclasses provide the template's context by implementing
+    :meth:`get_context`.
+
+    """
+
+    def __init__(self, template_name, fallback):
+        self.template_name = template_name
+        self.fallback = fallback
+
+    def format(self, app, docname, node, data, options):
+        if app.builder.format != "html":
+            return self.fallback.format(app, docname, node, data, options)
+        html = self.render(app, docname, node, data, options)
+        return self.create_nodes(node, html)
+
+    def render(self, app, docname, node, data, options):
+        template = get_template(app, self.template_name)
+        context = self.get_context(app, docname, node, data, options)
+        return template.render(context)
+
+    def get_context(self, app, docname, node, data, options):
+        raise NotImplementedError()
+
+    def create_nodes(self, node, html):
+        return [nodes.raw("", html, format="html")]
@@ -9,26 +9,14 @@ import collections
 import textwrap
 from docutils import nodes
 from docutils.parsers.rst import Directive, directives
-import sphinx
-from sphinx import addnodes
 from sphinx.locale import _
-from sphinx.roles import XRefRole
-from sphinx.environment import NoUri
 from sphinx.util.compat import make_admonition
-from sphinx.util.nodes import make_refnode
 
 from .infrastructure import ProcessorBase, Traceable, TraceablesStorage
 from .display import traceable_display
 from .utils import is_valid_traceable_attribute_name
 
 
-# =============================================================================
-# Node types
-
-class traceable_xref(nodes.Inline, nodes.Element):
-    pass
-
-
 # =============================================================================
 # Utility classes
 
@@ -50,6 +38,25 @@ class DefaultDict(dict):
     __nonzero__ = __bool__
 
 
+# =============================================================================
+# Target nodes
+
+def create_target_node(tag, attributes, docname, target_id, lineno):
+    """Return the target node defining a traceable.
+
+    The node holds everything stored about the traceable, so that a
+    :obj:`Traceable` can be created from it.
+
+    """
+    target_node = nodes.target("", "", ids=[target_id])
+    target_node["docname"] = docname
+    target_node["refid"] = target_id
+    target_node["lineno"] = lineno
+    target_node["traceables-tag"] = tag
+    target_node["traceables-attributes"] = attributes
+    return target_node
+
+
 # =============================================================================
 # Directives
 
@@ -64,22 +71,8 @@ class TraceableDirective(Directive):
     def create_target_node(self, env, tag, attributes):
         serial = env.new_serialno("traceables")
         target_id = "traceables-{0:d}".format(serial)
-        target_node = nodes.target("", "", ids=[target_id])
-        target_node["docname"] = env.docname
-        target_node["refid"] = target_id
-        target_node["lineno"] = self.lineno
-        target_node["traceables-tag"] = tag
-        target_node["traceables-attributes"] = attributes
-        return target_node
-
-    def create_index_node(self, env, tag, attributes):
-        if sphinx.version_info[:2] < (1, 4):  # Sphinx earlier than v1.4
-            entries = [("single", tag, tag, "")]
-        else:  # Sphinx v1.4 and later
-            entries = [("single", tag, tag, "", None)]
-        index_node = addnodes.index()
-        index_node["entries"] = entries
-        return index_node
+        return create_target_node(tag, attributes, env.docname, target_id,
+                                  self.lineno)
 
     def run(self):
         env = self.state.document.settings.env
@@ -105,23 +98,16 @@ class TraceableDirective(Directive):
         format = attributes.pop("format", "admonition")
 
         target_node = self.create_target_node(env, tag, attributes)
-        index_node = self.create_index_node(env, tag, attributes)
 
         traceable = Traceable(target_node)
         try:
             TraceablesStorage(env).add_traceable(traceable)
-        except ValueError, e:
-            env.warn_node(e.message, target_node)
-            # TODO: Should use error handling similar to this:
-            # Error = ExtensionError
-            # except self.Error, error:
-            #    message = str(error)
-            #    self.env.warn_node(message, node)
-            #    msg = nodes.system_message(message=message,
-            #                               level=2, type="ERROR",
-            #                               source=node.source,
-            #                               line=node.line)
-            #    node.replace_self(msg)
+        except ValueError:
+            # Duplicate tags are reported together at the end of reading.
+            env.get_domain("traceables").note_duplicate(tag, env.docname,
+                                                        self.lineno)
+        else:
+            env.get_domain("traceables").add_traceable(traceable)
 
         # Construct placeholder node for traceable display.
         display_node = traceable_display()
@@ -135,7 +121,7 @@ class TraceableDirective(Directive):
         self.state.nested_parse(self.content, self.content_offset,
                                 display_node)
 
-        return [target_node, index_node, display_node] + messages
+        return [target_node, display_node] + messages
 
 
 # =============================================================================
@@ -144,63 +130,9 @@ class TraceableDirective(Directive):
 class RelationshipsProcessor(ProcessorBase):
 
     def process_doctree(self, doctree, docname):
-        traceables = self.storage.traceables_set
-        relationship_types = self.storage.relationship_types
-
-        relationships = {}
-        all_tags = set()
-        for relationship_type in relationship_types:
-            primary, secondary, directional = relationship_type
-            for traceable in traceables:
-                all_tags.add(traceable.tag)
-                if primary in traceable.attributes:
-                    tags_string = traceable.attributes[primary]
-                    for tag in traceable.split_tags_string(tags_string):
-                        self._add_relationship(relationships, traceable.tag,
-                                               tag, primary, secondary)
-                        all_tags.add(tag)
-                if secondary in traceable.attributes:
-                    tags_string = traceable.attributes[secondary]
-                    for tag in traceable.split_tags_string(tags_string):
-                        self._add_relationship(relationships, tag,
-                                               traceable.tag, primary,
-                                               secondary)
-                        all_tags.add(tag)
-
-        # Add placeholders for unresolved tags.
-        for tag in all_tags:
-            self.storage.get_or_create_traceable_by_tag(tag)
-
-        # Construct relationships with traceables instead of tags.
-        for tag1, name_tag2s in relationships.items():
-            traceable = self.storage.get_traceable_by_tag(tag1)
-            for name, tag2s in name_tag2s.items():
-                traceable.relationships[name] = set()
-                for tag2 in tag2s:
-                    relative = self.storage.get_traceable_by_tag(tag2)
-                    traceable.relationships[name].add(relative)
-
-    def _add_relationship(self, relationships, tag1, tag2, primary, secondary):
-        level1 = relationships.setdefault(tag1, {})
-        level2 = level1.setdefault(primary, set())
-        level2.add(tag2)
-        level1 = relationships.setdefault(tag2, {})
-        level2 = level1.setdefault(secondary, set())
-        level2.add(tag1)
-
-
-class XrefProcessor(ProcessorBase):
-
-    def process_doctree(self, doctree, docname):
-        for xref_node in doctree.traverse(traceable_xref):
-            tag = xref_node["reftarget"]
-            traceable = self.storage.get_or_create_traceable_by_tag(tag)
-            if traceable.is_unresolved:
-                self.env.warn_node("Traceables: no traceable with tag '{0}'"
-                                   " found!".format(tag), xref_node)
-            new_node = traceable.make_reference_node(self.app.builder,
-                                                     docname)
-            xref_node.replace_self(new_node)
+        # The relationship graph is only rebuilt if traceables have been
+        # added or removed since it was last built.
+        self.storage.update_relationships()
 
 
 # =============================================================================
@@ -224,8 +156,4 @@ default_relationships = [
 def setup(app):
     app.add_config_value("traceables_relationships",
                          default_relationships, "env")
-    app.add_node(traceable_xref)
     app.add_directive("traceable", TraceableDirective)
-    app.add_role("traceable", XRefRole(nodeclass=traceable_xref,
-                                       innernodeclass=nodes.literal,
-                                       warn_dangling=True))
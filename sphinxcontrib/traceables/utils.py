@@ -30,8 +30,102 @@ def is_valid_traceable_attribute_name(input):
         return False
 
 
+# =============================================================================
+# Sorting utilities.
+
+number_re = re.compile(r"(\d+)")
+
+
+def natural_sort_key(text):
+    """Return a key which sorts numbers within *text* numerically.
+
+    For example, ``REQ-2`` sorts before ``REQ-10``.
+
+    """
+    parts = number_re.split(text)
+    return tuple(int(part) if index % 2 else part
+                 for (index, part) in enumerate(parts))
+
+
+# =============================================================================
+# Similarity search utilities.
+
+def edit_distance(text1, text2):
+    """Return the Levenshtein distance between *text1* and *text2*."""
+    if len(text1) < len(text2):
+        text1, text2 = text2, text1
+    previous_row = range(len(text2) + 1)
+    for (index1, character1) in enumerate(text1, 1):
+        current_row = [index1]
+        for (index2, character2) in enumerate(text2, 1):
+            current_row.append(min(previous_row[index2] + 1,
+                                   current_row[index2 - 1] + 1,
+                                   previous_row[index2 - 1] +
+                                   (character1 != character2)))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+class BKTree(object):
+    """Burkhard-Keller tree for finding texts within an edit distance.
+
+    Each node holds a text and its children keyed by their distance to
+    that text. Because edit distance is a metric, a search only needs to
+    descend into children whose key is within *max_distance* of the
+    query's distance to the node, which skips most of the tree.
+
+    """
+
+    def __init__(self, texts=()):
+        self.root = None
+        for text in texts:
+            self.add(text)
+
+    def add(self, text):
+        if self.root is None:
+            self.root = (text, {})
+            return
+        node_text, children = self.root
+        while True:
+            distance = edit_distance(text, node_text)
+            if distance == 0:
+                return
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (text, {})
+                return
+            node_text, children = child
+
+    def search(self, text, max_distance):
+        """Return ``(distance, text)`` pairs of all texts within
+        *max_distance* of *text*, closest first."""
+        matches = []
+        pending = [self.root] if self.root else []
+        while pending:
+            node_text, children = pending.pop()
+            distance = edit_distance(text, node_text)
+            if distance <= max_distance:
+                matches.append((distance, node_text))
+            for (child_distance, child) in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    pending.append(child)
+        return sorted(matches)
+
+
 # =============================================================================
 # Latex-related utilities.
 
 def latex_escape(text):
     return six.text_type(text).translate(tex_escape_map)
+
+
+class LatexEscapeCache(dict):
+    """Mapping from text to its LaTeX escaped form.
+
+    Each text is escaped only once, when it is first looked up.
+
+    """
+
+    def __missing__(self, text):
+        escaped = self[text] = latex_escape(text)
+        return escaped
@@ -0,0 +1,9 @@
+source_suffix = ".txt"
+master_doc = "index"
+project = "Software"
+
+extensions = ["sphinxcontrib.traceables"]
+
+traceables_inventories = {
+    "system": ("../system/", "_build/system.inv"),
+}
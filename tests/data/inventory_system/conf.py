@@ -0,0 +1,6 @@
+source_suffix = ".txt"
+master_doc = "index"
+project = "System"
+version = "1.0"
+
+extensions = ["sphinxcontrib.traceables"]
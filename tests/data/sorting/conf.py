@@ -0,0 +1,4 @@
+source_suffix = ".txt"
+master_doc = "index"
+
+extensions = ["sphinxcontrib.traceables", "sphinx.ext.graphviz"]
@@ -36,7 +36,7 @@ def test_xml_basics(app, status, warning):
 
     # Verify that 2 traceables are found.
     assert len(tree.findall(".//target")) == 2
-    assert len(tree.findall(".//index")) == 2
+    assert len(tree.findall(".//index")) == 0
     assert len(tree.findall(".//admonition")) == 2
     assert len(tree.findall(".//admonition")) == 2
 
@@ -57,9 +57,8 @@ def test_xml_basics(app, status, warning):
         assert False, "Child's parents field not found!"
 
     # Verify that a warning is emitted for unknown traceable tag.
-    assert (warning.getvalue().find(
-        "WARNING: Traceables: no traceable with tag"
-        " 'NONEXISTENT' found!") > 0)
+    assert ("no traceable with tag 'NONEXISTENT' found, referenced at: "
+            in warning.getvalue())
 
 
 @with_app(buildername="html", srcdir="basics")
@@ -89,6 +88,13 @@ def test_html_builder(app, status, warning):
     verifier = HTMLTraceableIdVerifier()
     verifier.feed(index_html)
 
+    # Verify that the traceables index page lists all traceables.
+    with open(app.outdir / "traceables-index.html") as traceables_index_file:
+        traceables_index_html = traceables_index_file.read()
+    for tag in ["AQUILA", "LYRA", "SAGITTA"]:
+        assert tag in traceables_index_html
+    assert "NONEXISTENT" not in traceables_index_html
+
 
 class HTMLTraceableIdVerifier(HTMLParser):
 
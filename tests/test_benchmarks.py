@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+from nose.tools import eq_
+from benchmarks.synthetic import generate_project
+from benchmarks.build import (run_build_in_process, compare_with_baseline,
+                              measure_import_time)
+from benchmarks import micro
+
+
+# =============================================================================
+# Tests
+
+def test_synthetic_build():
+    '''Verify that synthetic projects build and are timed per phase'''
+    workdir = tempfile.mkdtemp()
+    try:
+        srcdir = os.path.join(workdir, "source")
+        parameters = generate_project(srcdir, traceables=30, documents=3,
+                                      lists=1, matrices=1, graphs=0)
+        build = run_build_in_process(srcdir, os.path.join(workdir, "build"),
+                                     "xml")
+    finally:
+        shutil.rmtree(workdir)
+
+    eq_(sorted(build["phases"]),
+        ["init", "read", "resolve", "total", "write"])
+    assert build["phases"]["resolve"] > 0
+    assert "processor:ListProcessor" in build["extension_timings"]
+
+    # Verify comparison against a baseline of the same results.
+    results = {"parameters": parameters.to_json(), "builds": {"xml": build}}
+    eq_(compare_with_baseline(results, results, 0.2), [])
+    baseline = {"parameters": parameters.to_json(),
+                "builds": {"xml": dict(build, phases=dict(
+                    build["phases"], total=build["phases"]["total"] / 2))}}
+    eq_(len(compare_with_baseline(results, baseline, 0.2)), 1)
+
+
+def test_microbenchmarks():
+    '''Verify that microbenchmarks run on an in-memory storage'''
+    results = micro.run_benchmarks([50, 100], min_time=0.001, repeat=1)
+    eq_(sorted(results),
+        sorted(function.__name__ for function in micro.benchmarks))
+    for result in results.values():
+        assert result["sizes"][100]["ops_per_sec"] > 0
+        assert "50-100" in result["exponents"]
+
+
+def test_import_time():
+    '''Verify that graph dependencies aren't imported at load time'''
+    result = measure_import_time(repeat=1)
+    assert result["seconds"] > 0
+    eq_(result["modules"], [])
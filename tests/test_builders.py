@@ -1,3 +1,4 @@
+import os
 
 from nose.tools import eq_, assert_raises
 from utils import with_app, pretty_print_xml
@@ -11,7 +12,33 @@ def test_builder_html(app, status, warning):
     '''Verify that HTML builder doesn't fail'''
     app.build()
 
+@with_app(buildername="html", srcdir="matrix", warningiserror=True)
+def test_static_files(app, status, warning):
+    '''Verify that unchanged static files aren't copied again'''
+    app.build()
+    static_path = os.path.join(app.outdir, "_static", "traceables-matrix.js")
+    css_path = os.path.join(app.outdir, "_static", "traceables-matrix.css")
+    os.utime(static_path, (0, 0))
+    with open(css_path, "w") as css_file:
+        css_file.write("outdated")
+
+    # Rebuild and verify that only the changed file was copied.
+    app.build()
+    eq_(os.path.getmtime(static_path), 0)
+    with open(css_path) as css_file:
+        assert css_file.read() != "outdated"
+
 @with_app(buildername="latex", srcdir="matrix", warningiserror=True)
 def test_latex_builder(app, status, warning):
     '''Verify that Latex builder doesn't fail'''
     app.build()
+
+    # Verify that the cross table is written completely.
+    latex_files = [name for name in os.listdir(app.outdir)
+                   if name.endswith(".tex")]
+    eq_(len(latex_files), 1)
+    with open(os.path.join(app.outdir, latex_files[0])) as latex_file:
+        latex = latex_file.read()
+    assert r"\begin{longtable}{@{} cl*" in latex
+    assert r"\checkmark\\" in latex
+    eq_(latex.count(r"\begin{longtable}"), latex.count(r"\end{longtable}"))
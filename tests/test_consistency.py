@@ -0,0 +1,33 @@
+
+from nose.tools import eq_
+from utils import with_app, pretty_print_xml
+from sphinxcontrib.traceables.infrastructure import TraceablesStorage
+
+
+# =============================================================================
+# Tests
+
+@with_app(buildername="xml", srcdir="consistency")
+def test_relationship_consistency(app, status, warning):
+    app.build()
+    storage = TraceablesStorage(app.env)
+    analysis = storage.relationship_analysis
+
+    # Verify that cycles and self-references are recorded.
+    cycles = [(name, [t.tag for t in traceables])
+              for (name, traceables) in analysis.cycles]
+    eq_(sorted(cycles), [("children", ["AQUILA", "LYRA", "SAGITTA"]),
+                         ("children", ["CEPHEUS"])])
+    assert analysis.has_cycles("children")
+
+    # Verify that unresolved tags are recorded with their referrers.
+    unresolved = [(placeholder.tag, [t.tag for t in referrers])
+                  for (placeholder, referrers) in analysis.unresolved]
+    eq_(unresolved, [("NONEXISTENT", ["AURIGA", "CEPHEUS"])])
+
+    # Verify that all problems are reported in a single warning.
+    output = warning.getvalue()
+    eq_(output.count("WARNING: Traceables: inconsistent relationships"), 1)
+    assert "cycle in relationship 'children' between: AQUILA (" in output
+    assert ("no traceable with tag 'NONEXISTENT' found, referenced by:"
+            " AURIGA (") in output
@@ -0,0 +1,86 @@
+from nose.tools import eq_, assert_raises
+from sphinxcontrib.traceables.engine import TraceablesEngine
+from sphinxcontrib.traceables.filter import FilterError
+
+
+# =============================================================================
+# Tests
+
+def create_engine():
+    engine = TraceablesEngine()
+    engine.add("SAGITTA", {"title": "Sagitta", "color": "blue"})
+    engine.add("AQUILA", {"parents": "SAGITTA", "color": "red"})
+    engine.add("LYRA", {"parents": "SAGITTA", "color": "blue"})
+    engine.add("VEGA", {"parents": "LYRA", "color": "white"})
+    return engine
+
+
+def tags(traceables):
+    return [traceable.tag for traceable in traceables]
+
+
+def test_engine_relationships():
+    '''Verify relationships of traceables defined without Sphinx'''
+    engine = create_engine()
+    eq_(tags(engine.traceables), ["AQUILA", "LYRA", "SAGITTA", "VEGA"])
+    eq_(tags(engine.get_relatives("SAGITTA", "children")), ["AQUILA", "LYRA"])
+    eq_(tags(engine.get_relatives("VEGA", "parents", transitive=True)),
+        ["LYRA", "SAGITTA"])
+    eq_(engine.check_relationships(), [])
+    assert_raises(ValueError, engine.add, "VEGA")
+
+    # Verify that removal and unresolved tags are taken into account.
+    engine.remove("SAGITTA")
+    eq_(tags(engine.traceables), ["AQUILA", "LYRA", "VEGA"])
+    warnings = engine.check_relationships()
+    eq_(len(warnings), 1)
+    assert "no traceable with tag 'SAGITTA' found" in warnings[0]
+
+
+def test_engine_tag_suggestions():
+    '''Verify suggestions of similar tags for unresolved tags'''
+    engine = create_engine()
+    eq_(engine.storage.get_tag_suggestions("SAGITA"), ["SAGITTA"])
+    eq_(engine.storage.get_tag_suggestions("VGA"), ["VEGA"])
+    eq_(engine.storage.get_tag_suggestions("ORION"), [])
+    engine.add("LYNX", {"parents": "LIRA"})
+    warnings = engine.check_relationships()
+    eq_(len(warnings), 1)
+    assert ("no traceable with tag 'LIRA' found, referenced by: LYNX (:0);"
+            " did you mean 'LYRA'?" in warnings[0])
+
+
+def test_engine_filter():
+    '''Verify filtering of traceables defined without Sphinx'''
+    engine = create_engine()
+    eq_(tags(engine.filter("color == 'blue'")), ["LYRA", "SAGITTA"])
+    eq_(tags(engine.filter("'SAGITTA' in all_parents")),
+        ["AQUILA", "LYRA", "VEGA"])
+    assert_raises(FilterError, engine.filter, "color ==")
+
+
+def test_engine_matrix():
+    '''Verify matrices of traceables defined without Sphinx'''
+    engine = create_engine()
+    matrix = engine.build_matrix("parents", filter_primaries="color != 'red'")
+    eq_(tags(matrix.primaries), ["LYRA", "SAGITTA", "VEGA"])
+    eq_(tags(matrix.secondaries), ["LYRA", "SAGITTA"])
+    eq_(matrix.get_boolean_row(engine.get("VEGA")), [True, False])
+
+    matrix = engine.build_matrix("parents", transitive=True)
+    eq_(matrix.get_boolean_row(engine.get("VEGA")), [True, True])
+    assert_raises(ValueError, engine.build_matrix, "invalid")
+
+
+def test_engine_graph():
+    '''Verify graphs of traceables defined without Sphinx'''
+    engine = create_engine()
+    graph_input = engine.walk_graph(["VEGA"], "parents:1")
+    eq_(tags(graph_input.traceables), ["LYRA", "VEGA"])
+    assert_raises(ValueError, engine.walk_graph, ["VEGA"], "parents:1",
+                  transitive=True)
+    graph_input = engine.walk_graph(["VEGA"], "parents")
+    eq_(tags(graph_input.traceables), ["LYRA", "SAGITTA", "VEGA"])
+    dot = engine.generate_dot(graph_input)
+    assert "LYRA -> VEGA" in dot
+    assert_raises(ValueError, engine.walk_graph, ["VEGA"], "invalid")
@@ -1,6 +1,8 @@
 
 import os
+import json
 from xml.etree import ElementTree
+from nose.tools import eq_
 from utils import with_app, pretty_print_xml
 
 
@@ -14,8 +16,30 @@ def test_basics(app, status, warning):
 #    pretty_print_xml(tree.getroot())
 
     # Verify that a warning is emitted for doubly defined traceable tag.
-    assert (warning.getvalue().find(
-        "WARNING: More than one traceable with tag 'SAGITTA' found!") > 0)
+    output = warning.getvalue()
+    eq_(output.count("WARNING: Traceables: duplicate tags found:"), 1)
+    assert ("more than one traceable with tag 'SAGITTA' found, defined at: "
+            in output)
+
+    # Verify that unresolved references are reported once for each tag.
+    eq_(output.count("WARNING: Traceables: unresolved references found:"), 1)
+    eq_(output.count("no traceable with tag 'NONEXISTENT' found"), 1)
+
+    # Verify that similar tags are suggested for misspelled references.
+    eq_(output.count("did you mean"), 1)
+    assert "did you mean 'SAGITTA'?" in output
+
+    # Verify the machine-readable diagnostics file.
+    with open(os.path.join(app.outdir,
+                           "traceables-diagnostics.json")) as json_file:
+        diagnostics = json.load(json_file)
+    eq_([location["lineno"]
+         for location in diagnostics["duplicates"]["SAGITTA"]], [2, 5])
+    eq_([location["kind"]
+         for location in diagnostics["unresolved"]["NONEXISTENT"]],
+        ["reference", "reference"])
+    eq_(diagnostics["suggestions"]["SAGITA"], ["SAGITTA"])
+    eq_(diagnostics["suggestions"]["NONEXISTENT"], [])
 
     # Verify that a warning is emitted for doubly defined traceable tag.
     assert (warning.getvalue().find(
@@ -92,3 +92,15 @@ def test_graph_no_valid_start_tags(app, status, warning):
         index_html = index_html_file.read()
     assert re.search("Traceables: no valid tags for graph,"
                      " so skipping graph", index_html)
+
+@with_app(buildername="xml", srcdir="transitive", warningiserror=True)
+def test_graph_transitive(app, status, warning):
+    """Verify transitive relationships in traceable-graph output"""
+
+    app.build()
+    tree = ElementTree.parse(app.outdir / "transitive_graph.xml")
+    code = tree.find(".//graphviz").get("code")
+
+    # Verify that edges skip intermediate traceables.
+    for tag in ["SW-1", "SW-2", "SYS-1"]:
+        assert '"{0}" -> "TEST-1"'.format(tag) in code
@@ -1,8 +1,15 @@
 
+import pickle
+from docutils import nodes
 from nose.tools import eq_, assert_raises
 from utils import with_app, pretty_print_xml
 from sphinxcontrib.traceables.infrastructure import (Traceable,
+                                                     TraceablesSet,
                                                      TraceablesStorage)
+from sphinxcontrib.traceables.relationships import RelationshipGraph
+from sphinxcontrib.traceables.display import TraceableDisplayModel
+from sphinxcontrib.traceables.traceables import default_relationships
+from sphinxcontrib.traceables.utils import BKTree, edit_distance
 
 
 # =============================================================================
@@ -20,3 +27,118 @@ def test_infrastructure(app, status, warning):
     # Verify Traceable.__str__() doesn't fail.
     for traceable in storage.traceables_set:
         ignored_output = str(traceable)
+
+
+@with_app(buildername="xml", srcdir="basics")
+def test_traceables_set_pickling(app, status, warning):
+    app.build()
+    storage = TraceablesStorage(app.env)
+
+    # Verify that relationships survive a pickling round trip.
+    data = pickle.dumps(storage.traceables_set, pickle.HIGHEST_PROTOCOL)
+    traceables_set = pickle.loads(data)
+    traceables_set.resolve_relationships()
+    traceables_dict = dict((t.tag, t) for t in traceables_set)
+    parents = traceables_dict["AQUILA"].relationships["parents"]
+    eq_([t.tag for t in parents], ["SAGITTA"])
+    assert iter(parents).next() is traceables_dict["SAGITTA"]
+
+
+def test_traceables_set_pickling_long_chain():
+    # Construct a long chain of related traceables.
+    traceables = []
+    for index in range(5001):
+        target_node = nodes.target()
+        target_node["traceables-tag"] = "T{0:d}".format(index)
+        target_node["traceables-attributes"] = {}
+        if index < 5000:
+            target_node["traceables-attributes"]["children"] = (
+                "T{0:d}".format(index + 1))
+        traceables.append(Traceable(target_node))
+    traceables_set = TraceablesSet(traceables)
+    graph = RelationshipGraph(default_relationships)
+    graph.build(traceables_set, graph.collect_edges(traceables_set))
+    traceables_set.relationship_graph = graph
+
+    # Verify that pickling doesn't recurse along the chain.
+    data = pickle.dumps(traceables_set, pickle.HIGHEST_PROTOCOL)
+    traceables_set = pickle.loads(data)
+    traceables_set.resolve_relationships()
+    traceables_dict = dict((t.tag, t) for t in traceables_set)
+    children = traceables_dict["T0"].relationships["children"]
+    eq_([t.tag for t in children], ["T1"])
+    parents = traceables_dict["T5000"].relationships["parents"]
+    eq_([t.tag for t in parents], ["T4999"])
+
+
+@with_app(buildername="xml", srcdir="basics")
+def test_placeholders_not_stored(app, status, warning):
+    app.build()
+    storage = TraceablesStorage(app.env)
+
+    # Verify that placeholders are available but not stored in the set.
+    placeholder = storage.get_or_create_traceable_by_tag("NONEXISTENT")
+    assert placeholder.is_unresolved
+    assert placeholder not in storage.traceables_set
+    assert_raises(KeyError, storage.get_traceable_by_tag, "NONEXISTENT")
+
+    # Verify that placeholders are not pickled with the environment.
+    data = pickle.dumps(storage.traceables_set, pickle.HIGHEST_PROTOCOL)
+    traceables_set = pickle.loads(data)
+    eq_(traceables_set.placeholders, {})
+    eq_(sorted(t.tag for t in traceables_set), ["AQUILA", "LYRA", "SAGITTA"])
+
+
+@with_app(buildername="xml", srcdir="basics")
+def test_display_model_cache(app, status, warning):
+    app.build()
+    storage = TraceablesStorage(app.env)
+
+    # Verify that display models built during the build are reused.
+    aquila = storage.get_traceable_by_tag("AQUILA")
+    model = TraceableDisplayModel.get(storage, aquila)
+    assert TraceableDisplayModel.get(storage, aquila) is model
+    eq_([(name, [t.tag for t in relatives])
+         for (name, relatives) in model.relationship_rows],
+        [("parents", ["SAGITTA"])])
+    lyra = TraceableDisplayModel.get(
+        storage, storage.get_traceable_by_tag("LYRA"))
+    eq_([name for (name, value) in lyra.attribute_rows],
+        ["color", "constellation", "version"])
+
+    # Verify that caches are cleared when traceables change.
+    storage.traceables_set.remove(aquila)
+    eq_(storage.traceables_set.get_cache(TraceableDisplayModel.cache_name),
+        {})
+
+
+@with_app(buildername="xml", srcdir="basics")
+def test_sorted_traceables(app, status, warning):
+    app.build()
+    storage = TraceablesStorage(app.env)
+
+    # Verify that the sorted snapshot is shared until traceables change.
+    traceables = storage.get_sorted_traceables()
+    eq_([t.tag for t in traceables], ["AQUILA", "LYRA", "SAGITTA"])
+    assert storage.get_sorted_traceables() is traceables
+    sort_key = storage.get_sort_key()
+    eq_(sorted(reversed(traceables), key=sort_key), traceables)
+
+    storage.traceables_set.remove(traceables[0])
+    eq_([t.tag for t in storage.get_sorted_traceables()], ["LYRA", "SAGITTA"])
+
+
+def test_bk_tree():
+    eq_(edit_distance("SAGITTA", "SAGITTA"), 0)
+    eq_(edit_distance("SAGITTA", "SAGITA"), 1)
+    eq_(edit_distance("", "LYRA"), 4)
+    eq_(edit_distance("LYRA", "LIRA"), 1)
+    words = ["REQ-{0}".format(index) for index in range(1, 200)]
+    tree = BKTree(words + words)
+    eq_(tree.search("REQ-12", 0), [(0, "REQ-12")])
+    for max_distance in (1, 2):
+        expected = sorted((edit_distance("REQ-12", word), word)
+                          for word in words
+                          if edit_distance("REQ-12", word) <= max_distance)
+        eq_(tree.search("REQ-12", max_distance), expected)
+    eq_(BKTree().search("REQ-12", 2), [])
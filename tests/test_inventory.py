@@ -0,0 +1,131 @@
+
+import os
+import shutil
+from xml.etree import ElementTree
+from nose.tools import eq_, assert_raises
+from utils import with_app, srcdir, pretty_print_xml
+from sphinxcontrib.traceables.infrastructure import TraceablesStorage
+from sphinxcontrib.traceables.matrix import build_traceable_matrix
+from sphinxcontrib.traceables.inventory import (Inventory, InventoryError,
+                                                inventory_filename)
+
+
+# =============================================================================
+# Utility functions
+
+def load_inventory(path):
+    with open(path, "rb") as inventory_file:
+        return Inventory.loads(inventory_file.read())
+
+
+# =============================================================================
+# Tests
+
+def test_inventory_format():
+    inventory = Inventory("Project", "1.0")
+    inventory.add(u"REQ-1", "index.html#traceables-0",
+                  {"title": u"Requirement \u00e9"}, {})
+    inventory.add(u"TEST-1", "tests.html#traceables-0", {},
+                  {"parents": [u"REQ-1", u"REQ-2"]})
+    loaded = Inventory.loads(inventory.dumps())
+    eq_(loaded.project, "Project")
+    eq_(loaded.version, "1.0")
+    eq_(loaded.entries, inventory.entries)
+    eq_(loaded.get_attributes("TEST-1"), {"parents": "REQ-1, REQ-2"})
+    assert_raises(InventoryError, Inventory.loads, "garbage")
+    assert_raises(InventoryError, Inventory.loads,
+                  inventory.dumps()[:-10] + "x" * 10)
+
+
+@with_app(buildername="html", srcdir="inventory_system")
+def test_write_inventory(app, status, warning):
+    app.build()
+    path = os.path.join(app.outdir, inventory_filename)
+    inventory = load_inventory(path)
+    eq_(inventory.project, "System")
+    eq_(sorted(inventory.entries), ["SYS-1", "SYS-2", "SYS-3"])
+    eq_(inventory.entries["SYS-3"],
+        ("details/index.html#traceables-0",
+         {"title": "The system shall be safe"}, {"parents": ["SYS-1"]}))
+    eq_(inventory.entries["SYS-2"][2],
+        {"parents": ["SYS-1"], "children": ["SW-2"]})
+
+    # Verify that an unchanged inventory isn't written again.
+    mtime = int(os.path.getmtime(path)) - 10
+    os.utime(path, (mtime, mtime))
+    app.builder.build_all()
+    eq_(os.path.getmtime(path), mtime)
+
+
+@with_app(buildername="html", srcdir="inventory_system")
+def test_external_traceables(app, status, warning):
+    app.build()
+    inventory_path = os.path.join(srcdir("inventory_software"), "_build",
+                                  "system.inv")
+    if not os.path.isdir(os.path.dirname(inventory_path)):
+        os.makedirs(os.path.dirname(inventory_path))
+    shutil.copy(os.path.join(app.outdir, inventory_filename), inventory_path)
+
+    @with_app(buildername="xml", srcdir="inventory_software")
+    def build_software(app, status, warning):
+        app.build()
+        tree = ElementTree.parse(app.outdir / "index.xml")
+#        pretty_print_xml(tree.getroot())
+        storage = TraceablesStorage(app.env)
+
+        # Verify that only this project's traceables are listed.
+        eq_([traceable.tag for traceable in storage.get_sorted_traceables()],
+            ["SW-1", "SW-2"])
+        eq_(len(tree.findall(".//bullet_list/list_item")), 1)
+
+        # Verify that relationships in both directions resolve.
+        sw1 = storage.get_traceable_by_tag("SW-1")
+        parent = sw1.relationships["parents"][0]
+        eq_((parent.tag, parent.is_external, parent.title),
+            ("SYS-1", True, "The system shall work"))
+        sw2 = storage.get_traceable_by_tag("SW-2")
+        eq_([relative.tag for relative in sw2.relationships["parents"]],
+            ["SYS-2"])
+
+        # Verify that references link to the other project.
+        references = dict((reference.get("reftitle"), reference.get("refuri"))
+                          for reference in tree.iter("reference"))
+        eq_(references["The system shall be safe"],
+            "../system/details/index.html#traceables-0")
+        eq_(references["SYS-1"], "../system/index.html#traceables-0")
+
+        # Verify that matrices include relatives from the other project.
+        matrix = build_traceable_matrix(storage, "parents")
+        eq_([(primary.tag, [relative.tag
+                            for relative in matrix.get_relatives(primary)])
+             for primary in matrix.primaries],
+            [("SW-1", ["SYS-1"]), ("SW-2", ["SYS-2"])])
+        table = tree.find(".//table")
+        eq_([reference.get("reftitle")
+             for reference in table.iter("reference")],
+            ["SW-1", "SYS-1", "SW-2", "SYS-2"])
+
+        output = warning.getvalue()
+        eq_(output.count("no traceable with tag"), 1)
+        assert "no traceable with tag 'SYS-4' found" in output
+        assert "inconsistent relationships" not in output
+
+    build_software()
+
+    @with_app(buildername="html", srcdir="inventory_software")
+    def build_software_html(app, status, warning):
+        app.build()
+
+        # Verify that links to the other project fit each document, also
+        # in matrices reused from another document.
+        link = '<a class="reference external" href="{0}" title="SYS-1">'
+        with open(app.outdir / "index.html") as html_file:
+            html = html_file.read()
+        eq_(html.count(link.format("../system/index.html#traceables-0")), 2)
+        assert "../../system/" not in html
+        with open(app.outdir / "details" / "index.html") as html_file:
+            html = html_file.read()
+        eq_(html.count(link.format("../../system/index.html#traceables-0")),
+            1)
+
+    build_software_html()
@@ -11,10 +11,74 @@ from utils import with_app, pretty_print_xml
 def test_list(app, status, warning):
     app.build()
 
-    # Verify that basic list has 2 list item nodes.
+    # Verify that basic list has 3 list item nodes.
     tree = ElementTree.parse(app.outdir / "list_basic.xml")
-    assert len(tree.findall(".//list_item")) == 2
+    assert len(tree.findall(".//list_item")) == 3
 
     # Verify that filtered list has 1 list item node.
     tree = ElementTree.parse(app.outdir / "list_filter.xml")
     assert len(tree.findall(".//list_item")) == 1
+
+    # Verify that template list falls back to a table.
+    tree = ElementTree.parse(app.outdir / "list_template.xml")
+    rows = tree.findall(".//table[@classes='traceables-listtable']//tbody/row")
+    assert len(rows) == 3
+
+
+@with_app(buildername="html", srcdir="list", warningiserror=True)
+def test_list_template_html(app, status, warning):
+    app.build()
+
+    # Verify that template list is rendered with a row per traceable.
+    with open(app.outdir / "list_template.html") as html_file:
+        html = html_file.read()
+    assert '<th class="head">Version</th>' in html
+    assert ('<tr class="row-even"><td><a class="reference internal"'
+            ' href="index.html#traceables-1" title="AQUILA"><code'
+            ' class="docutils literal">AQUILA</code></a></td>'
+            '<td>Aquila</td><td>red</td><td>0.8</td></tr>' in html)
+    assert html.count('<tr class="row-') == 3
+
+    # Verify that paged list is split over generated pages.
+    with open(app.outdir / "list_pages.html") as html_file:
+        html = html_file.read()
+    assert 'title="AQUILA"' in html
+    assert 'title="SAGITTA"' not in html
+    assert ('<p class="traceables-pagination">Pages: <strong>1</strong>'
+            ' <a href="list_pages-traceables-4-2.html">2</a>'
+            ' <a href="list_pages-traceables-4-3.html">3</a></p>' in html)
+    with open(app.outdir / "list_pages-traceables-4-3.html") as html_file:
+        html = html_file.read()
+    # The table of the last page has a heading row and a single traceable.
+    assert 'class="traceables-listtable docutils"' in html
+    assert html.count('<tr class="row-') == 2
+    assert 'title="SAGITTA"' in html
+    assert ('<p class="traceables-pagination">Pages: <a'
+            ' href="list_pages.html">1</a> <a'
+            ' href="list_pages-traceables-4-2.html">2</a>'
+            ' <strong>3</strong></p>' in html)
+
+    # Verify that generated pages use the format of the first page.
+    with open(app.outdir / "list_pages_bullets.html") as html_file:
+        html = html_file.read()
+    assert 'title="CYGNUS"' in html
+    assert 'title="SAGITTA"' not in html
+    with open(app.outdir / "list_pages_bullets-traceables-4-2.html") \
+            as html_file:
+        html = html_file.read()
+    assert '<tr class="row-' not in html
+    assert ('<ul>\n<li><span class="first"><a class="reference internal"'
+            ' href="index.html#traceables-0" title="SAGITTA">' in html)
+
+    # Verify that template display is rendered.
+    with open(app.outdir / "list_template.html") as html_file:
+        html = html_file.read()
+    assert ('<table border="1" class="traceables-displaytable docutils"'
+            ' id="traceables-0">' in html)
+    assert "<tr><td>color</td><td>white</td></tr>" in html
+
+    # Verify that default display is still rendered as an admonition.
+    with open(app.outdir / "index.html") as html_file:
+        html = html_file.read()
+    assert "traceables-displaytable" not in html
+    assert 'class="traceable admonition"' in html
@@ -1,6 +1,10 @@
 
 import os
+import re
+import json
 from xml.etree import ElementTree
+from nose.tools import eq_
+from sphinx.util.osutil import ensuredir
 from utils import with_app, pretty_print_xml
 
 
@@ -33,3 +37,95 @@ def test_matrix_structure(app, status, warning):
     rows = tree.findall(".//tbody/row")
     assert len(rows) == 3
     assert len(rows[0].findall("./entry")) == 3
+
+
+@with_app(buildername="html", srcdir="matrix", warningiserror=True)
+def test_matrix_html(app, status, warning):
+    '''Verify HTML markup written directly for table matrices'''
+    app.build()
+
+    with open(app.outdir / "matrix_table.html") as html_file:
+        html = html_file.read()
+    table = re.search(r'<table [^>]*class="traceables-crosstable'
+                      r'.*?</table>', html, re.DOTALL).group(0)
+
+    # Verify the header links and the checkmarks of the rows.
+    assert ('<a class="reference internal" href="index.html#traceables-0"'
+            ' title="SAGITTA"><code class="docutils literal">SAGITTA</code>'
+            '</a>' in table)
+    rows = re.findall(r"<tbody.*?</tbody>", table, re.DOTALL)[0]
+    rows = re.findall(r"<tr.*?</tr>", rows)
+    assert len(rows) == 3
+    checkmarks = [row.count('class="traceables-checkmark"') for row in rows]
+    assert checkmarks == [1, 1, 1]
+
+
+@with_app(buildername="html", srcdir="matrix", warningiserror=True)
+def test_matrix_virtual(app, status, warning):
+    '''Verify sidecar script of virtual matrices'''
+    # A sidecar file left behind by an earlier build must be removed.
+    stale_path = os.path.join(app.outdir, "_traceables",
+                              "matrix-0123456789abcdef.js")
+    ensuredir(os.path.dirname(stale_path))
+    with open(stale_path, "w") as stale_file:
+        stale_file.write("")
+    app.build()
+    assert not os.path.exists(stale_path)
+
+    with open(app.outdir / "matrix_virtual.html") as html_file:
+        html = html_file.read()
+    source, key = re.search(r'<div class="traceables-virtual-matrix"'
+                            r' data-src="([^"]+)" data-key="(\w+)">',
+                            html).groups()
+    assert source.endswith(".js")
+    with open(os.path.join(app.outdir, source)) as sidecar_file:
+        sidecar = sidecar_file.read()
+    assignment = 'window.traceablesMatrices["{0}"] = '.format(key)
+    assert assignment in sidecar
+    data = json.loads(sidecar.split(assignment, 1)[1].rstrip().rstrip(";"))
+
+    # Verify that only related pairs are stored.
+    eq_([tag for (tag, uri) in data["primaries"]],
+        ["AQUILA", "AURIGA", "LYRA"])
+    eq_([tag for (tag, uri) in data["secondaries"]], ["CEPHEUS", "SAGITTA"])
+    eq_(data["rows"], [[1], [0], [1]])
+    eq_(data["primaries"][0][1], "index.html#traceables-1")
+
+    # Verify that the rendering script is only loaded where needed.
+    script = ('<script type="text/javascript"'
+              ' src="_static/traceables-matrix.js">')
+    eq_(html.count(script), 1)
+    with open(app.outdir / "index.html") as html_file:
+        assert "traceables-matrix.js" not in html_file.read()
+
+
+@with_app(buildername="html", srcdir="matrix", warningiserror=True)
+def test_matrix_repeated(app, status, warning):
+    '''Verify references in output reused for identical directives'''
+    app.build()
+
+    # The index and matrix_list documents contain the same matrix, which
+    # is formatted only once; the references must fit each document.
+    link = '<a class="reference internal" href="%s" title="AQUILA">'
+    with open(app.outdir / "index.html") as html_file:
+        assert link % "#traceables-1" in html_file.read()
+    with open(app.outdir / "matrix_list.html") as html_file:
+        assert link % "index.html#traceables-1" in html_file.read()
+
+
+@with_app(buildername="xml", srcdir="transitive", warningiserror=True)
+def test_matrix_transitive(app, status, warning):
+    '''Verify transitive relationships in matrices and filters'''
+    app.build()
+
+    # Verify that the matrix lists all indirect parents of TEST-1.
+    tree = ElementTree.parse(app.outdir / "transitive_matrix.xml")
+    sublist_items = tree.findall(".//list_item/bullet_list/list_item")
+    tags = [item.find(".//literal").text for item in sublist_items]
+    assert tags == ["SW-1", "SW-2", "SYS-1"]
+
+    # Verify that the filter only matches TEST-1.
+    tree = ElementTree.parse(app.outdir / "transitive_list.xml")
+    items = tree.findall(".//list_item")
+    assert len(items) == 1
+    assert items[0].find(".//literal").text == "TEST-1"
@@ -0,0 +1,53 @@
+import os
+import json
+from nose.tools import eq_
+from utils import with_app
+from sphinxcontrib.traceables import profiling
+
+
+# =============================================================================
+# Tests
+
+@with_app(buildername="xml", srcdir="matrix", warningiserror=True,
+          confoverrides={"traceables_profile": True})
+def test_profile_report(app, status, warning):
+    '''Verify performance report and trace written at end of build'''
+    app.build()
+
+    with open(os.path.join(app.outdir, profiling.report_filename)) as f:
+        report = json.load(f)
+
+    # Verify that processors, formatters and filters are timed.
+    timings = report["timings"]
+    assert timings["processor:MatrixProcessor"]["calls"] > 0
+    assert timings["formatter:BulletMatrixFormatter"]["calls"] > 0
+    assert "relationships:build" in timings
+    assert "document:index" in report["documents"]["index"]
+
+    # Verify that each directive is timed separately.
+    directive_timings = [timings for (directive, timings)
+                         in report["directives"].items()
+                         if directive.startswith("matrix_list:")]
+    eq_(len(directive_timings), 2)
+
+    # Verify that repeated directives hit the results cache.
+    caches = report["caches"]
+    assert caches["directive-results"]["hits"] >= 1
+    assert 0 < caches["directive-results"]["hit_ratio"] < 1
+
+    with open(os.path.join(app.outdir, profiling.trace_filename)) as f:
+        trace = json.load(f)
+    events = trace["traceEvents"]
+    assert events
+    assert all(event["ph"] == "X" for event in events)
+
+
+@with_app(buildername="xml", srcdir="matrix", warningiserror=True)
+def test_profile_disabled(app, status, warning):
+    '''Verify that no report is written by default'''
+    # Remove the report of an earlier profiled build into this directory.
+    report_path = os.path.join(app.outdir, profiling.report_filename)
+    if os.path.exists(report_path):
+        os.remove(report_path)
+    app.build()
+    assert not os.path.exists(report_path)
@@ -0,0 +1,132 @@
+
+from nose.tools import eq_
+from sphinxcontrib.traceables.infrastructure import Traceable
+from sphinxcontrib.traceables.relationships import RelationshipGraph
+from sphinxcontrib.traceables.traceables import default_relationships
+
+
+# =============================================================================
+# Utility functions
+
+def create_traceables(traceables_input):
+    traceables = []
+    for tag, attributes in traceables_input:
+        traceables.append(Traceable(None, tag))
+        traceables[-1].attributes = attributes
+    return traceables
+
+
+def build_graph(traceables):
+    graph = RelationshipGraph(default_relationships)
+    graph.build(traceables, graph.collect_edges(traceables))
+    return graph
+
+
+# =============================================================================
+# Tests
+
+def test_relationship_graph():
+    traceables = create_traceables([
+        ("SAGITTA",    {"children": "LYRA, AQUILA"}),
+        ("AQUILA",     {"sibling": "LYRA"}),
+        ("LYRA",       {}),
+        ("CEPHEUS",    {"parents": "SAGITTA"}),
+    ])
+    graph = build_graph(traceables)
+    sagitta, aquila, lyra, cepheus = traceables
+
+    # Verify that relatives are sorted by tag.
+    eq_(graph.get_relatives(sagitta, "children"), (aquila, cepheus, lyra))
+
+    # Verify that opposite relationships are derived.
+    eq_(graph.get_relatives(lyra, "parents"), (sagitta,))
+    eq_(graph.get_relatives(lyra, "sibling"), (aquila,))
+    eq_(graph.get_relatives(aquila, "sibling"), (lyra,))
+    eq_(graph.get_relatives(cepheus, "children"), ())
+    eq_(graph.edge_count, 8)
+
+    # Verify the per-traceable relationships view.
+    eq_(sagitta.relationships.keys(), ["children"])
+    eq_(aquila.relationships.keys(), ["parents", "sibling"])
+    eq_(cepheus.relationships.get("children", ()), ())
+    assert "parents" in cepheus.relationships
+    assert "children" not in cepheus.relationships
+
+
+def test_relationship_graph_duplicate_edges():
+    traceables = create_traceables([
+        ("SAGITTA",    {"children": "AQUILA"}),
+        ("AQUILA",     {"parents": "SAGITTA"}),
+    ])
+    graph = build_graph(traceables)
+    sagitta, aquila = traceables
+
+    # Verify that the same relationship defined at both ends is stored once.
+    eq_(graph.get_relatives(sagitta, "children"), (aquila,))
+    eq_(graph.get_relatives(aquila, "parents"), (sagitta,))
+    eq_(graph.edge_count, 2)
+
+
+def test_reachability_index():
+    traceables = create_traceables([
+        ("A",    {"children": "B, C"}),
+        ("B",    {"children": "D"}),
+        ("C",    {"children": "D"}),
+        ("D",    {}),
+        ("E",    {}),
+    ])
+    graph = build_graph(traceables)
+    a, b, c, d, e = traceables
+
+    descendants = graph.get_reachability_index("children")
+    eq_(descendants.get_reachable(a), (b, c, d))
+    eq_(descendants.get_reachable(b), (d,))
+    eq_(descendants.get_reachable(d), ())
+    assert descendants.is_reachable(a, d)
+    assert not descendants.is_reachable(d, a)
+    assert not descendants.is_reachable(a, a)
+    assert not descendants.is_reachable(a, e)
+
+    ancestors = graph.get_reachability_index("parents")
+    eq_(ancestors.get_reachable(d), (a, b, c))
+    eq_(ancestors.get_reachable_tags(b), frozenset(["A"]))
+
+    # Verify membership tests on reachable tags.
+    tags = ancestors.get_reachable_tags(d)
+    assert "A" in tags and "C" in tags
+    assert "D" not in tags and "UNKNOWN" not in tags and 1 not in tags
+    eq_(len(tags), 3)
+    eq_(sorted(tags), ["A", "B", "C"])
+
+
+def test_reachability_index_cycles():
+    traceables = create_traceables([
+        ("A",    {"children": "B"}),
+        ("B",    {"children": "C"}),
+        ("C",    {"children": "A, D"}),
+        ("D",    {"children": "D"}),
+    ])
+    graph = build_graph(traceables)
+    a, b, c, d = traceables
+
+    # Verify that members of a cycle reach each other and themselves.
+    descendants = graph.get_reachability_index("children")
+    eq_(descendants.get_reachable(a), (a, b, c, d))
+    eq_(descendants.get_reachable(d), (d,))
+
+    # Verify components are found in reverse topological order.
+    children_id = graph.relationship_ids["children"]
+    components = graph.strongly_connected_components(children_id)
+    eq_([sorted(graph.tags[i] for i in component)
+         for component in components], [["D"], ["A", "B", "C"]])
+
+
+def test_reachability_index_long_chain():
+    traceables = create_traceables(
+        [("T{0:05d}".format(index), {"children": "T{0:05d}".format(index + 1)})
+         for index in range(5000)] + [("T05000", {})])
+    graph = build_graph(traceables)
+
+    # Verify that long chains don't exceed the recursion limit.
+    descendants = graph.get_reachability_index("children")
+    eq_(len(descendants.get_reachable(traceables[0])), 5000)
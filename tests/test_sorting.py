@@ -0,0 +1,43 @@
+
+from xml.etree import ElementTree
+from nose.tools import eq_
+from utils import with_app, pretty_print_xml
+from sphinxcontrib.traceables.infrastructure import TraceablesStorage
+
+
+# =============================================================================
+# Tests
+
+def get_list_tags(app):
+    tree = ElementTree.parse(app.outdir / "index.xml")
+    return [item.find(".//literal").text
+            for item in tree.findall(".//list_item")]
+
+
+def get_children_tags(app):
+    storage = TraceablesStorage(app.env)
+    parent = storage.get_traceable_by_tag("REQ-2")
+    return [t.tag for t in parent.relationships["children"]]
+
+
+@with_app(buildername="xml", srcdir="sorting", warningiserror=True)
+def test_sort_tag(app, status, warning):
+    app.build()
+    eq_(get_list_tags(app), ["REQ-1", "REQ-10", "REQ-2", "REQ-3"])
+    eq_(get_children_tags(app), ["REQ-1", "REQ-10", "REQ-3"])
+
+
+@with_app(buildername="xml", srcdir="sorting", warningiserror=True,
+          confoverrides={"traceables_sort": "natural"})
+def test_sort_natural(app, status, warning):
+    app.build()
+    eq_(get_list_tags(app), ["REQ-1", "REQ-2", "REQ-3", "REQ-10"])
+    eq_(get_children_tags(app), ["REQ-1", "REQ-3", "REQ-10"])
+
+
+@with_app(buildername="xml", srcdir="sorting", warningiserror=True,
+          confoverrides={"traceables_sort": "priority"})
+def test_sort_attribute(app, status, warning):
+    app.build()
+    eq_(get_list_tags(app), ["REQ-10", "REQ-1", "REQ-2", "REQ-3"])
+    eq_(get_children_tags(app), ["REQ-10", "REQ-1", "REQ-3"])
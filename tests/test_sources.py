@@ -0,0 +1,83 @@
+
+import os
+from xml.etree import ElementTree
+from nose.tools import eq_
+from utils import with_app, srcdir, pretty_print_xml
+from sphinxcontrib.traceables.infrastructure import TraceablesStorage
+from sphinxcontrib.traceables.engine import TraceablesEngine
+from sphinxcontrib.traceables.sources import (read_traceable_records,
+                                              get_data_format)
+
+
+# =============================================================================
+# Tests
+
+@with_app(buildername="xml", srcdir="sources")
+def test_import(app, status, warning):
+    app.build()
+    tree = ElementTree.parse(app.outdir / "index.xml")
+#    pretty_print_xml(tree.getroot())
+
+    # Verify that all records with a tag have been imported.
+    storage = TraceablesStorage(app.env)
+    eq_(sorted(storage.traceables_dict),
+        ["REQ-1", "REQ-2", "REQ-3", "RESULT-1", "RESULT-2",
+         "TEST-1", "TEST-2"])
+    traceable = storage.get_traceable_by_tag("REQ-3")
+    eq_(traceable.attributes, {"title": "Third requirement",
+                               "status": "approved",
+                               "parents": "REQ-1, REQ-2"})
+    eq_([relative.tag for relative
+         in storage.get_traceable_by_tag("REQ-1").relationships["children"]],
+        ["REQ-2", "REQ-3", "TEST-1"])
+
+    # Verify that the data files are dependencies of the document.
+    eq_(sorted(app.env.dependencies["index"]),
+        ["data/requirements.csv", "data/results.jsonl", "data/tests.json"])
+
+    # Verify that imported traceables are displayed, except hidden ones,
+    # and that their content is included.
+    eq_(len(tree.findall(".//admonition")), 3)
+    eq_(len(tree.findall(".//traceable_display_table")), 2)
+    assert "The system shall work." in ElementTree.tostring(tree.getroot())
+
+    # Verify that references to imported traceables are resolved.
+    eq_(len(tree.findall(".//paragraph/reference")), 2)
+    eq_(len(tree.findall(".//bullet_list/list_item")), 6)
+
+    # Verify that problems with records are reported.
+    output = warning.getvalue()
+    assert "Traceable record 3 of data/requirements.csv has no tag" in output
+    assert ("Traceable attribute has invalid syntax: u'invalid name'"
+            " in record 2 of data/tests.json" in output)
+    assert "unresolved references" not in output
+
+
+def test_read_records():
+    path = os.path.join(srcdir("sources"), "data", "results.jsonl")
+    records = list(read_traceable_records(path))
+    eq_([record.number for record in records], [1, 2])
+    eq_(records[0].attributes, {"parents": "TEST-1", "passed": "yes"})
+    eq_(get_data_format("requirements.YML"), "yaml")
+    eq_(get_data_format("requirements.txt", "csv"), "csv")
+
+
+def test_read_csv_with_byte_order_mark():
+    path = os.path.join(srcdir("sources"), "data", "exported.csv")
+    records = list(read_traceable_records(path))
+    eq_([(record.tag, record.invalid_names) for record in records],
+        [("EXP-1", []), ("EXP-2", [])])
+    eq_(records[1].attributes, {"title": "Second export",
+                                "parents": "EXP-1"})
+
+
+def test_engine_load():
+    engine = TraceablesEngine()
+    directory = os.path.join(srcdir("sources"), "data")
+    for filename in ("requirements.csv", "tests.json", "results.jsonl"):
+        engine.load(os.path.join(directory, filename))
+    eq_(len(engine.traceables), 7)
+    eq_(len(engine.env.warnings), 2)
+    eq_([traceable.tag for traceable
+         in engine.get_relatives("RESULT-2", "parents", transitive=True)],
+        ["REQ-1", "REQ-2", "REQ-3", "TEST-2"])